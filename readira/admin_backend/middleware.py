@@ -0,0 +1,41 @@
+import random
+from django.conf import settings
+from .profiling import profile_request
+
+
+
+class ProfilingMiddleware:
+    """
+    Opt-in request profiling.
+    Staff users can profile a single request by sending the PROFILING_HEADER header or adding the
+    PROFILING_QUERY_PARAM flag to the query string. Independently of that, one request out of
+    PROFILING_SAMPLE_RATE is profiled at random (0 disables random sampling).
+    Profiles end up in the ProfileStore ring buffer and can be downloaded from the admin backend.
+    Must be placed after AuthenticationMiddleware.
+    Methods:
+        - __call__(): Decides whether the request is profiled and runs it.
+                    Args:
+                        request (HttpRequest): The incoming request.
+                    Returns:
+                        HttpResponse: The response returned by the rest of the chain.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        trigger = self.get_trigger(request)
+        if trigger is None:
+            return self.get_response(request)
+        return profile_request(self.get_response, request, trigger)
+
+    def get_trigger(self, request):
+        requested = (
+            request.META.get(settings.PROFILING_HEADER)
+            or settings.PROFILING_QUERY_PARAM in request.GET
+        )
+        if requested and request.user.is_authenticated and request.user.is_staff:
+            return 'staff'
+        rate = settings.PROFILING_SAMPLE_RATE
+        if rate and random.randrange(rate) == 0:
+            return 'sampled'
+        return None
@@ -0,0 +1,221 @@
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+from django.conf import settings
+from django.utils import timezone
+
+
+PROFILE_NAME_RE = re.compile(r'^[0-9]{14}-[0-9a-f]{8}$')
+# Shared by every ProfileStore of the process: a store is created per profiled request.
+_store_lock = threading.Lock()
+
+
+
+class SamplingProfiler:
+    """
+    Low-overhead sampling profiler for a single thread.
+    A daemon thread wakes up every `interval` seconds, reads the current stack of the
+    profiled thread through sys._current_frames() and counts identical stacks.
+    The profiled code itself is never instrumented, so the overhead stays flat no matter how many
+    Python calls the request makes.
+    Attributes:
+        interval (float): Seconds between two samples.
+        stacks (Counter): Collapsed stack (root first, frames joined by ';') mapped to its sample count.
+    Methods:
+        - start(): Starts sampling the calling thread.
+        - stop(): Stops sampling and waits for the sampler thread to exit.
+        - collapsed(): Returns the samples in the collapsed stack format used by flamegraph.pl / speedscope.
+                    Returns:
+                        str: One 'frame;frame;frame count' line per distinct stack.
+    """
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.stacks = Counter()
+        self._target = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._target = threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({code.co_filename}:{code.co_firstlineno})')
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+
+    def collapsed(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+
+def collapsed_to_speedscope(collapsed, name, interval):
+    """
+    Converts collapsed stacks into a speedscope 'sampled' profile document.
+    Args:
+        collapsed (str): Profile in collapsed stack format.
+        name (str): Name shown by speedscope for the profile.
+        interval (float): Sampling interval in seconds, used to weight every sample.
+    Returns:
+        dict: JSON-serializable speedscope document.
+    """
+    frames = []
+    frame_index = {}
+    samples = []
+    weights = []
+    for line in collapsed.splitlines():
+        stack, _, count = line.rpartition(' ')
+        if not stack:
+            continue
+        sample = []
+        for frame in stack.split(';'):
+            if frame not in frame_index:
+                frame_index[frame] = len(frames)
+                frame_name, _, location = frame.partition(' (')
+                file, _, line_no = location.rstrip(')').rpartition(':')
+                frames.append({'name': frame_name, 'file': file, 'line': int(line_no) if line_no.isdigit() else None})
+            sample.append(frame_index[frame])
+        samples.append(sample)
+        weights.append(int(count) * interval * 1000)
+
+    return {
+        '$schema': 'https://www.speedscope.app/file-format-schema.json',
+        'name': name,
+        'exporter': 'readira',
+        'shared': {'frames': frames},
+        'profiles': [{
+            'type': 'sampled',
+            'name': name,
+            'unit': 'milliseconds',
+            'startValue': 0,
+            'endValue': sum(weights),
+            'samples': samples,
+            'weights': weights,
+        }],
+    }
+
+
+
+class ProfileStore:
+    """
+    Ring buffer of request profiles stored on disk, so every worker process writes to and reads from the same place.
+    Each profile is a pair of files: '<name>.collapsed' with the stacks and '<name>.json' with the request metadata.
+    Once more than `capacity` profiles exist, the oldest ones, by modification time, are removed.
+    Attributes:
+        directory (Path): Folder holding the profiles.
+        capacity (int): Maximum number of profiles kept.
+    Methods:
+        - save(): Writes a new profile and drops the oldest ones above capacity.
+                Args:
+                    meta (dict): Request metadata (path, method, status, duration, trigger...).
+                    collapsed (str): Profile in collapsed stack format.
+                Returns:
+                    str: The name of the stored profile.
+        - list(): Returns the metadata of the stored profiles, newest first.
+        - read(): Returns the collapsed stacks of a profile, or None if it does not exist.
+    """
+    def __init__(self, directory=None, capacity=None):
+        self.directory = Path(directory or settings.PROFILING_DIR)
+        self.capacity = capacity or settings.PROFILING_MAX_PROFILES
+
+    def save(self, meta, collapsed):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        name = f'{timezone.now():%Y%m%d%H%M%S}-{uuid.uuid4().hex[:8]}'
+        meta = dict(meta, name=name)
+        with _store_lock:
+            (self.directory / f'{name}.collapsed').write_text(collapsed)
+            (self.directory / f'{name}.json').write_text(json.dumps(meta))
+            self._prune()
+        return name
+
+    def _by_age(self):
+        # Names only have a one-second resolution and a random suffix, so they do not order profiles of the same second.
+        stamped = []
+        for path in self.directory.glob('*.json'):
+            try:
+                stamped.append((path.stat().st_mtime_ns, path.name, path))
+            except FileNotFoundError:
+                continue
+        return [path for _mtime, _name, path in sorted(stamped)]
+
+    def _prune(self):
+        paths = self._by_age()
+        for path in paths[:max(len(paths) - self.capacity, 0)]:
+            for suffix in ('.json', '.collapsed'):
+                try:
+                    os.remove(path.with_suffix(suffix))
+                except FileNotFoundError:
+                    pass
+
+    def list(self):
+        if not self.directory.exists():
+            return []
+        profiles = []
+        for path in reversed(self._by_age()):
+            try:
+                profiles.append(json.loads(path.read_text()))
+            except (OSError, ValueError):
+                continue
+        return profiles
+
+    def read(self, name):
+        if not PROFILE_NAME_RE.match(name):
+            return None
+        try:
+            return (self.directory / f'{name}.collapsed').read_text()
+        except FileNotFoundError:
+            return None
+
+
+
+def profile_request(get_response, request, trigger):
+    """
+    Runs a request under the sampling profiler and stores the result in the profile ring buffer.
+    Args:
+        get_response (callable): The next middleware or view in the chain.
+        request (HttpRequest): The request being profiled.
+        trigger (str): What caused the profiling ('staff' or 'sampled').
+    Returns:
+        HttpResponse: The response produced by the wrapped view, with an X-Profile-Id header.
+    """
+    profiler = SamplingProfiler(interval=settings.PROFILING_INTERVAL)
+    started = time.perf_counter()
+    profiler.start()
+    try:
+        response = get_response(request)
+    finally:
+        profiler.stop()
+    duration_ms = round((time.perf_counter() - started) * 1000, 2)
+
+    name = ProfileStore().save({
+        'path': request.get_full_path(),
+        'method': request.method,
+        'status': response.status_code,
+        'duration_ms': duration_ms,
+        'samples': sum(profiler.stacks.values()),
+        'trigger': trigger,
+        'recorded_at': timezone.now().isoformat(),
+    }, profiler.collapsed())
+    response['X-Profile-Id'] = name
+    return response
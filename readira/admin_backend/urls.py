@@ -3,7 +3,9 @@ from .views import (
     BookListView,
     BookCreateView,
     BookUpdateView, 
-    BookDeleteView
+    BookDeleteView,
+    ProfileListView,
+    ProfileDownloadView,
     )
 
 
@@ -15,4 +17,6 @@ urlpatterns = [
     path('books/create/', BookCreateView.as_view(), name='book_create'),
     path('books/<int:pk>/edit/', BookUpdateView.as_view(), name='book_edit'),
     path('books/<int:pk>/delete/', BookDeleteView.as_view(), name='book_delete'),
+    path('profiles/', ProfileListView.as_view(), name='profile_list'),
+    path('profiles/<str:name>/', ProfileDownloadView.as_view(), name='profile_download'),
 ]
\ No newline at end of file
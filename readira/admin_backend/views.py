@@ -1,7 +1,12 @@
+import json
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
+from django.http import Http404, HttpResponse
 from django.urls import reverse_lazy
-from django.views.generic import ListView, CreateView, UpdateView, DeleteView
+from django.views import View
+from django.views.generic import ListView, CreateView, UpdateView, DeleteView, TemplateView
+from django.conf import settings
 from library.models import ReadingMaterials
+from .profiling import ProfileStore, collapsed_to_speedscope
 
 
 
@@ -43,7 +48,7 @@ class BookCreateView(LoginRequiredMixin, StaffRequiredMixin, CreateView):
     model = ReadingMaterials
     template_name = 'admin_backend/book_form.html'
     fields = ['title', 'author', 'category', 'genre', 'book_summary',
-              'release_date', 'price', 'image', 'availability', 'enabled']
+              'release_date', 'price', 'image', 'digital_file', 'availability', 'stock', 'loan_copies', 'enabled']
     success_url = reverse_lazy('admin_backend:book_list')
 
 
@@ -60,7 +65,7 @@ class BookUpdateView(LoginRequiredMixin, StaffRequiredMixin, UpdateView):
     model = ReadingMaterials
     template_name = 'admin_backend/book_form.html'
     fields = ['title', 'author', 'category', 'genre', 'book_summary',
-              'release_date', 'price', 'image', 'availability', 'enabled']
+              'release_date', 'price', 'image', 'digital_file', 'availability', 'stock', 'loan_copies', 'enabled']
     success_url = reverse_lazy('admin_backend:book_list')
 
 
@@ -75,4 +80,43 @@ class BookDeleteView(LoginRequiredMixin, StaffRequiredMixin, DeleteView):
     """
     model = ReadingMaterials
     template_name = 'admin_backend/book_confirm_delete.html'
-    success_url = reverse_lazy('admin_backend:book_list')
\ No newline at end of file
+    success_url = reverse_lazy('admin_backend:book_list')
+
+
+class ProfileListView(LoginRequiredMixin, StaffRequiredMixin, TemplateView):
+    """
+    View listing the request profiles currently kept in the profile ring buffer.
+
+    Attributes:
+        template_name (str): Template used for rendering the list.
+    """
+    template_name = 'admin_backend/profile_list.html'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['profiles'] = ProfileStore().list()
+        return context
+
+
+class ProfileDownloadView(LoginRequiredMixin, StaffRequiredMixin, View):
+    """
+    View downloading a stored request profile.
+    The 'format' query parameter selects between collapsed stacks ('collapsed', the default)
+    and a speedscope JSON document ('speedscope').
+
+    Methods:
+        get(): Returns the profile as an attachment, or 404 if it does not exist.
+    """
+    def get(self, request, name):
+        collapsed = ProfileStore().read(name)
+        if collapsed is None:
+            raise Http404('Profile not found.')
+
+        if request.GET.get('format') == 'speedscope':
+            document = collapsed_to_speedscope(collapsed, name, settings.PROFILING_INTERVAL)
+            response = HttpResponse(json.dumps(document), content_type='application/json')
+            response['Content-Disposition'] = f'attachment; filename="{name}.speedscope.json"'
+        else:
+            response = HttpResponse(collapsed, content_type='text/plain')
+            response['Content-Disposition'] = f'attachment; filename="{name}.collapsed"'
+        return response
\ No newline at end of file
@@ -10,6 +10,15 @@ from .models import (
     SubscriptionPlan,
     Category,
     Order,
+    OrderLine,
+    CheckoutClaim,
+    OutboxEvent,
+    Job,
+    CartReservation,
+    Loan,
+    CustomerStats,
+    ReadingProgress,
+    SearchQueryStats,
     )
 
 
@@ -27,14 +36,18 @@ class ReadingMaterialsAdmin(admin.ModelAdmin):
         'release_date',
         'price',
         'image',
+        'digital_file',
         'availability',
+        'stock',
+        'loan_copies',
         'category',
         'genre',
         'enabled']
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
-    list_display = ('name', 'parent')
+    list_display = ('name', 'parent', 'material_count')
+    ordering = ('path',)
     search_fields = ('name',)
 
 @admin.register(Genre)
@@ -44,40 +57,100 @@ class GenreAdmin(admin.ModelAdmin):
 
 @admin.register(SubscriptionPlan)
 class SubscriptionPlanAdmin(admin.ModelAdmin):
-    list_display = ('name', 'price', 'duration_days')
+    list_display = ('name', 'price', 'duration_days', 'max_loans')
     search_fields = ('name',)
     ordering = ('price',)
 
 @admin.register(Subscription)
 class SubscriptionAdmin(admin.ModelAdmin):
-    list_display = ('user', 'plan', 'start_date', 'end_date', 'active')
-    list_filter = ('active', 'plan')
+    list_display = ('user', 'plan', 'start_date', 'end_date', 'active', 'auto_renew')
+    list_filter = ('active', 'auto_renew', 'plan')
     search_fields = ('user__username', 'user__email')
 
+@admin.register(CartReservation)
+class CartReservationAdmin(admin.ModelAdmin):
+    list_display = ('user', 'material', 'quantity', 'expires_at')
+    search_fields = ('user__email', 'material__title')
+
+@admin.register(Loan)
+class LoanAdmin(admin.ModelAdmin):
+    list_display = ('user', 'material', 'borrowed_at', 'due_date', 'returned_at')
+    list_filter = ('returned_at',)
+    search_fields = ('user__email', 'material__title')
+    raw_id_fields = ('user', 'material')
+
+@admin.register(CheckoutClaim)
+class CheckoutClaimAdmin(admin.ModelAdmin):
+    list_display = ('token', 'user', 'order', 'created_at')
+    search_fields = ('token', 'user__email')
+    raw_id_fields = ('user', 'order')
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'user', 'status', 'attempts', 'available_at', 'processed_at')
+    list_filter = ('status', 'kind')
+    search_fields = ('user__email',)
+    raw_id_fields = ('user',)
+    readonly_fields = ('created_at', 'processed_at', 'last_error')
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'task', 'status', 'attempts', 'available_at', 'created_at')
+    list_filter = ('status', 'task')
+    readonly_fields = ('created_at', 'finished_at', 'last_error')
+
+@admin.register(CustomerStats)
+class CustomerStatsAdmin(admin.ModelAdmin):
+    list_display = ('user', 'order_count', 'total_spent')
+    search_fields = ('user__email',)
+    readonly_fields = ('order_count', 'total_spent')
+
+@admin.register(SearchQueryStats)
+class SearchQueryStatsAdmin(admin.ModelAdmin):
+    list_display = ('query', 'searches', 'zero_result_rate_display', 'average_latency_display', 'max_latency', 'last_searched_at')
+    search_fields = ('query',)
+    ordering = ('-searches',)
+    readonly_fields = ('query', 'searches', 'zero_results', 'total_latency', 'max_latency', 'last_searched_at')
+
+    @admin.display(description='Zero results')
+    def zero_result_rate_display(self, obj):
+        return f'{obj.zero_result_rate():.0%}'
+
+    @admin.display(description='Average latency (ms)')
+    def average_latency_display(self, obj):
+        return f'{obj.average_latency():.1f}'
+
+@admin.register(ReadingProgress)
+class ReadingProgressAdmin(admin.ModelAdmin):
+    list_display = ('user', 'material', 'fraction', 'updated_at')
+    search_fields = ('user__email', 'material__title')
+    raw_id_fields = ('user', 'material')
+
+class OrderLineInline(admin.TabularInline):
+    model = OrderLine
+    fields = ('reading_material', 'quantity', 'price_per_item')
+    raw_id_fields = ('reading_material',)
+    extra = 0
+
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     list_display = (
         'id',
         'client_full_name',
-        'reading_material',
-        'quantity',
-        'price_per_item',
         'total_cost',
         'status',
         'submitted_at',
     )
     list_filter = ('status', 'submitted_at')
-    search_fields = ('client_full_name', 'product_title', 'user__email')
+    search_fields = ('client_full_name', 'lines__reading_material__title', 'user__email')
     readonly_fields = ('submitted_at', 'total_cost', 'buy_session_hash')
+    inlines = [OrderLineInline]
 
     fieldsets = (
         (_('Order Details'), {
             'fields': (
                 'user',
                 'client_full_name',
-                'reading_material',
-                'quantity',
-                'price_per_item',
                 'total_cost',
                 'status',
             )
@@ -99,4 +172,8 @@ class OrderAdmin(admin.ModelAdmin):
         }),
     )
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        form.instance.refresh_total()
+
 
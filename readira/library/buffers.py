@@ -0,0 +1,116 @@
+import atexit
+import logging
+import threading
+from django.db import connections
+
+
+logger = logging.getLogger(__name__)
+
+
+
+class CoalescingBuffer:
+    """
+    In-memory write-behind buffer that coalesces writes per key and flushes them in batches.
+    Several writes to the same key before a flush collapse into one entry: the newest value wins,
+    or values are combined with `merge` when one is given. The buffer is flushed when it holds
+    `max_size` keys, `interval` seconds after the first pending write, on demand, and at interpreter exit,
+    which bounds how much data a crash can lose to `interval` seconds. A failed flush is retried with the next one;
+    entries whose flush failed `max_retries` times in a row are dropped, so one bad entry cannot block the buffer.
+    Attributes:
+        flush_func (callable): Called with a {key: value} dict of the pending writes.
+        max_size (int): Number of pending keys that triggers an immediate flush.
+        interval (float): Maximum number of seconds a write waits before being flushed.
+        merge (callable, optional): Combines the pending value of a key with a new one.
+        max_retries (int): Number of failed flushes after which an entry is dropped.
+    Methods:
+        - add(): Queues a write for a key.
+                Args:
+                    key (hashable): The key being written.
+                    value: The value to write.
+        - get(): Returns the pending value of a key, so readers see their own writes before the flush.
+        - flush(): Writes the pending entries through flush_func, every entry or only those whose key matches `where`.
+        - discard(): Drops the pending entry of a key and returns it.
+    """
+    def __init__(self, flush_func, max_size=500, interval=1.0, merge=None, max_retries=5):
+        self.flush_func = flush_func
+        self.max_size = max_size
+        self.interval = interval
+        self.merge = merge
+        self.max_retries = max_retries
+        self._pending = {}
+        self._failures = {}
+        self._lock = threading.Lock()
+        self._timer = None
+        atexit.register(self.flush)
+
+    def add(self, key, value):
+        with self._lock:
+            if self.merge is not None and key in self._pending:
+                value = self.merge(self._pending[key], value)
+            self._pending[key] = value
+            full = len(self._pending) >= self.max_size
+            if not full:
+                self._schedule()
+        if full:
+            self.flush()
+
+    def get(self, key, default=None):
+        with self._lock:
+            return self._pending.get(key, default)
+
+    def discard(self, key):
+        with self._lock:
+            return self._pending.pop(key, None)
+
+    def flush(self, where=None):
+        with self._lock:
+            if where is None:
+                pending, self._pending = self._pending, {}
+            else:
+                pending = {key: value for key, value in self._pending.items() if where(key)}
+                for key in pending:
+                    del self._pending[key]
+            if not self._pending and self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if not pending:
+            return
+        try:
+            self.flush_func(pending)
+        except Exception:
+            logger.exception('Flushing %d buffered writes failed, they will be retried.', len(pending))
+            self._requeue(pending)
+        else:
+            with self._lock:
+                for key in pending:
+                    self._failures.pop(key, None)
+
+    def _requeue(self, pending):
+        with self._lock:
+            for key, value in pending.items():
+                failures = self._failures.get(key, 0) + 1
+                if failures >= self.max_retries:
+                    logger.error('Dropping the buffered write of %r after %d failed flushes.', key, failures)
+                    self._failures.pop(key, None)
+                    continue
+                self._failures[key] = failures
+                if key not in self._pending:
+                    self._pending[key] = value
+                elif self.merge is not None:
+                    self._pending[key] = self.merge(value, self._pending[key])
+            self._schedule()
+
+    def _schedule(self):
+        if self._timer is None:
+            self._timer = threading.Timer(self.interval, self._flush_from_timer)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _flush_from_timer(self):
+        try:
+            self.flush()
+        finally:
+            connections.close_all()
+
+    def __len__(self):
+        return len(self._pending)
@@ -0,0 +1,95 @@
+import hashlib
+import re
+import time
+from functools import wraps
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.translation import get_language
+
+
+CATALOG_VERSION_KEY = 'catalog:version'
+CSRF_INPUT_RE = re.compile(r'(name="csrfmiddlewaretoken" value=")[^"]*(")')
+CSRF_PLACEHOLDER = '@@readira-csrf-token@@'
+
+
+
+def get_catalog_version():
+    """
+    Returns the current catalog version.
+    Every cache entry derived from catalog data embeds this version in its key, so bumping it
+    purges all of them at once without having to know which keys exist.
+    Returns:
+        int: The current catalog version.
+    """
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, time.time_ns(), None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    """
+    Invalidates every catalog-derived cache entry by moving the catalog version forward.
+    """
+    cache.set(CATALOG_VERSION_KEY, time.time_ns(), None)
+
+
+def page_cache_key(request):
+    """
+    Builds the full-page cache key for a request from the catalog version, the active language,
+    the path and the query string.
+    Args:
+        request (HttpRequest): The current request.
+    Returns:
+        str: The cache key.
+    """
+    url = hashlib.sha256(request.get_full_path().encode()).hexdigest()
+    return f'page:{get_catalog_version()}:{get_language()}:{url}'
+
+
+def anonymous_page_cache(view_func):
+    """
+    Full-page cache for anonymous GET and HEAD requests.
+    Responses are keyed by path, query string, language and catalog version, and are shared by
+    every anonymous visitor. The CSRF token rendered in the page is swapped for a placeholder before
+    storing and replaced with the visitor's own token when the page is served, so cached pages never
+    leak one visitor's token to another. Browser caches may keep such pages, but they are marked private.
+    Authenticated responses are never cached and are marked private.
+    Args:
+        view_func (callable): The view to wrap.
+    Returns:
+        callable: The wrapped view.
+    """
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD') or request.user.is_authenticated:
+            response = view_func(request, *args, **kwargs)
+            patch_cache_control(response, private=True)
+            return response
+
+        key = page_cache_key(request)
+        cached = cache.get(key)
+        if cached is not None:
+            content, content_type = cached
+            response = HttpResponse(content.replace(CSRF_PLACEHOLDER, get_token(request)), content_type=content_type)
+        else:
+            response = view_func(request, *args, **kwargs)
+            if hasattr(response, 'render') and callable(response.render):
+                response = response.render()
+            if response.status_code == 200 and not response.streaming and not response.cookies:
+                content = CSRF_INPUT_RE.sub(rf'\g<1>{CSRF_PLACEHOLDER}\g<2>', response.content.decode(response.charset))
+                cache.set(key, (content, response['Content-Type']), settings.PAGE_CACHE_TIMEOUT)
+
+        # A page rendered with a CSRF token carries that visitor's token and Set-Cookie, so shared caches must not keep it.
+        if response.cookies or request.META.get('CSRF_COOKIE_NEEDS_UPDATE'):
+            patch_cache_control(response, private=True, max_age=settings.PAGE_CACHE_MAX_AGE)
+        else:
+            patch_cache_control(response, public=True, max_age=settings.PAGE_CACHE_MAX_AGE)
+        patch_vary_headers(response, ('Accept-Language', 'Cookie'))
+        return response
+
+    return wrapper
@@ -0,0 +1,96 @@
+from .models import ReadingMaterials
+
+
+# The only columns a material card renders, fetched in one query joined with the author.
+CARD_COLUMNS = ('pk', 'title', 'price', 'image', 'author__display_name')
+
+
+
+class MaterialCard:
+    """
+    Compact, read-only row of a reading material as shown on list, category and search cards.
+    Unlike a model instance it holds no summary or other unrendered field, and its author name is already loaded.
+    Attributes:
+        pk (int): The ID of the reading material.
+        title (str): The title.
+        price (Decimal): The price.
+        image (str): The name of the cover image in the media storage, empty if there is none.
+        author_name (str): The author's display name, empty if the material has no author.
+    Methods:
+        image_url(): Returns the URL of the cover image.
+    """
+    __slots__ = ('pk', 'title', 'price', 'image', 'author_name')
+
+    def __init__(self, pk, title, price, image, author_name):
+        self.pk = pk
+        self.title = title
+        self.price = price
+        self.image = image or ''
+        self.author_name = author_name or ''
+
+    @property
+    def image_url(self):
+        return ReadingMaterials._meta.get_field('image').storage.url(self.image) if self.image else ''
+
+    def __repr__(self):
+        return f'<MaterialCard {self.pk}: {self.title}>'
+
+
+def material_cards(queryset):
+    """
+    Loads the cards of the reading materials of a queryset, in its order, with one query.
+    Args:
+        queryset (QuerySet): Reading materials, possibly filtered, ordered and sliced.
+    Returns:
+        list: The MaterialCard of every material.
+    """
+    return [MaterialCard(*row) for row in queryset.values_list(*CARD_COLUMNS)]
+
+
+def cards_by_id(ids):
+    """
+    Loads the cards of the given reading materials, in the order of the IDs, with one query.
+    Args:
+        ids (list): IDs of reading materials.
+    Returns:
+        list: The MaterialCard of every material still in the catalog.
+    """
+    cards = {card.pk: card for card in material_cards(ReadingMaterials.objects.filter(pk__in=ids))}
+    return [cards[pk] for pk in ids if pk in cards]
+
+
+
+def cards_by_author(author_ids):
+    """
+    Loads the cards of the reading materials of the given authors, by title, with one query.
+    Args:
+        author_ids (list): IDs of authors.
+    Returns:
+        dict: {author_id: list of MaterialCard} for every given author, empty lists for authors without materials.
+    """
+    books = {author_id: [] for author_id in author_ids}
+    rows = ReadingMaterials.objects.filter(author_id__in=author_ids).order_by('title', 'pk').values_list('author_id', *CARD_COLUMNS)
+    for author_id, *row in rows:
+        books[author_id].append(MaterialCard(*row))
+    return books
+
+
+
+class CardList:
+    """
+    Sliceable, countable list of the cards of a queryset of reading materials, usable by Django's Paginator.
+    Only the cards of the requested slice are loaded.
+    """
+    def __init__(self, queryset):
+        self.queryset = queryset
+
+    def count(self):
+        return self.queryset.count()
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+        return material_cards(self.queryset[key])
@@ -0,0 +1,51 @@
+from collections import Counter
+from django.db import transaction
+from django.db.models import Count, F
+from .models import Category, ReadingMaterials
+
+
+
+def adjust_material_count(category_id, delta):
+    """
+    Adds `delta` to the material count of a category and of all its ancestors, with one UPDATE on the primary key.
+    Args:
+        category_id (int or None): The ID of the category the material entered or left.
+        delta (int): The change, +1 or -1.
+    """
+    if not category_id or not delta:
+        return
+    path = Category.objects.filter(pk=category_id).values_list('path', flat=True).first()
+    if path:
+        ancestor_ids = [int(pk) for pk in path.split('/') if pk]
+        Category.objects.filter(pk__in=ancestor_ids).update(material_count=F('material_count') + delta)
+
+
+def rebuild_category_index():
+    """
+    Recomputes the path, depth and material count of every category from the parent links and the materials.
+    Needed only when rows were changed without going through Category.save() or the model signals,
+    e.g. with QuerySet.update().
+    Returns:
+        int: The number of categories.
+    """
+    with transaction.atomic():
+        categories = list(Category.objects.only('parent_id'))
+        by_parent = {}
+        for category in categories:
+            by_parent.setdefault(category.parent_id, []).append(category)
+        direct = Counter(dict(
+            ReadingMaterials.objects.filter(category__isnull=False).values_list('category').annotate(count=Count('id'))
+        ))
+
+        stack = [(category, '', 0) for category in by_parent.get(None, [])]
+        while stack:
+            category, prefix, depth = stack.pop()
+            category.path, category.depth, category.material_count = f'{prefix}{category.pk}/', depth, 0
+            stack.extend((child, category.path, depth + 1) for child in by_parent.get(category.pk, []))
+        by_pk = {category.pk: category for category in categories}
+        for category_id, count in direct.items():
+            for ancestor_id in by_pk[category_id].ancestor_ids():
+                by_pk[ancestor_id].material_count += count
+
+        Category.objects.bulk_update(categories, ['path', 'depth', 'material_count'], batch_size=500)
+    return len(categories)
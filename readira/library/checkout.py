@@ -0,0 +1,63 @@
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from .models import CheckoutClaim
+
+
+
+def claim_order_token(user, token):
+    """
+    Claims the order token of a cart for its checkout. Must be called inside the checkout transaction, before any
+    other write: the claim is released if the transaction rolls back, e.g. because a material sold out.
+    Contention on one token is resolved by its unique index entry alone, without locking the table.
+    Args:
+        user (CustomUser): The user checking out.
+        token (str): The order token.
+    Returns:
+        CheckoutClaim or None: The claim, None if the token was already used by a completed checkout.
+    """
+    try:
+        with transaction.atomic():
+            return CheckoutClaim.objects.create(user=user, token=token)
+    except IntegrityError:
+        return None
+
+
+def checkout_completed(user, token):
+    """
+    Tells whether a checkout already went through with the given order token, with one unique index lookup.
+    Args:
+        user (CustomUser): The user checking out.
+        token (str): The order token.
+    Returns:
+        bool: True if the token was claimed by a committed checkout of the user.
+    """
+    return CheckoutClaim.objects.filter(token=token, user=user).exists()
+
+
+def expire_checkout_claims(batch_size=None, now=None):
+    """
+    Deletes the checkout claims older than CHECKOUT_CLAIM_DAYS, in batches. By then the order token has long left
+    the session, so no submit can reuse it. Each batch is a range scan on the created_at index and one DELETE.
+    Args:
+        batch_size (int, optional): Number of claims per batch, CHECKOUT_CLAIM_SWEEP_BATCH by default.
+        now (datetime, optional): The reference time, the current time by default.
+    Returns:
+        int: The number of deleted claims.
+    """
+    batch_size = batch_size or settings.CHECKOUT_CLAIM_SWEEP_BATCH
+    cutoff = (now or timezone.now()) - timedelta(days=settings.CHECKOUT_CLAIM_DAYS)
+    deleted = 0
+    while True:
+        with transaction.atomic():
+            ids = list(
+                CheckoutClaim.objects.filter(created_at__lt=cutoff)
+                .order_by('created_at')
+                .values_list('pk', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            count, _ = CheckoutClaim.objects.filter(pk__in=ids).delete()
+            deleted += count
+    return deleted
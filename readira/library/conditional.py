@@ -0,0 +1,139 @@
+import hashlib
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.utils.translation import get_language
+from .models import Author, AuthorGenre, Rating, ReadingMaterials, Review
+from .ratings import rating_buffer
+
+
+
+def _related_subquery(model, aggregate):
+    """
+    Builds a scalar subquery aggregating the rows of `model` that point to the outer reading material.
+    """
+    return Subquery(
+        model.objects.filter(book=OuterRef('pk')).order_by().values('book').annotate(value=aggregate).values('value')[:1]
+    )
+
+
+def _viewer_state(request):
+    """
+    Returns the part of a page validator that depends on who is looking at the page:
+    language, user, CSRF secret (the rendered forms embed a token derived from it) and subscription status.
+    """
+    user = request.user
+    if not user.is_authenticated:
+        return f'{get_language()}:anonymous:{request.META.get("CSRF_COOKIE", "")}'
+    return f'{get_language()}:{user.pk}:{request.META.get("CSRF_COOKIE", "")}:{user.has_active_subscription}'
+
+
+def _make_etag(*parts):
+    return hashlib.sha1(':'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def material_state(request, pk):
+    """
+    Loads, in a single query, the timestamps and counters a reading material page depends on:
+    the material itself (its stock and loan counters move updated_at too), its author, the names of its genre
+    and category, its reviews and its ratings. The result is memoized on the request,
+    because both the ETag and the Last-Modified functions need it.
+    Args:
+        request (HttpRequest): The current request.
+        pk (int): The primary key of the reading material.
+    Returns:
+        dict or None: The state of the material, or None if it does not exist.
+    """
+    if not hasattr(request, '_material_state'):
+        request._material_state = ReadingMaterials.objects.filter(pk=pk).values(
+            'updated_at', 'author__updated_at', 'genre__name', 'category__name',
+        ).annotate(
+            review_count=_related_subquery(Review, Count('id')),
+            last_review=_related_subquery(Review, Max('updated_at')),
+            rating_count=_related_subquery(Rating, Count('id')),
+            last_rating=_related_subquery(Rating, Max('updated_at')),
+        ).first()
+    return request._material_state
+
+
+def _pending_rating(request, pk):
+    """
+    Returns the viewer's rating of the material still waiting in the rating buffer, which the page already shows.
+    """
+    if not request.user.is_authenticated:
+        return None
+    return rating_buffer.get((int(pk), request.user.pk))
+
+
+def material_etag(request, pk, **kwargs):
+    """
+    Computes the ETag of a reading material detail page, including the viewer's rating still waiting in the buffer.
+    Returns:
+        str or None: The ETag, or None if the material does not exist.
+    """
+    state = material_state(request, pk)
+    if state is None:
+        return None
+    return _make_etag(
+        'material', pk, _viewer_state(request), _pending_rating(request, pk), state['updated_at'].isoformat(), state['author__updated_at'],
+        state['genre__name'], state['category__name'], state['review_count'], state['last_review'], state['rating_count'], state['last_rating'],
+    )
+
+
+def material_last_modified(request, pk, **kwargs):
+    """
+    Computes the Last-Modified date of a reading material detail page: the newest change
+    to the material, its author, its reviews or its ratings.
+    While the viewer has a rating waiting in the buffer, the date is unknown: the database does not show it yet.
+    Returns:
+        datetime or None: The last modification date, or None if the material does not exist.
+    """
+    state = material_state(request, pk)
+    if state is None or _pending_rating(request, pk) is not None:
+        return None
+    return max(filter(None, (state['updated_at'], state['author__updated_at'], state['last_review'], state['last_rating'])))
+
+
+def author_state(request, pk):
+    """
+    Loads the timestamps and counters an author page depends on, memoized on the request:
+    the author, the newest change to their reading materials, their book count and the names of their genres,
+    which are inputs of the material pages too.
+    Args:
+        request (HttpRequest): The current request.
+        pk (int): The primary key of the author.
+    Returns:
+        dict or None: The state of the author, or None if the author does not exist.
+    """
+    if not hasattr(request, '_author_state'):
+        state = Author.objects.filter(pk=pk).values('updated_at', 'book_count').annotate(
+            last_material=Max('books__updated_at'),
+        ).order_by('pk').first()
+        if state is not None:
+            state['genres'] = list(
+                AuthorGenre.objects.filter(author_id=pk).order_by('-book_count', 'genre_id').values_list('genre__name', 'book_count')
+            )
+        request._author_state = state
+    return request._author_state
+
+
+def author_etag(request, pk, **kwargs):
+    """
+    Computes the ETag of an author detail page.
+    Returns:
+        str or None: The ETag, or None if the author does not exist.
+    """
+    state = author_state(request, pk)
+    if state is None:
+        return None
+    return _make_etag(
+        'author', pk, _viewer_state(request), state['updated_at'].isoformat(), state['last_material'], state['book_count'], state['genres'],
+    )
+
+
+def author_last_modified(request, pk, **kwargs):
+    """
+    Returns the Last-Modified date of an author detail page: the newest change to the author or their reading materials.
+    """
+    state = author_state(request, pk)
+    if state is None:
+        return None
+    return max(filter(None, (state['updated_at'], state['last_material'])))
@@ -0,0 +1,42 @@
+import mimetypes
+from django.conf import settings
+from django.core import signing
+from django.http import Http404
+from django.urls import reverse
+
+
+SALT = 'library.delivery'
+
+mimetypes.add_type('application/epub+zip', '.epub')
+mimetypes.add_type('audio/mp4', '.m4b')
+
+
+
+def delivery_url(loan, material):
+    """
+    Issues a short-lived signed URL delivering the digital file of a borrowed reading material.
+    The token carries the file name and is bound to the loan and its borrower: the delivery view
+    serves it only to that user, and only while the loan is open.
+    Args:
+        loan (Loan): The open loan of the material.
+        material (ReadingMaterials): The borrowed material.
+    Returns:
+        str or None: The delivery URL, or None when the material has no digital file.
+    """
+    if not material.digital_file:
+        return None
+    token = signing.dumps({'f': material.digital_file.name, 'u': loan.user_id, 'l': loan.pk}, salt=SALT, compress=True)
+    return reverse('library:deliver_file', args=[token])
+
+
+def read_token(token):
+    """
+    Returns the file name, user ID and loan ID carried by a delivery token.
+    Raises:
+        Http404: If the token is forged or older than DELIVERY_URL_MAX_AGE.
+    """
+    try:
+        payload = signing.loads(token, salt=SALT, max_age=settings.DELIVERY_URL_MAX_AGE)
+        return payload['f'], payload['u'], payload['l']
+    except (signing.BadSignature, KeyError, TypeError):
+        raise Http404('Invalid or expired link.')
@@ -0,0 +1,336 @@
+import threading
+from decimal import Decimal
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from .cache import get_catalog_version
+from .cards import CardList, material_cards
+from .models import ReadingMaterials
+from .refdata import categories, genres
+
+
+PRICE_BANDS = [(Decimal(0), Decimal(5)), (Decimal(5), Decimal(10)), (Decimal(10), Decimal(20)), (Decimal(20), None)]
+RATING_BANDS = [1, 2, 3, 4]
+RATING_LOG_SEQ_KEY = 'facets:rating-log:seq'
+
+
+def _price_band(price):
+    for low, high in PRICE_BANDS:
+        if price >= low and (high is None or price < high):
+            return f'{low}-{high}' if high is not None else f'{low}+'
+    return None
+
+
+def _rating_band(rating_average):
+    band = int(rating_average)
+    return str(min(band, RATING_BANDS[-1])) if band >= RATING_BANDS[0] else None
+
+
+def rating_band(rating_average, rating_count):
+    """
+    Returns the rating facet value of a material, None while it has no rating.
+    """
+    return _rating_band(rating_average) if rating_count else None
+
+
+FACETS = {
+    'genre': (_('Genre'), lambda row: str(row['genre_id']) if row['genre_id'] else None),
+    'category': (_('Category'), lambda row: str(row['category_id']) if row['category_id'] else None),
+    'price': (_('Price'), lambda row: _price_band(row['price']) if row['price'] is not None else None),
+    'year': (_('Release year'), lambda row: str(row['release_date'].year) if row['release_date'] else None),
+    'rating': (_('Rating'), lambda row: rating_band(row['rating_average'], row['rating_count'])),
+    'available': (_('Availability'), lambda row: 'yes' if row['availability'] else 'no'),
+}
+
+
+
+def selection_from_query(query_dict):
+    """
+    Reads the selected facet values from the query string, e.g. ?genre=1&genre=4&price=5-10.
+    Args:
+        query_dict (QueryDict): request.GET.
+    Returns:
+        dict: {facet: set of values} for every facet with at least one selected value.
+    """
+    selection = {}
+    for facet in FACETS:
+        values = {value for value in query_dict.getlist(facet) if value}
+        if values:
+            selection[facet] = values
+    return selection
+
+
+def selection_filters(selection):
+    """
+    Translates a selection with at most one value per facet into queryset filters served by the catalog indexes.
+    Args:
+        selection (dict): {facet: set of values}.
+    Returns:
+        dict or None: Keyword filters for ReadingMaterials.objects.filter(), None if the selection has no SQL translation
+                      (several values for one facet, or an unknown value).
+    """
+    filters = {}
+    for facet, values in selection.items():
+        if len(values) != 1:
+            return None
+        value = next(iter(values))
+        try:
+            if facet in ('genre', 'category'):
+                filters[f'{facet}_id'] = int(value)
+            elif facet == 'price':
+                low, _sep, high = value.rstrip('+').partition('-')
+                filters['price__gte'] = Decimal(low)
+                if high:
+                    filters['price__lt'] = Decimal(high)
+            elif facet == 'year':
+                filters['release_date__year'] = int(value)
+            elif facet == 'rating':
+                band = int(value)
+                filters['rating_count__gt'] = 0
+                filters['rating_average__gte'] = band
+                if band < RATING_BANDS[-1]:
+                    filters['rating_average__lt'] = band + 1
+            elif facet == 'available':
+                filters['availability'] = value == 'yes'
+        except (ArithmeticError, ValueError):
+            return None
+    return filters
+
+
+
+class FacetIndex:
+    """
+    In-memory inverted index of the catalog facets.
+    Every material gets a bit position following the title order of the catalog, and every facet value
+    a bitmap (a Python int) of the materials having it. Filtering is a few AND/OR operations on the bitmaps,
+    facet counts are population counts, and the set bits of a filtered bitmap are already in list order.
+    The index is built with one query per catalog version and shared by the requests of the process.
+    Rating changes do not bump the catalog version: they are applied to the rating bitmaps in place.
+    Attributes:
+        ids (list): Material IDs by bit position.
+        positions (dict): Bit positions by material ID.
+        bitmaps (dict): {facet: {value: bitmap}}.
+        labels (dict): {facet: {value: label}}.
+        rating_seq (int): The last entry of the rating change log included in the index.
+    Methods:
+        - build(): Builds the index from the database.
+        - set_rating_bands(): Moves materials to their new rating band.
+        - mask(): Returns the bitmap of the materials matching a selection, optionally ignoring one facet.
+        - counts(): Returns the number of materials per facet value. Each facet is counted against the selection
+                    of the other facets, so the values of a multi-select facet keep meaningful counts.
+        - ids_between(): Returns the IDs of the matching materials between two ranks of the list.
+    """
+    def __init__(self, ids, bitmaps, labels, rating_seq=0):
+        self.ids = ids
+        self.positions = {pk: position for position, pk in enumerate(ids)}
+        self.bitmaps = bitmaps
+        self.labels = labels
+        self.rating_seq = rating_seq
+        self.all = (1 << len(ids)) - 1
+
+    @classmethod
+    def build(cls):
+        # Read first: changes logged while the rows are loaded are applied again afterwards, which is harmless.
+        rating_seq = cache.get(RATING_LOG_SEQ_KEY, 0)
+        rows = ReadingMaterials.objects.order_by('title', 'pk').values(
+            'pk', 'genre_id', 'category_id', 'price', 'release_date', 'rating_average', 'rating_count', 'availability',
+        )
+        ids = []
+        bitmaps = {facet: {} for facet in FACETS}
+        # Every band has a bitmap from the start, so set_rating_bands() never resizes a dict other threads iterate.
+        bitmaps['rating'] = {str(band): 0 for band in RATING_BANDS}
+        for position, row in enumerate(rows.iterator(chunk_size=2000)):
+            ids.append(row['pk'])
+            bit = 1 << position
+            for facet, (_label, value_of) in FACETS.items():
+                value = value_of(row)
+                if value is not None:
+                    bitmaps[facet][value] = bitmaps[facet].get(value, 0) | bit
+
+        labels = {
+            'genre': {str(genre.pk): genre.name for genre in genres.all()},
+            'category': {str(category.pk): category.name for category in categories.all()},
+            'price': {value: f'{value} €' for value in bitmaps['price']},
+            'year': {value: value for value in bitmaps['year']},
+            # Bands are ranges, [n, n + 1) and [4, 5] for the top one, matching selection_filters().
+            'rating': {value: f'{value}–{int(value) + 1} ★' for value in bitmaps['rating']},
+            'available': {'yes': _('Available'), 'no': _('Unavailable')},
+        }
+        return cls(ids, bitmaps, labels, rating_seq)
+
+    def set_rating_bands(self, bands):
+        """
+        Args:
+            bands (dict): {material_id: rating band or None}. Materials missing from the index are ignored.
+        """
+        ratings = self.bitmaps['rating']
+        for material_id, band in bands.items():
+            position = self.positions.get(material_id)
+            if position is None:
+                continue
+            bit = 1 << position
+            for value, bitmap in ratings.items():
+                if bitmap & bit and value != band:
+                    ratings[value] = bitmap & ~bit
+            if band is not None:
+                ratings[band] |= bit
+
+    def mask(self, selection, ignore=None):
+        mask = self.all
+        for facet, values in selection.items():
+            if facet == ignore:
+                continue
+            matching = 0
+            for value in values:
+                matching |= self.bitmaps[facet].get(value, 0)
+            mask &= matching
+        return mask
+
+    def counts(self, selection):
+        counts = {}
+        for facet, bitmaps in self.bitmaps.items():
+            mask = self.mask(selection, ignore=facet)
+            counts[facet] = {value: (mask & bitmap).bit_count() for value, bitmap in bitmaps.items()}
+        return counts
+
+    def ids_between(self, mask, start, stop):
+        bits = bin(mask)[:1:-1]
+        ids = []
+        position = bits.find('1')
+        rank = 0
+        while position != -1 and rank < stop:
+            if rank >= start:
+                ids.append(self.ids[position])
+            rank += 1
+            position = bits.find('1', position + 1)
+        return ids
+
+
+_index = (None, None)
+_index_lock = threading.Lock()
+
+
+def publish_rating_bands(bands):
+    """
+    Appends rating band changes to the change log in the shared cache, from which every process
+    patches its facet index. Call it once the new averages are committed.
+    Args:
+        bands (dict): {material_id: rating band or None}.
+    """
+    cache.add(RATING_LOG_SEQ_KEY, 0, None)
+    seq = cache.incr(RATING_LOG_SEQ_KEY)
+    cache.set(f'facets:rating-log:{seq}', bands, settings.FACET_RATING_LOG_TIMEOUT)
+
+
+def _catch_up(index):
+    """
+    Applies the rating changes logged since the index was built or last caught up.
+    Returns:
+        bool: False when the log cannot bring the index up to date and it has to be rebuilt.
+    """
+    seq = cache.get(RATING_LOG_SEQ_KEY, 0)
+    if seq == index.rating_seq:
+        return True
+    if seq < index.rating_seq or seq - index.rating_seq > settings.FACET_RATING_LOG_SIZE:
+        return False
+    keys = [f'facets:rating-log:{n}' for n in range(index.rating_seq + 1, seq + 1)]
+    entries = cache.get_many(keys)
+    if len(entries) != len(keys):
+        # Expired, evicted, or still being written: a rebuild reads the committed averages.
+        return False
+    for key in keys:
+        index.set_rating_bands(entries[key])
+    index.rating_seq = seq
+    return True
+
+
+def get_facet_index():
+    """
+    Returns the facet index of the current catalog version, rebuilding it after catalog changes
+    and patching it with the rating changes logged since.
+    Returns:
+        FacetIndex: The index.
+    """
+    global _index
+    version = get_catalog_version()
+    if _index[0] != version or _index[1].rating_seq != cache.get(RATING_LOG_SEQ_KEY, 0):
+        with _index_lock:
+            if _index[0] != version or not _catch_up(_index[1]):
+                _index = (version, FacetIndex.build())
+    return _index[1]
+
+
+
+class BitmapResult:
+    """
+    Sliceable, countable list of the cards of the materials matching a facet bitmap, usable by Django's Paginator.
+    Only the cards of the requested slice are loaded, with one primary key query.
+    """
+    def __init__(self, index, mask, queryset):
+        self.index = index
+        self.mask = mask
+        self.queryset = queryset
+
+    def count(self):
+        return self.mask.bit_count()
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+        ids = self.index.ids_between(self.mask, key.start or 0, key.stop if key.stop is not None else self.count())
+        cards = {card.pk: card for card in material_cards(self.queryset.filter(pk__in=ids))}
+        return [cards[pk] for pk in ids if pk in cards]
+
+
+
+def facet_results(selection, queryset):
+    """
+    Returns the cards of the materials matching a facet selection, in title order.
+    A selection with at most one value per facet is a plain filtered queryset, served by the composite catalog indexes;
+    multi-select selections are resolved on the bitmaps of the facet index.
+    Args:
+        selection (dict): {facet: set of values}.
+        queryset (QuerySet): The base queryset of the list.
+    Returns:
+        CardList or BitmapResult: The cards of the matching materials.
+    """
+    filters = selection_filters(selection)
+    if filters is not None:
+        return CardList(queryset.filter(**filters).order_by('title', 'pk'))
+    index = get_facet_index()
+    return BitmapResult(index, index.mask(selection), queryset)
+
+
+def _sort_key(facet, item):
+    if facet == 'price':
+        return [_price_band(low) for low, _high in PRICE_BANDS].index(item['value'])
+    if facet in ('year', 'rating'):
+        return -int(item['value'])
+    return str(item['label'])
+
+
+def facet_groups(selection):
+    """
+    Builds the facet sidebar: for every facet, its values with their labels, counts and selection state.
+    Counts come from the facet index, never from a GROUP BY over the catalog.
+    Args:
+        selection (dict): {facet: set of values}.
+    Returns:
+        list: [{'name', 'label', 'values': [{'value', 'label', 'count', 'selected'}]}].
+    """
+    index = get_facet_index()
+    counts = index.counts(selection)
+    groups = []
+    for facet, (label, _value_of) in FACETS.items():
+        selected = selection.get(facet, set())
+        values = [
+            {'value': value, 'label': index.labels[facet].get(value, value), 'count': count, 'selected': value in selected}
+            for value, count in counts[facet].items()
+            if count or value in selected
+        ]
+        values.sort(key=lambda item: _sort_key(facet, item))
+        groups.append({'name': facet, 'label': label, 'values': values})
+    return groups
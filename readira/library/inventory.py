@@ -0,0 +1,157 @@
+from collections import Counter
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import CartReservation, ReadingMaterials
+from .objcache import material_cache
+
+
+
+class OutOfStock(Exception):
+    """
+    Raised when there are not enough copies of a reading material left to honor a reservation or a purchase.
+    Attributes:
+        material_id (int): The ID of the reading material that ran out.
+    """
+    def __init__(self, material_id):
+        super().__init__(f'Reading material {material_id} is out of stock.')
+        self.material_id = material_id
+
+
+
+def take_stock(material_id, quantity):
+    """
+    Atomically takes copies out of a material's stock with a conditional
+    UPDATE ... SET stock = stock - quantity WHERE stock >= quantity, so concurrent buyers can never oversell.
+    Materials whose stock is not tracked always succeed.
+    Args:
+        material_id (int): The ID of the reading material.
+        quantity (int): The number of copies to take.
+    Raises:
+        OutOfStock: If fewer than `quantity` copies are left.
+    """
+    if quantity <= 0:
+        return
+    # updated_at moves with the counter: it is the HTTP validator of the material page.
+    if ReadingMaterials.objects.filter(pk=material_id, stock__gte=quantity).update(stock=F('stock') - quantity, updated_at=timezone.now()):
+        material_cache.invalidate(material_id)
+        return
+    if ReadingMaterials.objects.filter(pk=material_id, stock__isnull=False).exists():
+        raise OutOfStock(material_id)
+
+
+def return_stock(material_id, quantity):
+    """
+    Atomically puts copies back into a material's stock. Materials whose stock is not tracked are left untouched.
+    Args:
+        material_id (int): The ID of the reading material.
+        quantity (int): The number of copies to give back.
+    """
+    if quantity > 0 and ReadingMaterials.objects.filter(pk=material_id, stock__isnull=False).update(
+        stock=F('stock') + quantity, updated_at=timezone.now(),
+    ):
+        material_cache.invalidate(material_id)
+
+
+def reserve(user, material_id, quantity):
+    """
+    Holds copies of a reading material for a user's cart for CART_RESERVATION_MINUTES.
+    Adding a material that is already reserved extends the reservation and restarts its timer.
+    Args:
+        user (CustomUser): The user adding the material to the cart.
+        material_id (int): The ID of the reading material.
+        quantity (int): The number of extra copies to hold.
+    Raises:
+        OutOfStock: If fewer than `quantity` copies are left.
+    """
+    expires_at = timezone.now() + timedelta(minutes=settings.CART_RESERVATION_MINUTES)
+    with transaction.atomic():
+        take_stock(material_id, quantity)
+        updated = CartReservation.objects.filter(user=user, material_id=material_id).update(
+            quantity=F('quantity') + quantity, expires_at=expires_at,
+        )
+        if not updated:
+            CartReservation.objects.create(user=user, material_id=material_id, quantity=quantity, expires_at=expires_at)
+
+
+def _claim_reservation(user, material_id):
+    """
+    Deletes a user's reservation of a material and returns the number of copies it held.
+    Only the caller that actually deletes the row gets the copies, so a reservation can never be
+    both released by the sweeper and consumed by a checkout.
+    """
+    reservation = CartReservation.objects.filter(user=user, material_id=material_id).only('quantity').first()
+    if reservation is None:
+        return 0
+    deleted, _ = CartReservation.objects.filter(pk=reservation.pk, quantity=reservation.quantity).delete()
+    return reservation.quantity if deleted else 0
+
+
+def release(user, material_id):
+    """
+    Gives back the copies a user holds for a material, e.g. when it is removed from the cart.
+    Args:
+        user (CustomUser): The user holding the reservation.
+        material_id (int): The ID of the reading material.
+    """
+    with transaction.atomic():
+        return_stock(material_id, _claim_reservation(user, material_id))
+
+
+def consume_reservations(user, items):
+    """
+    Turns a user's reservations into a purchase. Must run inside the checkout transaction.
+    Copies already held by a reservation are used first; expired or missing reservations are
+    topped up from the remaining stock, and copies held beyond the purchased quantity go back to stock.
+    Args:
+        user (CustomUser): The buyer.
+        items (dict): {material_id: quantity} mapping of the purchased materials.
+    Raises:
+        OutOfStock: If a material cannot be fully covered; the surrounding transaction must be rolled back.
+    """
+    for material_id, quantity in items.items():
+        reserved = _claim_reservation(user, material_id)
+        if reserved >= quantity:
+            return_stock(material_id, reserved - quantity)
+        else:
+            take_stock(material_id, quantity - reserved)
+
+
+def release_expired_reservations(batch_size=None, now=None):
+    """
+    Releases expired cart reservations in batches, giving their copies back to stock.
+    Each batch is an index range scan on expires_at, one stock UPDATE per distinct material and one DELETE,
+    all in a single short transaction.
+    Args:
+        batch_size (int, optional): Number of reservations per batch, RESERVATION_SWEEP_BATCH by default.
+        now (datetime, optional): The reference time, the current time by default.
+    Returns:
+        int: The number of released reservations.
+    """
+    batch_size = batch_size or settings.RESERVATION_SWEEP_BATCH
+    now = now or timezone.now()
+    released = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                CartReservation.objects.filter(expires_at__lt=now)
+                .order_by('expires_at')
+                .values_list('pk', 'material_id', 'quantity')[:batch_size]
+            )
+            if not batch:
+                break
+            ids = [pk for pk, _, _ in batch]
+            deleted, _ = CartReservation.objects.filter(pk__in=ids).delete()
+            if deleted != len(ids):
+                # Another process consumed some of these reservations in the meantime: start over with fresh rows.
+                transaction.set_rollback(True)
+                continue
+            quantities = Counter()
+            for _, material_id, quantity in batch:
+                quantities[material_id] += quantity
+            for material_id, quantity in quantities.items():
+                return_stock(material_id, quantity)
+        released += len(batch)
+    return released
@@ -0,0 +1,167 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, connection, connections, transaction
+from django.db.models import Case, Count, F, Min, PositiveSmallIntegerField, Q, TextField, Value, When
+from django.utils import timezone
+from .leases import claim_due, retry_delay
+from .models import Job
+
+
+TASKS = {}
+
+
+
+def task(func):
+    """
+    Registers a function as a task of the job queue, under '<module>.<name>'.
+    Args:
+        func (callable): The task; its arguments must be JSON-serializable.
+    Returns:
+        callable: The function, unchanged.
+    """
+    TASKS[f'{func.__module__}.{func.__name__}'] = func
+    return func
+
+
+def enqueue(func, *args, key=None, delay=0, max_attempts=None):
+    """
+    Queues a task run. Call it inside the transaction of the change that requires it:
+    the job becomes visible to the workers when that transaction commits, and costs the request a single INSERT.
+    Args:
+        func (callable): A registered task.
+        *args: The arguments of the task.
+        key (str, optional): Deduplication key: if a job with this key is still pending, no new job is queued.
+        delay (float, optional): Seconds before the job is due, e.g. to coalesce a burst of edits into one run.
+        max_attempts (int, optional): Number of runs before giving up, JOB_MAX_ATTEMPTS by default.
+    Returns:
+        Job or None: The queued job, None if a pending job already had the key.
+    """
+    job = Job(
+        task=f'{func.__module__}.{func.__name__}',
+        args=list(args),
+        key=key,
+        available_at=timezone.now() + timedelta(seconds=delay),
+        max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS,
+    )
+    if key is None:
+        job.save()
+        return job
+    try:
+        with transaction.atomic():
+            job.save()
+        return job
+    except IntegrityError:
+        return None
+
+
+def claim_jobs(batch_size, now=None):
+    """
+    Claims due jobs for this worker: pending jobs whose time has come, and running jobs whose lease expired
+    because their worker died. Claiming moves them to running and sets available_at to the end of a
+    JOB_LEASE_SECONDS lease, with a conditional UPDATE, so two workers never claim the same job.
+    An expired lease counts as a failed run, so a job that keeps killing its worker is given up after max_attempts.
+    Args:
+        batch_size (int): Maximum number of jobs to claim.
+        now (datetime, optional): The reference time, the current time by default.
+    Returns:
+        list: The IDs of the claimed jobs.
+    """
+    now = now or timezone.now()
+    expired = Q(status=Job.Status.RUNNING)
+    claimed = claim_due(
+        Job, batch_size, now, settings.JOB_LEASE_SECONDS,
+        due=Q(status__in=[Job.Status.PENDING, Job.Status.RUNNING]),
+        status=Job.Status.RUNNING,
+        attempts=Case(When(expired, then=F('attempts') + 1), default=F('attempts'), output_field=PositiveSmallIntegerField()),
+        last_error=Case(
+            When(expired, then=Value('Lease expired: the worker running the job died or timed out.')),
+            default=F('last_error'), output_field=TextField(),
+        ),
+    )
+    claimed.filter(attempts__gte=F('max_attempts')).update(status=Job.Status.FAILED, finished_at=now)
+    return list(claimed.values_list('pk', flat=True))
+
+
+def run_job(job_id):
+    """
+    Runs one claimed job and records the outcome. A job that succeeds is deleted; a failing job is retried with
+    exponential backoff, starting at JOB_RETRY_DELAY seconds and capped at JOB_MAX_RETRY_DELAY, until it ran max_attempts times.
+    Outcomes are only recorded while this worker still holds the job's lease.
+    Args:
+        job_id (int): The ID of a job claimed by this worker.
+    Returns:
+        bool: True if the job succeeded.
+    """
+    try:
+        job = Job.objects.get(pk=job_id)
+        # The lease guard leaves the job alone if it ran past its lease and another worker claimed it again.
+        leased = Job.objects.filter(pk=job.pk, status=Job.Status.RUNNING, available_at=job.available_at)
+        try:
+            TASKS[job.task](*job.args)
+        except Exception as exc:
+            now = timezone.now()
+            attempts = job.attempts + 1
+            outcome = {'attempts': attempts, 'last_error': f'{type(exc).__name__}: {exc}'}
+            if attempts >= job.max_attempts:
+                outcome.update(status=Job.Status.FAILED, finished_at=now)
+            else:
+                outcome.update(
+                    status=Job.Status.PENDING,
+                    available_at=now + retry_delay(attempts, settings.JOB_RETRY_DELAY, settings.JOB_MAX_RETRY_DELAY),
+                )
+            try:
+                with transaction.atomic():
+                    leased.update(**outcome)
+            except IntegrityError:
+                # A job with the same key was queued while this one ran: that pending job is the retry.
+                leased.delete()
+            return False
+        # Finished jobs are deleted, keeping the queue table small.
+        leased.delete()
+        return True
+    finally:
+        connection.close()
+
+
+def run_jobs(batch_size=None, workers=None, processes=False):
+    """
+    Claims one batch of due jobs and runs it in a pool of threads, or of processes for CPU-bound tasks
+    such as image processing.
+    Args:
+        batch_size (int, optional): Maximum number of jobs to claim, JOB_BATCH_SIZE by default.
+        workers (int, optional): Size of the pool, JOB_WORKERS by default.
+        processes (bool, optional): Run the jobs in worker processes instead of threads.
+    Returns:
+        tuple: (succeeded, failed) counts of the batch.
+    """
+    ids = claim_jobs(batch_size or settings.JOB_BATCH_SIZE)
+    if not ids:
+        return 0, 0
+    if processes:
+        # Forked children must not share the parent's database connections.
+        connections.close_all()
+        pool = ProcessPoolExecutor(max_workers=workers or settings.JOB_WORKERS)
+    else:
+        pool = ThreadPoolExecutor(max_workers=workers or settings.JOB_WORKERS)
+    with pool:
+        results = list(pool.map(run_job, ids))
+    return results.count(True), results.count(False)
+
+
+def queue_depth():
+    """
+    Reports the state of the job queue, with one aggregate query.
+    Returns:
+        dict: {'pending', 'running', 'failed'} job counts and 'oldest_due', the due time of the oldest pending job (or None).
+    """
+    rows = {
+        row['status']: row
+        for row in Job.objects.values('status').annotate(count=Count('pk'), oldest=Min('available_at'))
+    }
+    return {
+        'pending': rows.get(Job.Status.PENDING, {}).get('count', 0),
+        'running': rows.get(Job.Status.RUNNING, {}).get('count', 0),
+        'failed': rows.get(Job.Status.FAILED, {}).get('count', 0),
+        'oldest_due': rows.get(Job.Status.PENDING, {}).get('oldest'),
+    }
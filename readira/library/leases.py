@@ -0,0 +1,42 @@
+from datetime import timedelta
+from django.db.models import Q
+
+
+
+def claim_due(model, batch_size, now, lease_seconds, due=Q(), **claimed):
+    """
+    Leases the due rows of a queue table (a model with an available_at column) to the calling worker.
+    Pushing available_at past the lease both claims the rows, so two workers never take the same one,
+    and hands them back automatically if the worker dies before settling them. The claim is one conditional UPDATE:
+    of two workers selecting the same rows, only the first one's UPDATE matches them.
+    Args:
+        model (Model): The queue model.
+        batch_size (int): Maximum number of rows to claim.
+        now (datetime): The reference time: rows with available_at up to it are due.
+        lease_seconds (float): Duration of the lease.
+        due (Q, optional): Further condition a row must meet to be claimed, e.g. its status.
+                           Rows must still meet it once claimed.
+        **claimed: Other values written to the claimed rows, e.g. a running status.
+    Returns:
+        QuerySet: The rows this worker claimed, their available_at being the end of the lease.
+    """
+    ids = list(
+        model.objects.filter(due, available_at__lte=now)
+        .order_by('available_at')
+        .values_list('pk', flat=True)[:batch_size]
+    )
+    if not ids:
+        return model.objects.none()
+    lease_until = now + timedelta(seconds=lease_seconds)
+    model.objects.filter(due, pk__in=ids, available_at__lte=now).update(available_at=lease_until, **claimed)
+    return model.objects.filter(due, pk__in=ids, available_at=lease_until)
+
+
+def retry_delay(attempts, delay, max_delay):
+    """
+    Exponential backoff: the delay before the next attempt after `attempts` failed ones,
+    `delay` seconds after the first failure, doubling after each further one, capped at `max_delay` seconds.
+    Returns:
+        timedelta: The delay.
+    """
+    return timedelta(seconds=min(delay * 2 ** (attempts - 1), max_delay))
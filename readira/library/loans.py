@@ -0,0 +1,162 @@
+from collections import Counter
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from user_account.models import CustomUser
+from .models import Loan, ReadingMaterials, Subscription
+from .objcache import material_cache
+
+
+
+class LoanRefused(Exception):
+    """
+    Raised when a reading material cannot be borrowed.
+    Attributes:
+        reason (str): One of NO_SUBSCRIPTION, QUOTA_REACHED or NO_COPIES.
+    """
+    NO_SUBSCRIPTION = 'no_subscription'
+    QUOTA_REACHED = 'quota_reached'
+    NO_COPIES = 'no_copies'
+
+    messages = {
+        NO_SUBSCRIPTION: 'You need an active subscription to borrow reading materials.',
+        QUOTA_REACHED: 'You have reached the number of loans allowed by your plan. Return a reading material first.',
+        NO_COPIES: 'All copies of this reading material are currently on loan.',
+    }
+
+    def __init__(self, reason):
+        super().__init__(self.messages[reason])
+        self.reason = reason
+
+
+
+def _open_loan(user, material_id):
+    return Loan.objects.filter(user=user, material_id=material_id, returned_at__isnull=True).first()
+
+
+def has_open_loan(user_id, material_id):
+    """
+    Tells whether a user currently holds a reading material, with one lookup on the open-loan unique index.
+    """
+    return Loan.objects.filter(user_id=user_id, material_id=material_id, returned_at__isnull=True).exists()
+
+
+def _borrow(user, material_id, now):
+    # Locking the user row serializes the borrows of one user, so two clicks cannot both pass the quota check.
+    # SQLite ignores FOR UPDATE; there the IMMEDIATE transaction of borrow() serializes all writers instead.
+    CustomUser.objects.select_for_update().filter(pk=user.pk).values_list('pk', flat=True).first()
+
+    loan = _open_loan(user, material_id)
+    if loan is not None:
+        return loan
+
+    subscription = (
+        Subscription.objects.filter(user=user, active=True, end_date__gte=now)
+        .select_related('plan')
+        .only('plan__max_loans')
+        .order_by('-end_date')
+        .first()
+    )
+    if subscription is None:
+        raise LoanRefused(LoanRefused.NO_SUBSCRIPTION)
+    max_loans = subscription.plan.max_loans if subscription.plan else 0
+    if Loan.objects.filter(user=user, returned_at__isnull=True).count() >= max_loans:
+        raise LoanRefused(LoanRefused.QUOTA_REACHED)
+
+    # UPDATE ... SET active_loans = active_loans + 1 WHERE loan_copies IS NULL OR active_loans < loan_copies
+    # updated_at moves with the counter: it is the HTTP validator of the material page.
+    taken = ReadingMaterials.objects.filter(
+        Q(loan_copies__isnull=True) | Q(active_loans__lt=F('loan_copies')), pk=material_id,
+    ).update(active_loans=F('active_loans') + 1, updated_at=now)
+    if not taken:
+        raise LoanRefused(LoanRefused.NO_COPIES)
+    material_cache.invalidate(material_id)
+
+    return Loan.objects.create(
+        user=user,
+        material_id=material_id,
+        borrowed_at=now,
+        due_date=now + timedelta(days=settings.LOAN_DAYS),
+    )
+
+
+def borrow(user, material_id):
+    """
+    Opens a loan of a reading material for a user.
+    The subscription, quota and copy checks and the insert run in one transaction, each backed by an index:
+    the open-loan partial indexes for the quota, a conditional UPDATE of the material's loan counter for the copies,
+    and the open-loan unique constraint for duplicates. Borrowing a material the user already holds returns the open loan.
+    Args:
+        user (CustomUser): The borrower.
+        material_id (int): The ID of the reading material.
+    Returns:
+        Loan: The open loan.
+    Raises:
+        LoanRefused: If the user has no active subscription, reached the plan's quota, or no copy is left.
+    """
+    try:
+        with transaction.atomic():
+            return _borrow(user, material_id, timezone.now())
+    except IntegrityError:
+        # A concurrent click opened the same loan first; its transaction owns the counter increment.
+        return _open_loan(user, material_id)
+
+
+def return_loans(user, material_ids):
+    """
+    Closes a user's open loans of the given materials and gives their copies back.
+    Args:
+        user (CustomUser): The borrower.
+        material_ids (iterable): IDs of the returned reading materials.
+    Returns:
+        int: The number of closed loans.
+    """
+    return _close_loans(Loan.objects.filter(user=user, material_id__in=list(material_ids)), timezone.now())
+
+
+def _close_loans(loans, now):
+    while True:
+        with transaction.atomic():
+            batch = list(loans.filter(returned_at__isnull=True).values_list('pk', 'material_id'))
+            if not batch:
+                return 0
+            closed = Loan.objects.filter(pk__in=[pk for pk, _ in batch], returned_at__isnull=True).update(returned_at=now)
+            if closed != len(batch):
+                # Another process closed some of these loans in the meantime: leave the counters to it and start over.
+                transaction.set_rollback(True)
+                continue
+            counts = Counter(material_id for _, material_id in batch)
+            for material_id, count in counts.items():
+                ReadingMaterials.objects.filter(pk=material_id, active_loans__gte=count).update(
+                    active_loans=F('active_loans') - count, updated_at=now,
+                )
+            material_cache.invalidate(*counts)
+        return closed
+
+
+def expire_loans(batch_size=None, now=None):
+    """
+    Closes overdue loans in batches, giving their copies back.
+    Each batch is a range scan on the open-loan due date index, one UPDATE of the loans and
+    one counter UPDATE per distinct material, all in a single short transaction.
+    Args:
+        batch_size (int, optional): Number of loans per batch, LOAN_SWEEP_BATCH by default.
+        now (datetime, optional): The reference time, the current time by default.
+    Returns:
+        int: The number of closed loans.
+    """
+    batch_size = batch_size or settings.LOAN_SWEEP_BATCH
+    now = now or timezone.now()
+    expired = 0
+    while True:
+        ids = list(
+            Loan.objects.filter(returned_at__isnull=True, due_date__lt=now)
+            .order_by('due_date')
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        if not ids:
+            break
+        expired += _close_loans(Loan.objects.filter(pk__in=ids), now)
+    return expired
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from library.checkout import expire_checkout_claims
+
+
+
+class Command(BaseCommand):
+    """
+    Deletes the checkout claims that can no longer stop a repeated submit.
+    Meant to run daily from cron or another scheduler.
+    """
+    help = 'Deletes old checkout claims in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help='Number of claims deleted per transaction.')
+
+    def handle(self, *args, **options):
+        deleted = expire_checkout_claims(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired checkout claim(s).'))
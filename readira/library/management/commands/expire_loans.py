@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from library.loans import expire_loans
+
+
+
+class Command(BaseCommand):
+    """
+    Closes overdue loans and gives their copies back to the lending pool.
+    Meant to run regularly from cron or another scheduler.
+    """
+    help = 'Closes overdue loans in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help='Number of loans processed per transaction.')
+
+    def handle(self, *args, **options):
+        expired = expire_loans(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Closed {expired} overdue loan(s).'))
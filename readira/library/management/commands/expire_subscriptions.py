@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from library.subscriptions import expire_subscriptions, renew_subscriptions
+
+
+
+class Command(BaseCommand):
+    """
+    Renews auto-renewing subscriptions that ended and deactivates the other ended subscriptions.
+    Meant to run regularly from cron or another scheduler, so entitlement checks only see a small, clean active set.
+    """
+    help = 'Renews and expires ended subscriptions in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help='Number of subscriptions processed per transaction.')
+
+    def handle(self, *args, **options):
+        renewed = renew_subscriptions(batch_size=options['batch_size'])
+        expired = expire_subscriptions(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Renewed {renewed} and expired {expired} subscription(s).'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from library.categories import rebuild_category_index
+
+
+
+class Command(BaseCommand):
+    """
+    Recomputes the materialized paths and material counts of the category hierarchy,
+    e.g. after bulk changes made with QuerySet.update() or raw SQL.
+    """
+    help = 'Rebuilds the category hierarchy index and material counts.'
+
+    def handle(self, *args, **options):
+        count = rebuild_category_index()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt the index of {count} categories.'))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from library.search import rebuild_search_index
+
+
+
+class Command(BaseCommand):
+    """
+    Rebuilds the normalized search terms of reading material titles and author names,
+    e.g. after bulk changes made with QuerySet.update(), bulk_create() or raw SQL.
+    """
+    help = 'Rebuilds the accent-insensitive search index.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Number of rows indexed per transaction.')
+
+    def handle(self, *args, **options):
+        count = rebuild_search_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} reading materials and authors.'))
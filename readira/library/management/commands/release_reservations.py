@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from library.inventory import release_expired_reservations
+
+
+
+class Command(BaseCommand):
+    """
+    Gives the copies held by expired cart reservations back to stock.
+    Meant to run every minute or so from cron or another scheduler.
+    """
+    help = 'Releases expired cart reservations in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help='Number of reservations released per transaction.')
+
+    def handle(self, *args, **options):
+        released = release_expired_reservations(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Released {released} expired reservation(s).'))
@@ -0,0 +1,51 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from library.jobs import queue_depth, run_jobs
+
+
+
+class Command(BaseCommand):
+    """
+    Runs the jobs of the background job queue.
+    Runs as a long-lived local worker process, polling the queue every JOB_POLL_INTERVAL seconds when it is empty;
+    with --once it runs the due jobs and exits, and with --stats it only reports the queue depth.
+    """
+    help = 'Claims and runs background jobs in a thread or process pool, with retries and lease timeouts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help='Number of jobs claimed per batch.')
+        parser.add_argument('--workers', type=int, default=None, help='Size of the thread or process pool.')
+        parser.add_argument('--processes', action='store_true', help='Run the jobs in a process pool instead of threads.')
+        parser.add_argument('--once', action='store_true', help='Run the due jobs once and exit.')
+        parser.add_argument('--stats', action='store_true', help='Report the queue depth and exit.')
+
+    def report(self):
+        depth = queue_depth()
+        oldest = depth['oldest_due'].isoformat() if depth['oldest_due'] else '-'
+        self.stdout.write(f"Queue: {depth['pending']} pending (oldest due {oldest}), {depth['running']} running, {depth['failed']} failed.")
+
+    def run_batch(self, options):
+        succeeded, failed = run_jobs(batch_size=options['batch_size'], workers=options['workers'], processes=options['processes'])
+        if succeeded or failed:
+            self.stdout.write(f'Ran {succeeded + failed} job(s): {succeeded} succeeded, {failed} failed.')
+        return succeeded + failed
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            self.report()
+            return
+
+        if options['once']:
+            while self.run_batch(options):
+                pass
+            self.report()
+            return
+
+        self.stdout.write('Job worker started. Press Ctrl+C to stop.')
+        try:
+            while True:
+                if not self.run_batch(options):
+                    time.sleep(settings.JOB_POLL_INTERVAL)
+        except KeyboardInterrupt:
+            self.stdout.write('Job worker stopped.')
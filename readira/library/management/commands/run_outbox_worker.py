@@ -0,0 +1,32 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from library.outbox import drain_outbox
+
+
+
+class Command(BaseCommand):
+    """
+    Sends the notifications recorded in the outbox.
+    Runs as a long-lived local worker process, polling the outbox every OUTBOX_POLL_INTERVAL seconds when it is empty;
+    with --once it drains the due events and exits, e.g. to run from cron.
+    """
+    help = 'Delivers pending outbox events in batches, with retries and backoff.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help='Number of events claimed per batch.')
+        parser.add_argument('--once', action='store_true', help='Drain the due events once and exit.')
+
+    def handle(self, *args, **options):
+        if options['once']:
+            delivered = drain_outbox(batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Delivered {delivered} event(s).'))
+            return
+
+        self.stdout.write('Outbox worker started. Press Ctrl+C to stop.')
+        try:
+            while True:
+                if not drain_outbox(batch_size=options['batch_size']):
+                    time.sleep(settings.OUTBOX_POLL_INTERVAL)
+        except KeyboardInterrupt:
+            self.stdout.write('Outbox worker stopped.')
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.3 on 2026-10-19 14:14
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_review_count(apps, schema_editor):
+    ReadingMaterials = apps.get_model('library', 'ReadingMaterials')
+    Review = apps.get_model('library', 'Review')
+    counts = Review.objects.filter(book=OuterRef('pk')).order_by().values('book').annotate(total=Count('id')).values('total')[:1]
+    ReadingMaterials.objects.update(review_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0006_author_updated_at_rating_updated_at_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='readingmaterials',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_review_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.3 on 2026-10-19 14:15
+
+from django.db import migrations, models
+from django.db.models import Avg, Count
+
+
+def backfill_rating_aggregates(apps, schema_editor):
+    ReadingMaterials = apps.get_model('library', 'ReadingMaterials')
+    Rating = apps.get_model('library', 'Rating')
+    stats = Rating.objects.filter(book__isnull=False).values('book').annotate(count=Count('id'), average=Avg('value'))
+    ReadingMaterials.objects.bulk_update(
+        [ReadingMaterials(pk=row['book'], rating_count=row['count'], rating_average=round(row['average'] or 0, 2)) for row in stats],
+        ['rating_count', 'rating_average'],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0007_readingmaterials_review_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='readingmaterials',
+            name='rating_average',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=3),
+        ),
+        migrations.AddField(
+            model_name='readingmaterials',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_rating_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.3 on 2026-10-19 14:16
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0008_readingmaterials_rating_aggregates'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='readingmaterials',
+            name='stock',
+            field=models.PositiveIntegerField(blank=True, help_text='Leave empty if stock is not tracked.', null=True, verbose_name='Stock'),
+        ),
+        migrations.CreateModel(
+            name='CartReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField(verbose_name='Quantity')),
+                ('expires_at', models.DateTimeField(db_index=True, verbose_name='Expires at')),
+                ('material', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='library.readingmaterials', verbose_name='Reading Material')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to=settings.AUTH_USER_MODEL, verbose_name='User')),
+            ],
+            options={
+                'verbose_name': 'Cart Reservation',
+                'verbose_name_plural': 'Cart Reservations',
+                'unique_together': {('user', 'material')},
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.3 on 2026-10-19 14:18
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0009_stock_and_cart_reservations'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='subscription',
+            name='auto_renew',
+            field=models.BooleanField(default=False, verbose_name='Renew automatically'),
+        ),
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(fields=['active', 'end_date'], name='subscription_expiry_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(condition=models.Q(('active', True)), fields=['user', 'end_date'], name='subscription_active_user_idx'),
+        ),
+    ]
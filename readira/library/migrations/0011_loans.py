@@ -0,0 +1,49 @@
+# Generated by Django 5.2.3 on 2026-10-19 14:19
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0010_subscription_auto_renew_and_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='readingmaterials',
+            name='active_loans',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='readingmaterials',
+            name='loan_copies',
+            field=models.PositiveIntegerField(blank=True, help_text='Leave empty for no limit.', null=True, verbose_name='Copies for lending'),
+        ),
+        migrations.AddField(
+            model_name='subscriptionplan',
+            name='max_loans',
+            field=models.PositiveIntegerField(default=3, verbose_name='Concurrent loans'),
+        ),
+        migrations.CreateModel(
+            name='Loan',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('borrowed_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Borrowed at')),
+                ('due_date', models.DateTimeField(verbose_name='Due date')),
+                ('returned_at', models.DateTimeField(blank=True, null=True, verbose_name='Returned at')),
+                ('material', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='loans', to='library.readingmaterials', verbose_name='Reading Material')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='loans', to=settings.AUTH_USER_MODEL, verbose_name='User')),
+            ],
+            options={
+                'verbose_name': 'Loan',
+                'verbose_name_plural': 'Loans',
+                'indexes': [models.Index(condition=models.Q(('returned_at__isnull', True)), fields=['user', 'due_date'], name='loan_open_user_idx'), models.Index(condition=models.Q(('returned_at__isnull', True)), fields=['due_date'], name='loan_open_due_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('returned_at__isnull', True)), fields=('user', 'material'), name='unique_open_loan')],
+            },
+        ),
+    ]
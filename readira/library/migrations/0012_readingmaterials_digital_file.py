@@ -0,0 +1,19 @@
+# Generated by Django 5.2.3 on 2026-10-19 14:23
+
+import readira.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0011_loans'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='readingmaterials',
+            name='digital_file',
+            field=models.FileField(blank=True, null=True, storage=readira.storage.digital_storage, upload_to='reading_materials/', verbose_name='Digital file'),
+        ),
+    ]
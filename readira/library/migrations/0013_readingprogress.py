@@ -0,0 +1,34 @@
+# Generated by Django 5.2.3 on 2026-10-19 14:25
+
+import django.core.validators
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0012_readingmaterials_digital_file'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReadingProgress',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.CharField(blank=True, default='', max_length=255, verbose_name='Position')),
+                ('fraction', models.FloatField(default=0, validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(1)], verbose_name='Progress')),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('material', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reading_progress', to='library.readingmaterials', verbose_name='Reading Material')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reading_progress', to=settings.AUTH_USER_MODEL, verbose_name='User')),
+            ],
+            options={
+                'verbose_name': 'Reading progress',
+                'verbose_name_plural': 'Reading progress',
+                'constraints': [models.UniqueConstraint(fields=('user', 'material'), name='unique_reading_progress')],
+            },
+        ),
+    ]
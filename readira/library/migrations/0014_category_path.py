@@ -0,0 +1,49 @@
+# Generated by Django 5.2.3 on 2026-10-19 14:26
+
+from collections import Counter
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def build_category_paths(apps, schema_editor):
+    Category = apps.get_model('library', 'Category')
+    ReadingMaterials = apps.get_model('library', 'ReadingMaterials')
+    categories = {category.pk: category for category in Category.objects.only('parent_id')}
+    direct = Counter(dict(ReadingMaterials.objects.filter(category__isnull=False).values_list('category').annotate(count=Count('id'))))
+
+    stack = [(category, '', 0) for category in categories.values() if category.parent_id is None]
+    while stack:
+        category, prefix, depth = stack.pop()
+        category.path, category.depth = f'{prefix}{category.pk}/', depth
+        stack.extend((child, category.path, depth + 1) for child in categories.values() if child.parent_id == category.pk)
+    for category_id, count in direct.items():
+        for ancestor_id in categories[category_id].path.split('/')[:-1]:
+            categories[int(ancestor_id)].material_count += count
+
+    Category.objects.bulk_update(categories.values(), ['path', 'depth', 'material_count'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0013_readingprogress'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='material_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(build_category_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.3 on 2026-10-19 14:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0014_category_path'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='readingmaterials',
+            index=models.Index(fields=['title'], name='material_title_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='readingmaterials',
+            index=models.Index(fields=['genre', 'title'], name='material_genre_title_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='readingmaterials',
+            index=models.Index(fields=['category', 'title'], name='material_category_title_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='readingmaterials',
+            index=models.Index(fields=['availability', 'title'], name='material_available_title_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='readingmaterials',
+            index=models.Index(fields=['price', 'title'], name='material_price_title_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='readingmaterials',
+            index=models.Index(fields=['release_date', 'title'], name='material_release_title_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='readingmaterials',
+            index=models.Index(fields=['rating_average', 'title'], name='material_rating_title_idx'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.3 on 2026-10-19 14:35
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_customer_stats(apps, schema_editor):
+    Order = apps.get_model('library', 'Order')
+    CustomerStats = apps.get_model('library', 'CustomerStats')
+    stats = Order.objects.values('user').annotate(count=Count('id'), spent=Sum('total_cost'))
+    CustomerStats.objects.bulk_create(
+        [CustomerStats(user_id=row['user'], order_count=row['count'], total_spent=row['spent'] or 0) for row in stats],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0015_catalog_facet_indexes'),
+        ('user_account', '0003_customuser_first_login_complete'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('total_spent', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+            ],
+            options={
+                'verbose_name': 'Customer statistics',
+                'verbose_name_plural': 'Customer statistics',
+            },
+        ),
+        migrations.RunPython(backfill_customer_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,103 @@
+# Generated by Django 5.2.3 on 2026-10-19 14:39
+
+import django.db.models.deletion
+from datetime import timedelta
+from django.db import migrations, models, transaction
+from django.db.models import Count, F, OuterRef, Subquery, Sum
+
+
+BATCH_SIZE = 1000
+# Legacy checkouts wrote one row per cart item within one transaction, moments apart.
+CHECKOUT_WINDOW = timedelta(seconds=5)
+
+
+def fold_orders(apps, schema_editor):
+    """
+    Turns every order row into a line and folds the rows of one checkout into the header of its first row.
+    Legacy rows carry no checkout key (each row got its own random buy session hash), so a checkout is the run of rows
+    of one user paid with the same card details, each submitted within CHECKOUT_WINDOW of the previous one.
+    Runs in batches of BATCH_SIZE rows in primary key order, each in its own transaction.
+    """
+    Order = apps.get_model('library', 'Order')
+    OrderLine = apps.get_model('library', 'OrderLine')
+    CustomerStats = apps.get_model('library', 'CustomerStats')
+    line_totals = (
+        OrderLine.objects.filter(order=OuterRef('pk')).values('order')
+        .annotate(total=Sum(F('quantity') * F('price_per_item'))).values('total')
+    )
+
+    # {(user, card number, expiry, cardholder): (header pk, submitted_at of the checkout's latest row)}
+    checkouts = {}
+    last_pk = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                Order.objects.filter(pk__gt=last_pk).order_by('pk')
+                .values(
+                    'pk', 'user_id', 'card_number', 'card_expiry', 'cardholder_name', 'submitted_at',
+                    'reading_material_id', 'quantity', 'price_per_item',
+                )[:BATCH_SIZE]
+            )
+            if not rows:
+                break
+            last_pk = rows[-1]['pk']
+            lines = []
+            for row in rows:
+                key = (row['user_id'], row['card_number'], row['card_expiry'], row['cardholder_name'])
+                header, submitted_at = checkouts.get(key, (None, None))
+                if header is None or abs(row['submitted_at'] - submitted_at) > CHECKOUT_WINDOW:
+                    header = row['pk']
+                checkouts[key] = (header, row['submitted_at'])
+                lines.append(OrderLine(
+                    order_id=header,
+                    reading_material_id=row['reading_material_id'],
+                    quantity=row['quantity'],
+                    price_per_item=row['price_per_item'],
+                ))
+            OrderLine.objects.bulk_create(lines)
+            headers = {line.order_id for line in lines}
+            Order.objects.filter(pk__in=[row['pk'] for row in rows if row['pk'] not in headers]).delete()
+            Order.objects.filter(pk__in=headers).update(total_cost=Subquery(line_totals))
+
+    # Customer statistics counted rows; they now count orders.
+    order_counts = Order.objects.filter(user=OuterRef('user')).values('user').annotate(count=Count('pk')).values('count')
+    CustomerStats.objects.update(order_count=Subquery(order_counts))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0016_customerstats'),
+    ]
+
+    atomic = False
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField()),
+                ('price_per_item', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='library.order')),
+                ('reading_material', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, to='library.readingmaterials', verbose_name='Reading Material')),
+            ],
+            options={
+                'verbose_name': 'Order line',
+                'verbose_name_plural': 'Order lines',
+            },
+        ),
+        migrations.RunPython(fold_orders, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='order',
+            name='price_per_item',
+        ),
+        migrations.RemoveField(
+            model_name='order',
+            name='quantity',
+        ),
+        migrations.RemoveField(
+            model_name='order',
+            name='reading_material',
+        ),
+    ]
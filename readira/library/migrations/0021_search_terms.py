@@ -0,0 +1,48 @@
+# Generated by Django 5.2.3 on 2026-10-19 14:50
+
+import re
+import unicodedata
+from django.db import migrations, models
+
+
+def index_search_terms(apps, schema_editor):
+    ReadingMaterials = apps.get_model('library', 'ReadingMaterials')
+    Author = apps.get_model('library', 'Author')
+    SearchTerm = apps.get_model('library', 'SearchTerm')
+
+    def words(text):
+        decomposed = unicodedata.normalize('NFKD', text or '')
+        normalized = ''.join(char for char in decomposed if not unicodedata.combining(char)).casefold()
+        return dict.fromkeys(word[:64] for word in re.findall(r'\w+', normalized))
+
+    rows = [('m', pk, title) for pk, title in ReadingMaterials.objects.values_list('pk', 'title').iterator()]
+    rows += [('a', pk, f'{name or ""} {surname or ""}') for pk, name, surname in Author.objects.values_list('pk', 'name', 'surname').iterator()]
+    SearchTerm.objects.bulk_create(
+        (SearchTerm(term=word, kind=kind, object_id=pk) for kind, pk, text in rows for word in words(text)),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0020_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('kind', models.CharField(choices=[('m', 'Reading material'), ('a', 'Author')], max_length=1)),
+                ('object_id', models.PositiveBigIntegerField()),
+            ],
+            options={
+                'verbose_name': 'Search term',
+                'verbose_name_plural': 'Search terms',
+                'indexes': [models.Index(fields=['kind', 'term', 'object_id'], name='search_term_idx'), models.Index(fields=['kind', 'object_id'], name='search_term_object_idx')],
+            },
+        ),
+        migrations.RunPython(index_search_terms, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.3 on 2026-10-19 14:53
+
+import re
+import unicodedata
+from django.db import migrations, models
+
+
+def index_search_trigrams(apps, schema_editor):
+    ReadingMaterials = apps.get_model('library', 'ReadingMaterials')
+    Author = apps.get_model('library', 'Author')
+    SearchTrigram = apps.get_model('library', 'SearchTrigram')
+
+    def trigrams(text):
+        decomposed = unicodedata.normalize('NFKD', text or '')
+        normalized = ''.join(char for char in decomposed if not unicodedata.combining(char)).casefold()
+        grams = set()
+        for word in dict.fromkeys(word[:64] for word in re.findall(r'\w+', normalized)):
+            padded = f'  {word} '
+            grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+        return grams
+
+    rows = [('m', pk, title) for pk, title in ReadingMaterials.objects.values_list('pk', 'title').iterator()]
+    rows += [('a', pk, f'{name or ""} {surname or ""}') for pk, name, surname in Author.objects.values_list('pk', 'name', 'surname').iterator()]
+    SearchTrigram.objects.bulk_create(
+        (SearchTrigram(trigram=gram, kind=kind, object_id=pk) for kind, pk, text in rows for gram in trigrams(text)),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0021_search_terms'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTrigram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trigram', models.CharField(max_length=3)),
+                ('kind', models.CharField(choices=[('m', 'Reading material'), ('a', 'Author')], max_length=1)),
+                ('object_id', models.PositiveBigIntegerField()),
+            ],
+            options={
+                'verbose_name': 'Search trigram',
+                'verbose_name_plural': 'Search trigrams',
+                'indexes': [models.Index(fields=['kind', 'trigram', 'object_id'], name='search_trigram_idx'), models.Index(fields=['object_id', 'kind'], name='search_trigram_object_idx')],
+            },
+        ),
+        migrations.RunPython(index_search_trigrams, migrations.RunPython.noop),
+    ]
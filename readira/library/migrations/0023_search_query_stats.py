@@ -0,0 +1,29 @@
+# Generated by Django 5.2.3 on 2026-10-19 15:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0022_search_trigrams'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchQueryStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('query', models.CharField(max_length=200, unique=True)),
+                ('searches', models.PositiveIntegerField(default=0)),
+                ('zero_results', models.PositiveIntegerField(default=0)),
+                ('total_latency', models.FloatField(default=0)),
+                ('max_latency', models.FloatField(default=0)),
+                ('last_searched_at', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Search query statistics',
+                'verbose_name_plural': 'Search query statistics',
+            },
+        ),
+    ]
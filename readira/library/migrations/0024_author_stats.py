@@ -0,0 +1,89 @@
+# Generated by Django 5.2.3 on 2026-10-19 15:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_author_stats(apps, schema_editor):
+    """
+    Computes the display name, book count and genre set of every author from their reading materials.
+    """
+    Author = apps.get_model('library', 'Author')
+    AuthorGenre = apps.get_model('library', 'AuthorGenre')
+    ReadingMaterials = apps.get_model('library', 'ReadingMaterials')
+    materials = ReadingMaterials.objects.filter(author_id__in=Author.objects.values('pk'))
+
+    book_counts = dict(materials.values('author').annotate(count=Count('pk')).values_list('author', 'count'))
+    authors = list(Author.objects.only('pk', 'name', 'surname'))
+    for author in authors:
+        author.display_name = f'{author.name or ""} {author.surname or ""}'.strip()
+        author.book_count = book_counts.get(author.pk, 0)
+    Author.objects.bulk_update(authors, ['display_name', 'book_count'], batch_size=1000)
+
+    AuthorGenre.objects.bulk_create(
+        [
+            AuthorGenre(author_id=row['author'], genre_id=row['genre'], book_count=row['count'])
+            for row in materials.filter(genre__isnull=False).values('author', 'genre').annotate(count=Count('pk'))
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0023_search_query_stats'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='author',
+            name='written_genres',
+        ),
+        migrations.AddField(
+            model_name='author',
+            name='book_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='author',
+            name='display_name',
+            field=models.CharField(default='', editable=False, max_length=511),
+        ),
+        migrations.CreateModel(
+            name='AuthorGenre',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('book_count', models.PositiveIntegerField(default=0)),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='genre_counts', to='library.author')),
+                ('genre', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='author_counts', to='library.genre')),
+            ],
+            options={
+                'verbose_name': 'Author genre',
+                'verbose_name_plural': 'Author genres',
+            },
+        ),
+        migrations.AddField(
+            model_name='author',
+            name='genres',
+            field=models.ManyToManyField(blank=True, related_name='authors', through='library.AuthorGenre', to='library.genre'),
+        ),
+        migrations.AddIndex(
+            model_name='author',
+            index=models.Index(fields=['display_name'], name='author_display_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='author',
+            index=models.Index(fields=['-book_count', 'display_name'], name='author_book_count_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='authorgenre',
+            index=models.Index(fields=['genre', 'author'], name='author_genre_genre_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='authorgenre',
+            constraint=models.UniqueConstraint(fields=('author', 'genre'), name='unique_author_genre'),
+        ),
+        migrations.RunPython(fill_author_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.3 on 2026-10-19 15:38
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0024_author_stats'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='subscription',
+            name='start_date',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='Start Date'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.3 on 2026-10-19 15:47
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0025_subscription_start_date'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(fields=['user', 'active', '-start_date', '-id'], name='subscription_history_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.3 on 2026-10-19 15:48
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0026_subscription_history_idx'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='checkoutclaim',
+            name='created_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+    ]
@@ -1,8 +1,13 @@
+from decimal import Decimal
 from django.conf import settings
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models import Count, F, Value
+from django.db.models.functions import Concat, Greatest, Substr
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.core.validators import MinValueValidator, MaxValueValidator
+from readira.storage import digital_storage
 from user_account.models import CustomUser
 
 
@@ -10,17 +15,30 @@ from user_account.models import CustomUser
 class Category(models.Model):
     """
     Represents a category of reading materials, which may have a parent category, enabling hierarchical relationships.
+    The hierarchy is indexed with a materialized path, so a whole subtree is one range scan of the path index.
     Attributes:
         name (str): The name of the category.
         parent (ForeignKey): A reference to the parent category. Null if it's a top-level category.
+        path (str): The IDs of the category's ancestors and its own ID, each followed by '/' (e.g. '1/5/12/'). Maintained on save.
+        depth (int): The number of ancestors of the category.
+        material_count (int): Denormalized number of reading materials in the category and all its descendants,
+                              maintained incrementally by the library signals.
     Methods:
         __str__(): Returns the name of the category when the instance is printed or converted to a string.
+        ancestor_ids(): Returns the IDs of the category and its ancestors, read from the path.
+        descendants(): Returns a queryset of the category and all its descendants.
+        subtree(): Returns a queryset of the categories whose path starts with the given one.
+        save(): Saves the category and, when it moved, rewrites the paths of its subtree and moves its material count
+                from the old ancestors to the new ones.
     Meta:
         verbose_name (str): The singular name for the model.
         verbose_name_plural (str): The plural name for the model.
     """
     name = models.CharField(max_length=255)
     parent = models.ForeignKey('self', on_delete=models.SET_NULL, related_name='children', null=True, blank=True)
+    path = models.CharField(max_length=255, db_index=True, editable=False, default='')
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+    material_count = models.PositiveIntegerField(default=0, editable=False)
     
     class Meta:
         verbose_name = _('Category')
@@ -29,6 +47,47 @@ class Category(models.Model):
     def __str__(self):
         return self.name
 
+    def ancestor_ids(self):
+        return [int(pk) for pk in self.path.split('/') if pk]
+
+    def descendants(self):
+        return Category.subtree(self.path)
+
+    @staticmethod
+    def subtree(path):
+        # A range rather than path__startswith: SQLite never uses an index for the LIKE ... ESCAPE that startswith compiles to.
+        # Paths only hold digits and '/', so every path of the subtree sorts below path + '\uffff'.
+        return Category.objects.filter(path__gte=path, path__lt=path + '\uffff')
+
+    def clean(self):
+        if self.pk and self.parent_id and str(self.pk) in self.parent.path.split('/'):
+            raise ValidationError({'parent': _('A category cannot be moved under itself or one of its subcategories.')})
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            parent = Category.objects.filter(pk=self.parent_id).values('path', 'depth').first() if self.parent_id else None
+            old = Category.objects.filter(pk=self.pk).values('path', 'depth', 'material_count').first() if self.pk else None
+            if old and parent and parent['path'].startswith(old['path']):
+                raise ValueError('A category cannot be moved under itself or one of its subcategories.')
+            if old:
+                # The count is maintained with UPDATEs, the copy held by this instance may be stale.
+                self.material_count = old['material_count']
+            super().save(*args, **kwargs)
+
+            self.path = f"{parent['path'] if parent else ''}{self.pk}/"
+            self.depth = parent['depth'] + 1 if parent else 0
+            if old is None:
+                Category.objects.filter(pk=self.pk).update(path=self.path, depth=self.depth)
+            elif old['path'] != self.path:
+                Category.subtree(old['path']).update(
+                    path=Concat(Value(self.path), Substr('path', len(old['path']) + 1)),
+                    depth=F('depth') + (self.depth - old['depth']),
+                )
+                count = old['material_count']
+                if count:
+                    Category.objects.filter(pk__in=[int(pk) for pk in old['path'].split('/') if pk][:-1]).update(material_count=F('material_count') - count)
+                    Category.objects.filter(pk__in=self.ancestor_ids()[:-1]).update(material_count=F('material_count') + count)
+
 
 class Genre(models.Model):
     """
@@ -59,30 +118,78 @@ class Author(models.Model):
     Attributes:
         name (str): The author's first name.
         surname (str): The author's surname.
+        display_name (str): Denormalized 'name surname', kept by save() and used for sorting.
         date_of_birth (DateField): The author's date of birth.
-        written_genres (str): A list of genres the author has written in.
         image (ImageField): The author's profile image.
         bio (TextField): A short biography of the author.
+        book_count (int): Denormalized number of the author's reading materials, maintained by the material signals.
+        genres (ManyToManyField): The genres of the author's reading materials, derived through AuthorGenre.
+        updated_at (datetime): The timestamp of the last change, used as HTTP validator.
     Methods:
         __str__(): Returns the author's name when the instance is printed or converted to a string. If the name is not provided, "Unnamed Author" is returned.
+        save(): Saves the author, refreshing the display name and keeping the stored book count.
     Meta:
         verbose_name (str): The singular name for the model.
         verbose_name_plural (str): The plural name for the model.
+        indexes (list): Indexes serving the author list sorted by name or by number of books.
     """
     name = models.CharField(max_length=255, verbose_name=_('Author'), null=True, blank=True)
     surname = models.CharField(max_length=255, verbose_name=_('Surname'), null=True, blank=True)
+    display_name = models.CharField(max_length=511, default='', editable=False)
     date_of_birth = models.DateField(verbose_name=_('Date of Birth'), null=True, blank=True)
-    written_genres = models.CharField(max_length=255, verbose_name=_('Genres'), null=True, blank=True)
     image = models.ImageField(upload_to='authors/', verbose_name=_('Image'), null=True, blank=True)
     bio = models.TextField(verbose_name=_('About the author'), null=True, blank=True)
+    book_count = models.PositiveIntegerField(default=0, editable=False)
+    genres = models.ManyToManyField(Genre, through='AuthorGenre', related_name='authors', blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         verbose_name = _('Author')
         verbose_name_plural = _('Authors')
+        indexes = [
+            models.Index(fields=['display_name'], name='author_display_name_idx'),
+            models.Index(fields=['-book_count', 'display_name'], name='author_book_count_idx'),
+        ]
 
     def __str__(self):
         return self.name or 'Unnamed Author'
 
+    def save(self, *args, **kwargs):
+        self.display_name = f'{self.name or ""} {self.surname or ""}'.strip()
+        with transaction.atomic():
+            if self.pk:
+                # The count is maintained with UPDATEs, the copy held by this instance may be stale.
+                self.book_count = Author.objects.filter(pk=self.pk).values_list('book_count', flat=True).first() or 0
+            super().save(*args, **kwargs)
+
+
+
+class AuthorGenre(models.Model):
+    """
+    Derived link between an author and a genre they wrote in, with the number of their reading materials of that genre,
+    so the link disappears together with the author's last material of the genre. Maintained by the material signals.
+    Attributes:
+        author (ForeignKey): The author.
+        genre (ForeignKey): The genre.
+        book_count (int): The number of the author's reading materials of the genre.
+    """
+    author = models.ForeignKey(Author, on_delete=models.CASCADE, related_name='genre_counts')
+    genre = models.ForeignKey(Genre, on_delete=models.CASCADE, related_name='author_counts')
+    book_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Author genre'
+        verbose_name_plural = 'Author genres'
+        constraints = [
+            models.UniqueConstraint(fields=['author', 'genre'], name='unique_author_genre'),
+        ]
+        indexes = [
+            models.Index(fields=['genre', 'author'], name='author_genre_genre_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.author} - {self.genre}: {self.book_count}'
+
 
 class ReadingMaterials(models.Model):
     """
@@ -96,11 +203,19 @@ class ReadingMaterials(models.Model):
         release_date (DateField): The publication date of the material.
         price (DecimalField): The price of the reading material.
         image (ImageField): The cover image of the material.
+        digital_file (FileField): The e-book or audiobook file, kept in private storage and delivered to borrowers through signed URLs.
         enabled (bool): A flag indicating whether the material is available for purchase.
         availability (bool): A flag indicating whether the material is in stock.
+        stock (int): Number of physical copies left for sale. Empty when stock is not tracked (e.g. digital titles).
+        loan_copies (int): Number of copies that can be on loan at the same time. Empty for no limit.
+        active_loans (int): Denormalized number of open loans, maintained by library.loans.
+        updated_at (datetime): The timestamp of the last change, used as HTTP validator.
+        review_count (int): Denormalized number of reviews, maintained by the review signals.
+        rating_count (int): Denormalized number of ratings, refreshed in batches by library.ratings.
+        rating_average (Decimal): Denormalized average rating, refreshed in batches by library.ratings.
     Methods:
         __str__(): Returns the title of the reading material when the instance is printed or converted to a string. If the title is not provided, "Unnamed Material" is returned.
-        average_rating(): Calculates and returns the average rating of the reading material based on all ratings.
+        average_rating(): Returns the stored average rating of the reading material.
         rating_distribution(): Returns a dictionary with the count of ratings for each star value (1 to 5).
     Meta:
         verbose_name (str): The singular name for the model.
@@ -114,21 +229,61 @@ class ReadingMaterials(models.Model):
     release_date = models.DateField(verbose_name=_('Release Date'), null=True, blank=True)
     price = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)], null=True, blank=True)
     image = models.ImageField(upload_to='reading_materials/', verbose_name=_('Image'), null=True, blank=True)
+    digital_file = models.FileField(upload_to='reading_materials/', storage=digital_storage, verbose_name=_('Digital file'), null=True, blank=True)
     enabled = models.BooleanField(default=True, verbose_name=('Enabled'))
     availability = models.BooleanField(default=True)
+    stock = models.PositiveIntegerField(verbose_name=_('Stock'), null=True, blank=True, help_text=_('Leave empty if stock is not tracked.'))
+    loan_copies = models.PositiveIntegerField(verbose_name=_('Copies for lending'), null=True, blank=True, help_text=_('Leave empty for no limit.'))
+    active_loans = models.PositiveIntegerField(default=0, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+    review_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_average = models.DecimalField(max_digits=3, decimal_places=2, default=0, editable=False)
+
+    # Maintained with UPDATEs by the loan, review and rating code, never written from the values an instance holds.
+    COUNTER_FIELDS = ('active_loans', 'review_count', 'rating_count', 'rating_average')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_stock = values[field_names.index('stock')] if 'stock' in field_names else None
+        return instance
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            old = ReadingMaterials.objects.filter(pk=self.pk).values('stock', *self.COUNTER_FIELDS).first() if self.pk else None
+            if old:
+                # The counters and the stock change with UPDATEs, the copies held by this instance may be stale.
+                for field in self.COUNTER_FIELDS:
+                    setattr(self, field, old[field])
+                loaded = getattr(self, '_loaded_stock', None)
+                if None not in (self.stock, loaded, old['stock']):
+                    # An edit of the stock is applied as a delta, so copies sold since the instance was read stay sold.
+                    self.stock = Greatest(F('stock') + (self.stock - loaded), 0)
+            super().save(*args, **kwargs)
+            if isinstance(self.stock, Greatest):
+                self.refresh_from_db(fields=['stock'])
+            self._loaded_stock = self.stock
 
     def average_rating(self):
-        ratings = self.ratings.all()
-        if ratings.exists():
-            return round(sum(r.value for r in ratings) / ratings.count(), 2)
-        return 0
+        return self.rating_average if self.rating_count else 0
 
     def rating_distribution(self):
-        return {i: self.ratings.filter(value=i).count() for i in range(1, 6)}
+        counts = dict(self.ratings.order_by().values('value').annotate(count=Count('pk')).values_list('value', 'count'))
+        return {i: counts.get(i, 0) for i in range(1, 6)}
 
     class Meta:
         verbose_name = _('Reading material')
         verbose_name_plural = _('Reading Materials')
+        indexes = [
+            models.Index(fields=['title'], name='material_title_idx'),
+            models.Index(fields=['genre', 'title'], name='material_genre_title_idx'),
+            models.Index(fields=['category', 'title'], name='material_category_title_idx'),
+            models.Index(fields=['availability', 'title'], name='material_available_title_idx'),
+            models.Index(fields=['price', 'title'], name='material_price_title_idx'),
+            models.Index(fields=['release_date', 'title'], name='material_release_title_idx'),
+            models.Index(fields=['rating_average', 'title'], name='material_rating_title_idx'),
+        ]
 
     def __str__(self):
         return self.title or 'Unnamed Material'
@@ -142,6 +297,7 @@ class Review(models.Model):
         user (ForeignKey): The user who wrote the review.
         title (str): The title of the review.
         content (str): The content of the review.
+        updated_at (datetime): The timestamp of the last change.
     Methods:
         __str__(): Returns a string representation of the review, including the user and title of the review.
 
@@ -153,6 +309,7 @@ class Review(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True)
     title = models.CharField(max_length=255, verbose_name=_('Title'), null=True, blank=True)
     content = models.TextField(verbose_name=_('Content'), null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         verbose_name = _('Review')
@@ -171,6 +328,7 @@ class Rating(models.Model):
         user (ForeignKey): The user who gave the rating.
         value (int): The rating value (1 to 5).
         created_at (datetime): The timestamp when the rating was created.
+        updated_at (datetime): The timestamp of the last change.
     Methods:
         __str__(): Returns a string representation of the rating, including the user, material, and rating value.
     Meta:
@@ -181,6 +339,7 @@ class Rating(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True)
     value = models.IntegerField(validators=[MinValueValidator(1), MaxValueValidator(5)], null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         verbose_name = _('Rating')
@@ -199,6 +358,7 @@ class SubscriptionPlan(models.Model):
         price (DecimalField): The price of the subscription plan.
         duration_days (int): The duration of the subscription in days.
         description (str): A brief description of the subscription plan.
+        max_loans (int): The number of reading materials a subscriber can borrow at the same time.
     Methods:
         __str__(): Returns a string representation of the subscription plan, including the plan name and duration in days.
     Meta:
@@ -209,6 +369,7 @@ class SubscriptionPlan(models.Model):
     price = models.DecimalField(max_digits=8, decimal_places=2, verbose_name=_('Price'), null=True, blank=True)
     duration_days = models.PositiveIntegerField(verbose_name=_('Duration (days)'), null=True, blank=True)
     description = models.TextField(verbose_name=_('Description'), null=True, blank=True,)
+    max_loans = models.PositiveIntegerField(default=3, verbose_name=_('Concurrent loans'))
 
     class Meta:
         verbose_name = _('Subscription Plan')
@@ -224,9 +385,10 @@ class Subscription(models.Model):
     Attributes:
         user (ForeignKey): The user who has made the subscription.
         plan (ForeignKey): The subscription plan that the user is subscribed to.
-        start_date (datetime): The date when the subscription started.
+        start_date (datetime): The date when the subscription started, the end of the previous one for renewals.
         end_date (datetime): The date when the subscription ends (optional).
-        active (bool): A flag indicating whether the subscription is active or not.
+        active (bool): A flag indicating whether the subscription is active or not. Cleared by the expiry sweeper once end_date has passed.
+        auto_renew (bool): A flag indicating whether the subscription is renewed automatically when it ends.
     Methods:
         __str__(): Returns a string representation of the subscription, including the user's email and the subscription plan's name.
     Meta:
@@ -235,13 +397,19 @@ class Subscription(models.Model):
     """
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, verbose_name=_('User'), related_name='subscriptions', null=True, blank=True)
     plan = models.ForeignKey(SubscriptionPlan, on_delete=models.CASCADE, verbose_name=_('Plan'), null=True, blank=True)
-    start_date = models.DateTimeField(auto_now_add=True, verbose_name=_('Start Date'))
+    start_date = models.DateTimeField(default=timezone.now, editable=False, verbose_name=_('Start Date'))
     end_date = models.DateTimeField(verbose_name=_('End Date'), null=True, blank=True)
     active = models.BooleanField(default=True, verbose_name=_('Active'))
+    auto_renew = models.BooleanField(default=False, verbose_name=_('Renew automatically'))
 
     class Meta:
         verbose_name = _('Subscription')
         verbose_name_plural = _('Subscriptions')
+        indexes = [
+            models.Index(fields=['active', 'end_date'], name='subscription_expiry_idx'),
+            models.Index(fields=['user', 'end_date'], condition=models.Q(active=True), name='subscription_active_user_idx'),
+            models.Index(fields=['user', 'active', '-start_date', '-id'], name='subscription_history_idx'),
+        ]
 
     def __str__(self):
         return f'{self.user.email} - {self.plan.name}' if self.user and self.plan else 'Incomplete Subscription'
@@ -249,18 +417,16 @@ class Subscription(models.Model):
 
 class Order(models.Model):
     """
-    Represents an order placed by a user for a reading material, containing payment and delivery details.
+    Represents an order placed by a user in one checkout, containing payment and delivery details.
+    The purchased reading materials are the order's lines.
     Attributes:
         user (ForeignKey): The user who placed the order.
-        total_cost (DecimalField): The total cost of the order.
+        total_cost (DecimalField): The total cost of the order, the sum of its lines.
         delivery_address (str): The delivery address for the order.
         user_address (str): The user’s address.
         submitted_at (datetime): The timestamp when the order was placed.
         client_full_name (str): The full name of the client placing the order.
         status (str): The status of the order (e.g., 'paid', 'pending', etc.).
-        quantity (int): The quantity of items ordered.
-        price_per_item (DecimalField): The price per item in the order.
-        reading_material (ForeignKey): The reading material being ordered.
     Payment attributes:
         card_number (str): The credit card number used for the order (if applicable).
         card_expiry (str): The expiry date of the credit card (MM/YY format).
@@ -268,8 +434,8 @@ class Order(models.Model):
         cardholder_name (str): The name of the cardholder.
         buy_session_hash (str): A unique hash representing the payment session.
     Methods:
-        __str__(): Returns a string representation of the order, including the order ID and the title of the reading material.
-        save(): Calculates and sets the total cost of the order before saving it to the database.
+        __str__(): Returns a string representation of the order, including the order ID and the client's name.
+        refresh_total(): Recomputes and saves the total cost from the order's lines.
     Meta:
         verbose_name (str): The singular name for the model.
         verbose_name_plural (str): The plural name for the model.
@@ -287,9 +453,6 @@ class Order(models.Model):
     submitted_at = models.DateTimeField(default=timezone.now)
     client_full_name = models.CharField(max_length=255)
     status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDING)
-    quantity = models.PositiveIntegerField()
-    price_per_item = models.DecimalField(max_digits=10, decimal_places=2)
-    reading_material = models.ForeignKey(ReadingMaterials, on_delete=models.PROTECT, verbose_name=_('Reading Material'), null=True, blank=True)
 
     # Payment fields
     card_number = models.CharField(max_length=16, blank=True, null=True)
@@ -303,8 +466,388 @@ class Order(models.Model):
         verbose_name_plural = 'Orders'
 
     def __str__(self):
-        return f'Order #{self.id} - {self.reading_material.title}'
+        return f'Order #{self.id} - {self.client_full_name}'
 
-    def save(self, *args, **kwargs):
-        self.total_cost = self.quantity * self.price_per_item
-        super().save(*args, **kwargs)
+    def refresh_total(self):
+        self.total_cost = sum((line.total_cost for line in self.lines.all()), Decimal(0))
+        self.save(update_fields=['total_cost'])
+
+
+
+class OrderLine(models.Model):
+    """
+    Represents one reading material purchased in an order.
+    Attributes:
+        order (ForeignKey): The order the line belongs to.
+        reading_material (ForeignKey): The reading material being ordered.
+        quantity (int): The quantity of items ordered.
+        price_per_item (DecimalField): The price per item when the order was placed.
+    Methods:
+        total_cost: The cost of the line, quantity times price per item.
+    Meta:
+        verbose_name (str): The singular name for the model.
+        verbose_name_plural (str): The plural name for the model.
+    """
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='lines')
+    reading_material = models.ForeignKey(ReadingMaterials, on_delete=models.PROTECT, verbose_name=_('Reading Material'), null=True, blank=True)
+    quantity = models.PositiveIntegerField()
+    price_per_item = models.DecimalField(max_digits=10, decimal_places=2)
+
+    class Meta:
+        verbose_name = 'Order line'
+        verbose_name_plural = 'Order lines'
+
+    def __str__(self):
+        return f'{self.reading_material} x {self.quantity}'
+
+    @property
+    def total_cost(self):
+        return self.quantity * self.price_per_item
+
+
+
+class CheckoutClaim(models.Model):
+    """
+    Idempotency record of a checkout: the order token of a cart can be claimed once.
+    The claim is inserted first in the checkout transaction, so of two submits of the same cart only one gets past
+    the unique token; the other waits for it on that one index entry and then finds the checkout done.
+    Attributes:
+        token (str): The order token of the cart.
+        user (ForeignKey): The user checking out.
+        order (ForeignKey): The order created by the checkout, if the cart held reading materials.
+        created_at (datetime): When the checkout went through. Claims are deleted CHECKOUT_CLAIM_DAYS later.
+    """
+    token = models.CharField(max_length=64, unique=True)
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='checkout_claims')
+    order = models.ForeignKey(Order, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        verbose_name = 'Checkout claim'
+        verbose_name_plural = 'Checkout claims'
+
+    def __str__(self):
+        return f'{self.user}: {self.token}'
+
+
+
+class OutboxEvent(models.Model):
+    """
+    Transactional outbox: an event recorded in the same transaction as the change it announces and
+    delivered afterwards by the outbox worker, so notifications never slow down nor get lost by the request.
+    Attributes:
+        kind (str): What happened, one of Kind.
+        user (ForeignKey): The user to notify.
+        payload (dict): The IDs of the rows the event is about.
+        status (str): Pending until delivered, then sent, skipped (nothing to send on the user's channel) or failed.
+        attempts (int): Number of failed delivery attempts.
+        available_at (datetime): When the event is next due; pushed back on failures and while a worker holds it.
+        created_at (datetime): When the event was recorded.
+        processed_at (datetime): When the event was sent, skipped or given up on.
+        last_error (str): The error of the last failed attempt.
+    """
+    class Kind(models.TextChoices):
+        CHECKOUT_COMPLETED = 'checkout_completed', 'Checkout completed'
+        SUBSCRIPTION_RENEWED = 'subscription_renewed', 'Subscription renewed'
+
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'Pending'
+        SENT = 'sent', 'Sent'
+        SKIPPED = 'skipped', 'Skipped'
+        FAILED = 'failed', 'Failed'
+
+    kind = models.CharField(max_length=30, choices=Kind.choices)
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='+')
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(default=timezone.now)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        verbose_name = 'Outbox event'
+        verbose_name_plural = 'Outbox events'
+        indexes = [
+            models.Index(fields=['available_at'], condition=models.Q(status='pending'), name='outbox_pending_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.get_kind_display()} #{self.pk} ({self.status})'
+
+
+
+class Job(models.Model):
+    """
+    A background job of the database-backed job queue, run by the run_jobs worker.
+    Attributes:
+        task (str): The registered name of the task to run.
+        args (list): The positional arguments of the task, JSON-serializable.
+        key (str): Optional deduplication key: at most one queued job per key.
+        status (str): Pending, running or failed; jobs are deleted once they succeed.
+        attempts (int): Number of failed runs, runs whose lease expired included.
+        max_attempts (int): Number of runs before the job is marked failed.
+        available_at (datetime): When a pending job is due; the end of the lease of a running one,
+                                 after which another worker may claim it again.
+        created_at (datetime): When the job was enqueued.
+        finished_at (datetime): When the job was given up on.
+        last_error (str): The error of the last failed run.
+    """
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'Pending'
+        RUNNING = 'running', 'Running'
+        FAILED = 'failed', 'Failed'
+
+    task = models.CharField(max_length=100)
+    args = models.JSONField(default=list, blank=True)
+    key = models.CharField(max_length=100, null=True, blank=True)
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    available_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(default=timezone.now)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        verbose_name = 'Job'
+        verbose_name_plural = 'Jobs'
+        indexes = [
+            models.Index(fields=['available_at'], condition=models.Q(status__in=['pending', 'running']), name='job_queued_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['key'], condition=models.Q(status='pending'), name='unique_pending_job_key'),
+        ]
+
+    def __str__(self):
+        return f'{self.task} #{self.pk} ({self.status})'
+
+
+
+class SearchTerm(models.Model):
+    """
+    Inverted index of the searchable words of reading material titles and author names.
+    Every word is stored normalized (casefolded, diacritics stripped), so accent-insensitive and prefix matching
+    are B-tree range scans on the (kind, term) index. Maintained by the model signals.
+    Attributes:
+        term (str): A normalized word.
+        kind (str): Whether the word belongs to a reading material or an author.
+        object_id (int): The ID of that reading material or author.
+    """
+    class Kind(models.TextChoices):
+        MATERIAL = 'm', 'Reading material'
+        AUTHOR = 'a', 'Author'
+
+    term = models.CharField(max_length=64)
+    kind = models.CharField(max_length=1, choices=Kind.choices)
+    object_id = models.PositiveBigIntegerField()
+
+    class Meta:
+        verbose_name = 'Search term'
+        verbose_name_plural = 'Search terms'
+        indexes = [
+            models.Index(fields=['kind', 'term', 'object_id'], name='search_term_idx'),
+            models.Index(fields=['kind', 'object_id'], name='search_term_object_idx'),
+        ]
+
+    def __str__(self):
+        return self.term
+
+
+
+class SearchTrigram(models.Model):
+    """
+    Trigram index of reading material titles and author full names, for typo-tolerant search.
+    Every normalized word is padded ('  weir ') and cut into overlapping three-letter sequences; a misspelled query
+    still shares most of its trigrams with the right title or name, which the (kind, trigram) index finds
+    without scanning the catalog. Maintained together with SearchTerm.
+    Attributes:
+        trigram (str): Three normalized characters.
+        kind (str): Whether the trigram belongs to a reading material or an author.
+        object_id (int): The ID of that reading material or author.
+    """
+    trigram = models.CharField(max_length=3)
+    kind = models.CharField(max_length=1, choices=SearchTerm.Kind.choices)
+    object_id = models.PositiveBigIntegerField()
+
+    class Meta:
+        verbose_name = 'Search trigram'
+        verbose_name_plural = 'Search trigrams'
+        indexes = [
+            models.Index(fields=['kind', 'trigram', 'object_id'], name='search_trigram_idx'),
+            # object_id first: a (kind, object_id) index tempts SQLite into scanning every trigram of a kind
+            # to group the fuzzy candidates by object, instead of looking up the query's trigrams.
+            models.Index(fields=['object_id', 'kind'], name='search_trigram_object_idx'),
+        ]
+
+    def __str__(self):
+        return self.trigram
+
+
+
+class SearchQueryStats(models.Model):
+    """
+    Usage statistics of a normalized search query, so staff can spot popular, slow and empty searches.
+    Searches are counted in memory and added to these rows in batches, never written by the search request itself.
+    Attributes:
+        query (str): The normalized query ('andy weir' for 'Andy  Weir').
+        searches (int): The number of searches for the query.
+        zero_results (int): The number of those searches that found nothing, not even close matches.
+        total_latency (float): The sum of the search times, in milliseconds.
+        max_latency (float): The longest search time, in milliseconds.
+        last_searched_at (datetime): The moment of the latest search.
+    Methods:
+        zero_result_rate(): Returns the share of searches that found nothing.
+        average_latency(): Returns the mean search time, in milliseconds.
+    Meta:
+        verbose_name (str): The singular name for the model.
+        verbose_name_plural (str): The plural name for the model.
+    """
+    query = models.CharField(max_length=200, unique=True)
+    searches = models.PositiveIntegerField(default=0)
+    zero_results = models.PositiveIntegerField(default=0)
+    total_latency = models.FloatField(default=0)
+    max_latency = models.FloatField(default=0)
+    last_searched_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name = 'Search query statistics'
+        verbose_name_plural = 'Search query statistics'
+
+    def __str__(self):
+        return self.query
+
+    def zero_result_rate(self):
+        return self.zero_results / self.searches if self.searches else 0
+
+    def average_latency(self):
+        return self.total_latency / self.searches if self.searches else 0
+
+
+
+class CustomerStats(models.Model):
+    """
+    Stored order aggregates of a customer, shown on the profile page without scanning the order history.
+    Maintained incrementally by the order signals.
+    Attributes:
+        user (OneToOneField): The customer.
+        order_count (int): The number of orders placed by the customer.
+        total_spent (Decimal): The sum of the total costs of those orders.
+    Meta:
+        verbose_name (str): The singular name for the model.
+        verbose_name_plural (str): The plural name for the model.
+    """
+    user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    order_count = models.PositiveIntegerField(default=0)
+    total_spent = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = _('Customer statistics')
+        verbose_name_plural = _('Customer statistics')
+
+    def __str__(self):
+        return f'{self.user}: {self.order_count} orders'
+
+
+
+class CartReservation(models.Model):
+    """
+    Represents copies of a reading material held for a user's cart until checkout or expiry.
+    Reserved copies are taken out of ReadingMaterials.stock when the material is added to the cart
+    and given back by the reservation sweeper once the reservation expires.
+    Attributes:
+        user (ForeignKey): The user holding the reservation.
+        material (ForeignKey): The reserved reading material.
+        quantity (int): The number of reserved copies.
+        expires_at (datetime): The moment the reservation is released if the user has not checked out.
+    Methods:
+        __str__(): Returns a string representation of the reservation, including the user, quantity and material.
+    Meta:
+        verbose_name (str): The singular name for the model.
+        verbose_name_plural (str): The plural name for the model.
+    """
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='reservations', verbose_name=_('User'))
+    material = models.ForeignKey(ReadingMaterials, on_delete=models.CASCADE, related_name='reservations', verbose_name=_('Reading Material'))
+    quantity = models.PositiveIntegerField(verbose_name=_('Quantity'))
+    expires_at = models.DateTimeField(db_index=True, verbose_name=_('Expires at'))
+
+    class Meta:
+        verbose_name = _('Cart Reservation')
+        verbose_name_plural = _('Cart Reservations')
+        unique_together = ('user', 'material')
+
+    def __str__(self):
+        return f'{self.user} holds {self.quantity} x {self.material}'
+
+
+
+class Loan(models.Model):
+    """
+    Represents a reading material borrowed by a subscriber.
+    A user can hold at most one open loan per material, enforced by a partial unique constraint,
+    so repeated borrow clicks cannot open the same loan twice.
+    Attributes:
+        user (ForeignKey): The user who borrowed the material.
+        material (ForeignKey): The borrowed reading material.
+        borrowed_at (datetime): The moment the material was borrowed.
+        due_date (datetime): The moment the loan expires.
+        returned_at (datetime): The moment the material was returned or the loan expired. Empty while the loan is open.
+    Methods:
+        __str__(): Returns a string representation of the loan, including the user and the material.
+    Meta:
+        verbose_name (str): The singular name for the model.
+        verbose_name_plural (str): The plural name for the model.
+    """
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='loans', verbose_name=_('User'))
+    material = models.ForeignKey(ReadingMaterials, on_delete=models.CASCADE, related_name='loans', verbose_name=_('Reading Material'))
+    borrowed_at = models.DateTimeField(default=timezone.now, verbose_name=_('Borrowed at'))
+    due_date = models.DateTimeField(verbose_name=_('Due date'))
+    returned_at = models.DateTimeField(null=True, blank=True, verbose_name=_('Returned at'))
+
+    class Meta:
+        verbose_name = _('Loan')
+        verbose_name_plural = _('Loans')
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'material'], condition=models.Q(returned_at__isnull=True), name='unique_open_loan'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'due_date'], condition=models.Q(returned_at__isnull=True), name='loan_open_user_idx'),
+            models.Index(fields=['due_date'], condition=models.Q(returned_at__isnull=True), name='loan_open_due_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.user} borrowed {self.material}'
+
+
+class ReadingProgress(models.Model):
+    """
+    Represents how far a user got in a reading material read or listened to online.
+    Rows are written in batches by library.progress, which coalesces the readers' heartbeats in memory.
+    Attributes:
+        user (ForeignKey): The reader.
+        material (ForeignKey): The reading material.
+        position (str): The client's locator of the current position (e.g. an EPUB CFI or an audio offset in seconds).
+        fraction (float): The share of the material already read, from 0 to 1.
+        updated_at (datetime): The moment the position was reported.
+    Methods:
+        __str__(): Returns a string representation of the progress, including the user, material and fraction.
+    Meta:
+        verbose_name (str): The singular name for the model.
+        verbose_name_plural (str): The plural name for the model.
+    """
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='reading_progress', verbose_name=_('User'))
+    material = models.ForeignKey(ReadingMaterials, on_delete=models.CASCADE, related_name='reading_progress', verbose_name=_('Reading Material'))
+    position = models.CharField(max_length=255, blank=True, default='', verbose_name=_('Position'))
+    fraction = models.FloatField(default=0, validators=[MinValueValidator(0), MaxValueValidator(1)], verbose_name=_('Progress'))
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = _('Reading progress')
+        verbose_name_plural = _('Reading progress')
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'material'], name='unique_reading_progress'),
+        ]
+
+    def __str__(self):
+        return f'{self.user} read {self.fraction:.0%} of {self.material}'
@@ -0,0 +1,114 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import Http404
+from .models import Author, ReadingMaterials
+
+
+
+class ObjectCache:
+    """
+    Read-through cache of model instances by primary key, in two tiers.
+    A bounded LRU dictionary in process memory answers hot objects without any I/O; it sits in front of the shared
+    Django cache, which sits in front of the database. The model signals call invalidate() on every change, which
+    drops the object from the shared cache and from the local tier of the current process; the local tiers of other
+    processes expire their copy after OBJECT_CACHE_LOCAL_TTL seconds.
+    Callers get their own shallow copy of the cached instance and may set attributes on it.
+    Attributes:
+        model (class): The cached model.
+        attach (callable, optional): Called with the list of returned instances, e.g. to attach related objects.
+    Methods:
+        - get(): Returns the instance with the given primary key, or None.
+        - get_or_404(): Returns the instance with the given primary key or raises Http404.
+        - get_many(): Returns a {pk: instance} dict of the instances found, with one query for all the misses.
+        - invalidate(): Drops an instance from both tiers.
+    """
+    def __init__(self, model, attach=None):
+        self.model = model
+        self.attach = attach
+        self.prefix = f'obj:{model._meta.label_lower}:'
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _local_get(self, pk):
+        with self._lock:
+            entry = self._local.get(pk)
+            if entry is None:
+                return None
+            instance, stored_at = entry
+            if time.monotonic() - stored_at > settings.OBJECT_CACHE_LOCAL_TTL:
+                del self._local[pk]
+                return None
+            self._local.move_to_end(pk)
+            return instance
+
+    def _local_set(self, instances):
+        now = time.monotonic()
+        with self._lock:
+            for instance in instances:
+                self._local[instance.pk] = (instance, now)
+                self._local.move_to_end(instance.pk)
+            while len(self._local) > settings.OBJECT_CACHE_LOCAL_SIZE:
+                self._local.popitem(last=False)
+
+    def get_many(self, pks):
+        pks = {int(pk) for pk in pks}
+        found = {}
+        for pk in pks:
+            instance = self._local_get(pk)
+            if instance is not None:
+                found[pk] = instance
+
+        missing = pks - found.keys()
+        if missing:
+            shared = cache.get_many([f'{self.prefix}{pk}' for pk in missing])
+            from_shared = [shared[key] for key in shared]
+            missing -= {instance.pk for instance in from_shared}
+            from_db = list(self.model.objects.filter(pk__in=missing)) if missing else []
+            if from_db:
+                cache.set_many({f'{self.prefix}{instance.pk}': instance for instance in from_db}, settings.OBJECT_CACHE_TIMEOUT)
+            self._local_set(from_shared + from_db)
+            found.update((instance.pk, instance) for instance in from_shared + from_db)
+
+        result = {pk: copy.copy(instance) for pk, instance in found.items()}
+        if self.attach is not None and result:
+            self.attach(list(result.values()))
+        return result
+
+    def get(self, pk):
+        try:
+            return self.get_many([pk]).get(int(pk))
+        except (TypeError, ValueError):
+            return None
+
+    def get_or_404(self, pk):
+        instance = self.get(pk)
+        if instance is None:
+            raise Http404(f'No {self.model._meta.verbose_name} found matching the query.')
+        return instance
+
+    def invalidate(self, *pks):
+        self._drop(pks)
+        # Drop again once the transaction commits, in case a concurrent read cached the old row in between.
+        transaction.on_commit(lambda: self._drop(pks))
+
+    def _drop(self, pks):
+        cache.delete_many([f'{self.prefix}{pk}' for pk in pks])
+        with self._lock:
+            for pk in pks:
+                self._local.pop(pk, None)
+
+
+def _attach_authors(materials):
+    authors = author_cache.get_many({material.author_id for material in materials if material.author_id})
+    for material in materials:
+        if material.author_id in authors:
+            material.author = authors[material.author_id]
+
+
+author_cache = ObjectCache(Author)
+material_cache = ObjectCache(ReadingMaterials, attach=_attach_authors)
@@ -0,0 +1,123 @@
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import Prefetch, Q
+from django.template.loader import render_to_string
+from django.utils import timezone
+from user_account.models import CustomUser
+from .leases import claim_due, retry_delay
+from .models import Order, OrderLine, OutboxEvent, Subscription
+
+
+
+def record_event(kind, user_id, **payload):
+    """
+    Records an event in the outbox. Call it inside the transaction of the change it announces:
+    the event is committed or rolled back with it, and costs the request a single INSERT.
+    Args:
+        kind (str): One of OutboxEvent.Kind.
+        user_id (int): The ID of the user to notify.
+        **payload: The IDs of the rows the event is about.
+    Returns:
+        OutboxEvent: The recorded event.
+    """
+    return OutboxEvent.objects.create(kind=kind, user_id=user_id, payload=payload)
+
+
+def _checkout_email(event):
+    order = None
+    if event.payload.get('order_id'):
+        order = (
+            Order.objects.filter(pk=event.payload['order_id'])
+            .prefetch_related(Prefetch('lines', queryset=OrderLine.objects.select_related('reading_material')))
+            .first()
+        )
+    subscription = None
+    if event.payload.get('subscription_id'):
+        subscription = Subscription.objects.select_related('plan').filter(pk=event.payload['subscription_id']).first()
+    if order is None and subscription is None:
+        return None
+    subject = f'Your Readira order #{order.pk}' if order else 'Your Readira subscription'
+    body = render_to_string('library/emails/checkout_completed.txt', {
+        'user': event.user, 'order': order, 'subscription': subscription,
+    })
+    return subject, body
+
+
+def _renewal_email(event):
+    subscription = Subscription.objects.select_related('plan').filter(pk=event.payload.get('subscription_id')).first()
+    if subscription is None:
+        return None
+    body = render_to_string('library/emails/subscription_renewed.txt', {'user': event.user, 'subscription': subscription})
+    return 'Your Readira subscription was renewed', body
+
+
+EMAILS = {
+    OutboxEvent.Kind.CHECKOUT_COMPLETED: _checkout_email,
+    OutboxEvent.Kind.SUBSCRIPTION_RENEWED: _renewal_email,
+}
+
+
+def _claim(batch_size, now):
+    return list(
+        claim_due(OutboxEvent, batch_size, now, settings.OUTBOX_LEASE_SECONDS, due=Q(status=OutboxEvent.Status.PENDING))
+        .select_related('user')
+        .order_by('available_at', 'pk')
+    )
+
+
+def _deliver(events, now):
+    # Every write is guarded by the lease of the batch (claim_due gives all its rows the same one): once the lease
+    # has run out, another worker may have claimed the events again, and its outcome must not be overwritten.
+    leased = OutboxEvent.objects.filter(status=OutboxEvent.Status.PENDING, available_at=events[0].available_at)
+    done = {OutboxEvent.Status.SENT: [], OutboxEvent.Status.SKIPPED: []}
+    connection = get_connection()
+    for event in events:
+        try:
+            email = EMAILS[event.kind](event) if event.user.preferred_channel == CustomUser.Channel.EMAIL else None
+            if email is None:
+                # Postal mail is not automated, and the rows of the event may be gone.
+                done[OutboxEvent.Status.SKIPPED].append(event.pk)
+                continue
+            subject, body = email
+            EmailMessage(subject, body, settings.DEFAULT_FROM_EMAIL, [event.user.email], connection=connection).send()
+            done[OutboxEvent.Status.SENT].append(event.pk)
+        except Exception as exc:
+            event.attempts += 1
+            event.last_error = f'{type(exc).__name__}: {exc}'
+            if event.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+                event.status = OutboxEvent.Status.FAILED
+                event.processed_at = now
+            else:
+                event.available_at = now + retry_delay(event.attempts, settings.OUTBOX_RETRY_DELAY, settings.OUTBOX_MAX_RETRY_DELAY)
+            leased.filter(pk=event.pk).update(
+                attempts=event.attempts, last_error=event.last_error, status=event.status,
+                processed_at=event.processed_at, available_at=event.available_at,
+            )
+    connection.close()
+    delivered = 0
+    for status, ids in done.items():
+        if ids:
+            delivered += leased.filter(pk__in=ids).update(status=status, processed_at=now)
+    return delivered
+
+
+def drain_outbox(batch_size=None, now=None):
+    """
+    Delivers the due outbox events, in batches sharing one mail connection.
+    An event that fails is retried with exponential backoff, starting at OUTBOX_RETRY_DELAY seconds and capped
+    at OUTBOX_MAX_RETRY_DELAY, and marked failed after OUTBOX_MAX_ATTEMPTS attempts.
+    Several workers may drain the outbox at the same time: each batch is claimed with a conditional UPDATE.
+    Args:
+        batch_size (int, optional): Number of events per batch, OUTBOX_BATCH_SIZE by default.
+        now (datetime, optional): The reference time, the current time by default.
+    Returns:
+        int: The number of events sent or skipped.
+    """
+    batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+    delivered = 0
+    while True:
+        batch_time = now or timezone.now()
+        events = _claim(batch_size, batch_time)
+        if not events:
+            return delivered
+        delivered += _deliver(events, batch_time)
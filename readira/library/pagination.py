@@ -0,0 +1,72 @@
+from django.db.models import Q
+
+
+
+class CursorPage:
+    """
+    A page of results produced by keyset (cursor) pagination.
+    Attributes:
+        object_list (list): The objects of the page.
+        next_cursor (int or None): The primary key of the last row, to pass to load the next page, or None on the last page.
+    """
+    def __init__(self, object_list, next_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+
+def _after(row, ordering):
+    # (a, b, pk) after (x, y, z) in the given directions: a > x OR (a = x AND b > y) OR (a = x AND b = y AND pk > z).
+    condition = Q(pk__in=[])
+    equal = {}
+    for field in ordering:
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        condition |= Q(**equal, **{f'{name}__{lookup}': row[name]})
+        equal[name] = row[name]
+    return condition
+
+
+def paginate_by_cursor(queryset, cursor, per_page, ordering=('-pk',)):
+    """
+    Keyset pagination, newest primary keys first unless another ordering is given.
+    Unlike OFFSET pagination, the cost of a page does not grow with its depth: every page is an
+    indexed range scan returning at most per_page + 1 rows. The cursor is the primary key of the last row
+    of the previous page; with a composite ordering its sort values are read back with one primary key lookup.
+    Args:
+        queryset (QuerySet): The rows to paginate.
+        cursor (str or int or None): The primary key the page starts after, as returned by the previous page.
+                                     Missing or invalid cursors return the first page.
+        per_page (int): Number of rows per page.
+        ordering (tuple, optional): Fields to sort by, '-' prefixed when descending, ending with the primary key.
+    Returns:
+        CursorPage: The requested page.
+    """
+    try:
+        cursor = int(cursor)
+    except (TypeError, ValueError):
+        cursor = None
+    if cursor is not None:
+        if tuple(ordering) == ('-pk',):
+            queryset = queryset.filter(pk__lt=cursor)
+        else:
+            row = queryset.filter(pk=cursor).values(*(field.lstrip('-') for field in ordering)).first()
+            if row is None:
+                return CursorPage([], None)
+            queryset = queryset.filter(_after(row, ordering))
+
+    rows = list(queryset.order_by(*ordering)[:per_page + 1])
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        return CursorPage(rows, rows[-1].pk)
+    return CursorPage(rows, None)
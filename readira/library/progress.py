@@ -0,0 +1,84 @@
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from user_account.models import CustomUser
+from .buffers import CoalescingBuffer
+from .models import ReadingMaterials, ReadingProgress
+
+
+
+def upsert_progress(entries):
+    """
+    Writes a batch of reading positions with a single INSERT ... ON CONFLICT (user, material) DO UPDATE statement.
+    Entries pointing to a user or material deleted in the meantime are dropped, so they cannot fail the whole batch.
+    Args:
+        entries (dict): {(user_id, material_id): (position, fraction, reported_at)} mapping of the latest positions.
+    """
+    user_ids = set(CustomUser.objects.filter(pk__in={user_id for user_id, _ in entries}).values_list('pk', flat=True))
+    material_ids = set(ReadingMaterials.objects.filter(pk__in={material_id for _, material_id in entries}).values_list('pk', flat=True))
+    with transaction.atomic():
+        ReadingProgress.objects.bulk_create(
+            [
+                ReadingProgress(user_id=user_id, material_id=material_id, position=position, fraction=fraction, updated_at=reported_at)
+                for (user_id, material_id), (position, fraction, reported_at) in entries.items()
+                if user_id in user_ids and material_id in material_ids
+            ],
+            update_conflicts=True,
+            unique_fields=['user', 'material'],
+            update_fields=['position', 'fraction', 'updated_at'],
+        )
+
+
+def _latest(pending, new):
+    return new if new[2] >= pending[2] else pending
+
+
+progress_buffer = CoalescingBuffer(
+    upsert_progress,
+    max_size=settings.PROGRESS_BUFFER_SIZE,
+    interval=settings.PROGRESS_FLUSH_INTERVAL,
+    merge=_latest,
+)
+
+
+def record_progress(user_id, material_id, position, fraction):
+    """
+    Records a reading position heartbeat. Heartbeats are coalesced per (user, material) in memory, so however often
+    a client reports, each reader costs at most one row write per PROGRESS_FLUSH_INTERVAL, shared with every other
+    reader in one batched upsert. At most PROGRESS_FLUSH_INTERVAL seconds of progress are lost if the process dies.
+    Args:
+        user_id (int): The ID of the reader.
+        material_id (int): The ID of the reading material.
+        position (str): The client's locator of the current position.
+        fraction (float): The share of the material already read, from 0 to 1.
+    """
+    progress_buffer.add((user_id, material_id), (position, fraction, timezone.now()))
+
+
+def end_reading_session(user_id, material_id=None):
+    """
+    Writes a reader's buffered positions right away, e.g. when they close a book or log out.
+    The positions of other readers stay buffered until their regular flush.
+    Args:
+        user_id (int): The ID of the reader.
+        material_id (int, optional): Only write the position in this material.
+    """
+    if material_id is None:
+        progress_buffer.flush(where=lambda key: key[0] == user_id)
+    else:
+        progress_buffer.flush(where=lambda key: key == (user_id, material_id))
+
+
+def get_progress(user_id, material_id):
+    """
+    Returns a reader's latest position, including a position still waiting in the buffer.
+    Returns:
+        tuple: (position, fraction), ('', 0) if the user never opened the material.
+    """
+    pending = progress_buffer.get((user_id, material_id))
+    if pending is not None:
+        return pending[0], pending[1]
+    return (
+        ReadingProgress.objects.filter(user_id=user_id, material_id=material_id).values_list('position', 'fraction').first()
+        or ('', 0)
+    )
@@ -0,0 +1,101 @@
+from decimal import Decimal
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg, Count
+from user_account.models import CustomUser
+from .buffers import CoalescingBuffer
+from .facets import publish_rating_bands, rating_band
+from .models import Rating, ReadingMaterials
+from .objcache import material_cache
+
+
+
+def upsert_ratings(ratings):
+    """
+    Writes a batch of ratings with a single INSERT ... ON CONFLICT (book, user) DO UPDATE statement,
+    then refreshes the stored rating aggregates of every book touched by the batch.
+    Being one statement, the upsert cannot race with itself the way a SELECT followed by an INSERT does.
+    Ratings of a book or by a user deleted in the meantime are dropped, so they cannot fail the whole batch.
+    Args:
+        ratings (dict): {(book_id, user_id): value} mapping of the ratings to write.
+    """
+    book_ids = set(ReadingMaterials.objects.filter(pk__in={book_id for book_id, _ in ratings}).values_list('pk', flat=True))
+    user_ids = set(CustomUser.objects.filter(pk__in={user_id for _, user_id in ratings}).values_list('pk', flat=True))
+    ratings = {
+        (book_id, user_id): value for (book_id, user_id), value in ratings.items()
+        if book_id in book_ids and user_id in user_ids
+    }
+    if not ratings:
+        return
+    with transaction.atomic():
+        Rating.objects.bulk_create(
+            [Rating(book_id=book_id, user_id=user_id, value=value) for (book_id, user_id), value in ratings.items()],
+            update_conflicts=True,
+            unique_fields=['book', 'user'],
+            update_fields=['value', 'updated_at'],
+        )
+        refresh_rating_aggregates({book_id for book_id, _ in ratings})
+
+
+def refresh_rating_aggregates(book_ids):
+    """
+    Recomputes ReadingMaterials.rating_count and rating_average for the given books
+    with one grouped query and one bulk update, and moves the books to their new rating band in the facet indexes.
+    Args:
+        book_ids (iterable): IDs of the reading materials to refresh.
+    """
+    book_ids = set(book_ids)
+    stats = {
+        row['book']: row
+        for row in Rating.objects.filter(book_id__in=book_ids).values('book').annotate(count=Count('id'), average=Avg('value'))
+    }
+    materials = []
+    for book_id in book_ids:
+        row = stats.get(book_id)
+        materials.append(ReadingMaterials(
+            pk=book_id,
+            rating_count=row['count'] if row else 0,
+            rating_average=Decimal(str(round(row['average'] or 0, 2))) if row else Decimal('0'),
+        ))
+    ReadingMaterials.objects.bulk_update(materials, ['rating_count', 'rating_average'])
+    material_cache.invalidate(*book_ids)
+    # The catalog version is left alone, so a rating does not purge every cached page and facet index:
+    # the facet indexes are patched in place, and cached list pages built on the old averages live out their PAGE_CACHE_TIMEOUT.
+    bands = {material.pk: rating_band(material.rating_average, material.rating_count) for material in materials}
+    transaction.on_commit(lambda: publish_rating_bands(bands))
+
+
+rating_buffer = CoalescingBuffer(
+    upsert_ratings,
+    max_size=settings.RATING_BUFFER_SIZE,
+    interval=settings.RATING_FLUSH_INTERVAL,
+)
+
+
+def submit_rating(book_id, user_id, value):
+    """
+    Records a user's rating of a reading material.
+    With RATING_BUFFER_ENABLED, ratings are coalesced per (book, user) in memory and written in batches,
+    so a burst of clicks on a popular title costs one upsert and one aggregate refresh per flush.
+    Otherwise the rating is upserted immediately.
+    Args:
+        book_id (int): The ID of the reading material.
+        user_id (int): The ID of the user.
+        value (int): The rating value (1 to 5).
+    """
+    if settings.RATING_BUFFER_ENABLED:
+        rating_buffer.add((book_id, user_id), value)
+    else:
+        upsert_ratings({(book_id, user_id): value})
+
+
+def get_user_rating(book_id, user_id):
+    """
+    Returns a user's rating of a reading material, including a rating still waiting in the buffer.
+    Returns:
+        int: The rating value, or 0 if the user has not rated the material.
+    """
+    pending = rating_buffer.get((book_id, user_id))
+    if pending is not None:
+        return pending
+    return Rating.objects.filter(book_id=book_id, user_id=user_id).values_list('value', flat=True).first() or 0
@@ -0,0 +1,78 @@
+import threading
+import time
+from django.conf import settings
+from django.core.cache import cache
+from .models import Category, Genre, SubscriptionPlan
+
+
+
+class ReferenceCache:
+    """
+    Process-local cache of a small, rarely changing table.
+    The whole table is loaded once and kept in memory, so lookups cost no database query.
+    Every save or delete of the model bumps a version key in the shared cache; each process compares its copy
+    against that key at most every REFERENCE_CACHE_CHECK_INTERVAL seconds and reloads the table when it moved,
+    which bounds how long other processes serve stale rows.
+    The returned instances are shared between requests and must be treated as read-only.
+    Attributes:
+        model (class): The cached model.
+        ordering (tuple): The ordering of all().
+    Methods:
+        - all(): Returns every row of the table.
+        - get(): Returns the row with the given primary key, or None.
+        - invalidate(): Bumps the shared version, making every process reload the table.
+    """
+    def __init__(self, model, ordering=('pk',)):
+        self.model = model
+        self.ordering = ordering
+        self.version_key = f'refdata:{model._meta.label_lower}:version'
+        self._lock = threading.Lock()
+        self._version = None
+        self._checked_at = 0.0
+        self._rows = []
+        self._by_pk = {}
+
+    def _current_version(self):
+        version = cache.get(self.version_key)
+        if version is None:
+            cache.add(self.version_key, time.time_ns(), None)
+            version = cache.get(self.version_key)
+        return version
+
+    def _load(self):
+        now = time.monotonic()
+        if self._version is not None and now - self._checked_at < settings.REFERENCE_CACHE_CHECK_INTERVAL:
+            return
+        with self._lock:
+            if self._version is not None and now - self._checked_at < settings.REFERENCE_CACHE_CHECK_INTERVAL:
+                return
+            version = self._current_version()
+            if version != self._version:
+                rows = list(self.model.objects.order_by(*self.ordering))
+                self._rows, self._by_pk = rows, {row.pk: row for row in rows}
+                self._version = version
+            self._checked_at = now
+
+    def all(self):
+        self._load()
+        return self._rows
+
+    def get(self, pk):
+        if pk is None:
+            return None
+        self._load()
+        try:
+            return self._by_pk.get(int(pk))
+        except (TypeError, ValueError):
+            return None
+
+    def invalidate(self):
+        cache.set(self.version_key, time.time_ns(), None)
+        with self._lock:
+            self._version = None
+
+
+# Counters maintained with UPDATE (Category.material_count) are not refreshed here: read them from the database.
+categories = ReferenceCache(Category, ordering=('name',))
+genres = ReferenceCache(Genre, ordering=('name',))
+subscription_plans = ReferenceCache(SubscriptionPlan)
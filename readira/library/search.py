@@ -0,0 +1,323 @@
+import hashlib
+import math
+import re
+import unicodedata
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+from .cache import get_catalog_version
+from .cards import cards_by_author, cards_by_id, material_cards
+from .models import Author, ReadingMaterials, SearchTerm, SearchTrigram
+
+
+WORD_RE = re.compile(r'\w+')
+# Highest code point: no normalized word continuing a prefix sorts after prefix + TERM_END.
+TERM_END = '\U0010ffff'
+
+
+
+def normalize(text):
+    """
+    Normalizes text for matching: decomposes it, strips the diacritics and casefolds it.
+    'Ștefan', 'Ştefan' (cedilla, as typed on older Romanian keyboards) and 'stefan' all become 'stefan',
+    and 'ă', 'â', 'î', 'ș', 'ț' match their base letters.
+    Args:
+        text (str): The text.
+    Returns:
+        str: The normalized text.
+    """
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return ''.join(char for char in decomposed if not unicodedata.combining(char)).casefold()
+
+
+def words(text):
+    """
+    Splits text into its distinct normalized words, in order of first appearance.
+    Args:
+        text (str): The text.
+    Returns:
+        list: The normalized words, truncated to the length of SearchTerm.term.
+    """
+    return list(dict.fromkeys(word[:64] for word in WORD_RE.findall(normalize(text))))
+
+
+def trigrams(text):
+    """
+    Cuts text into the distinct trigrams of its normalized words, each word padded with two spaces in front
+    and one behind, so short words and word starts weigh in.
+    Args:
+        text (str): The text.
+    Returns:
+        set: The trigrams.
+    """
+    grams = set()
+    for word in words(text):
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def _index(kind, texts):
+    ids = list(texts)
+    with transaction.atomic():
+        SearchTerm.objects.filter(kind=kind, object_id__in=ids).delete()
+        SearchTrigram.objects.filter(kind=kind, object_id__in=ids).delete()
+        SearchTerm.objects.bulk_create(
+            [SearchTerm(term=word, kind=kind, object_id=object_id) for object_id, text in texts.items() for word in words(text)],
+            batch_size=1000,
+        )
+        SearchTrigram.objects.bulk_create(
+            [SearchTrigram(trigram=gram, kind=kind, object_id=object_id) for object_id, text in texts.items() for gram in trigrams(text)],
+            batch_size=1000,
+        )
+
+
+def index_material(material):
+    """
+    Replaces the search terms and trigrams of a reading material with those of its title.
+    """
+    _index(SearchTerm.Kind.MATERIAL, {material.pk: material.title})
+
+
+def index_author(author):
+    """
+    Replaces the search terms and trigrams of an author with those of their name and surname.
+    """
+    _index(SearchTerm.Kind.AUTHOR, {author.pk: f'{author.name or ""} {author.surname or ""}'})
+
+
+def unindex(kind, object_id):
+    """
+    Removes the search terms and trigrams of a deleted reading material or author.
+    """
+    SearchTerm.objects.filter(kind=kind, object_id=object_id).delete()
+    SearchTrigram.objects.filter(kind=kind, object_id=object_id).delete()
+
+
+def rebuild_search_index(batch_size=1000):
+    """
+    Rebuilds the search terms and trigrams of every reading material and author, in batches.
+    Needed only when rows were changed without going through save(), e.g. with QuerySet.update() or bulk_create().
+    Returns:
+        int: The number of indexed reading materials and authors.
+    """
+    sources = [
+        (SearchTerm.Kind.MATERIAL, ReadingMaterials.objects.values_list('pk', 'title')),
+        (SearchTerm.Kind.AUTHOR, Author.objects.values_list('pk', 'name', 'surname')),
+    ]
+    indexed = 0
+    for kind, rows in sources:
+        SearchTerm.objects.filter(kind=kind).exclude(object_id__in=rows.model.objects.values('pk')).delete()
+        SearchTrigram.objects.filter(kind=kind).exclude(object_id__in=rows.model.objects.values('pk')).delete()
+        last_pk = 0
+        while True:
+            batch = list(rows.filter(pk__gt=last_pk).order_by('pk')[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1][0]
+            _index(kind, {row[0]: ' '.join(part or '' for part in row[1:]) for row in batch})
+            indexed += len(batch)
+    return indexed
+
+
+def matching_ids(kind, query):
+    """
+    Builds the lookups of the reading materials or authors having, for every word of the query, a word starting
+    with it. Each word of the query is one range scan on the search term index. Words shorter than SEARCH_MIN_PREFIX
+    only match whole words: as prefixes they would start a large share of the catalog's words.
+    Args:
+        kind (str): SearchTerm.Kind.MATERIAL or SearchTerm.Kind.AUTHOR.
+        query (str): The search query, in any case and with or without diacritics.
+    Returns:
+        list: One subquery per word of the query, to combine with pk__in filters; empty if the query has no words.
+    """
+    return [
+        SearchTerm.objects.filter(kind=kind, term__gte=word, term__lt=word + TERM_END).values('object_id')
+        if len(word) >= settings.SEARCH_MIN_PREFIX else
+        SearchTerm.objects.filter(kind=kind, term=word).values('object_id')
+        for word in words(query)
+    ]
+
+
+def _filter(queryset, subqueries):
+    for subquery in subqueries:
+        queryset = queryset.filter(pk__in=subquery)
+    return queryset
+
+
+def search_materials(query, limit=None):
+    """
+    Returns the reading materials whose title matches every word of the query, by title.
+    Args:
+        query (str): The search query.
+        limit (int, optional): Maximum number of results, SEARCH_RESULTS_LIMIT by default.
+    Returns:
+        QuerySet: The matching materials, with their authors.
+    """
+    subqueries = matching_ids(SearchTerm.Kind.MATERIAL, query)
+    if not subqueries:
+        return ReadingMaterials.objects.none()
+    return _filter(ReadingMaterials.objects.select_related('author'), subqueries).order_by('title', 'pk')[:limit or settings.SEARCH_RESULTS_LIMIT]
+
+
+def search_authors(query, limit=None):
+    """
+    Returns the authors whose name or surname match every word of the query, by surname and name.
+    Args:
+        query (str): The search query.
+        limit (int, optional): Maximum number of results, SEARCH_RESULTS_LIMIT by default.
+    Returns:
+        QuerySet: The matching authors.
+    """
+    subqueries = matching_ids(SearchTerm.Kind.AUTHOR, query)
+    if not subqueries:
+        return Author.objects.none()
+    return _filter(Author.objects, subqueries).order_by('surname', 'name', 'pk')[:limit or settings.SEARCH_RESULTS_LIMIT]
+
+
+def author_results(authors):
+    """
+    Builds the author entries of a search result: plain values holding no model instance, cheap to cache.
+    Args:
+        authors (list): (pk, label) pairs of the authors, in result order.
+    Returns:
+        list: [{'pk', 'label', 'books'}], the books being the MaterialCards of the author's materials, by title.
+    """
+    books = cards_by_author([pk for pk, _label in authors])
+    return [{'pk': pk, 'label': label, 'books': books[pk]} for pk, label in authors]
+
+
+def suggest(query, limit=None):
+    """
+    Autocomplete suggestions for a partially typed query: matching titles first, then author names.
+    Args:
+        query (str): The typed text.
+        limit (int, optional): Maximum number of suggestions, SEARCH_SUGGESTIONS_LIMIT by default.
+    Returns:
+        list: [{'label', 'kind', 'pk'}] with kind 'material' or 'author'.
+    """
+    limit = limit or settings.SEARCH_SUGGESTIONS_LIMIT
+    materials = matching_ids(SearchTerm.Kind.MATERIAL, query)
+    if not materials:
+        return []
+    suggestions = [
+        {'label': title, 'kind': 'material', 'pk': pk}
+        for pk, title in _filter(ReadingMaterials.objects, materials).order_by('title', 'pk').values_list('pk', 'title')[:limit]
+    ]
+    if len(suggestions) < limit:
+        authors = _filter(Author.objects, matching_ids(SearchTerm.Kind.AUTHOR, query)).order_by('surname', 'name', 'pk')
+        suggestions += [
+            {'label': f'{name or ""} {surname or ""}'.strip(), 'kind': 'author', 'pk': pk}
+            for pk, name, surname in authors.values_list('pk', 'name', 'surname')[:limit - len(suggestions)]
+        ]
+    return suggestions
+
+
+def _labels(kind, ids):
+    if kind == SearchTerm.Kind.MATERIAL:
+        return dict(ReadingMaterials.objects.filter(pk__in=ids).values_list('pk', 'title'))
+    return {
+        pk: f'{name or ""} {surname or ""}'.strip()
+        for pk, name, surname in Author.objects.filter(pk__in=ids).values_list('pk', 'name', 'surname')
+    }
+
+
+def fuzzy_matches(kind, query):
+    """
+    Finds the reading materials or authors whose title or full name is similar to the query, typos included.
+    Candidates are generated by the trigram index alone: only rows sharing at least SEARCH_FUZZY_THRESHOLD of the
+    query's trigrams can reach the threshold, and the SEARCH_FUZZY_CANDIDATES sharing the most are kept. They are
+    then ranked by trigram similarity, shared trigrams over the trigrams of both texts.
+    Args:
+        kind (str): SearchTerm.Kind.MATERIAL or SearchTerm.Kind.AUTHOR.
+        query (str): The search query.
+    Returns:
+        list: [(similarity, label, pk)] of the matches reaching SEARCH_FUZZY_THRESHOLD, most similar first.
+    """
+    query_grams = trigrams(query)
+    if not query_grams:
+        return []
+    min_shared = max(1, math.ceil(len(query_grams) * settings.SEARCH_FUZZY_THRESHOLD))
+    candidates = list(
+        SearchTrigram.objects.filter(kind=kind, trigram__in=query_grams)
+        .values('object_id')
+        .annotate(shared=Count('pk'))
+        .filter(shared__gte=min_shared)
+        .order_by('-shared')
+        .values_list('object_id', flat=True)[:settings.SEARCH_FUZZY_CANDIDATES]
+    )
+    matches = []
+    for pk, label in _labels(kind, candidates).items():
+        grams = trigrams(label)
+        similarity = len(query_grams & grams) / len(query_grams | grams)
+        if similarity >= settings.SEARCH_FUZZY_THRESHOLD:
+            matches.append((similarity, label, pk))
+    matches.sort(key=lambda match: (-match[0], match[1]))
+    return matches
+
+
+def fuzzy_search(query):
+    """
+    Typo-tolerant fallback for a query without exact matches, e.g. 'Andi Wier' for 'Andy Weir'.
+    Args:
+        query (str): The search query.
+    Returns:
+        dict: 'materials' and 'authors', the close matches ranked by similarity (at most SEARCH_RESULTS_LIMIT each),
+              and 'suggestions', the SEARCH_FUZZY_SUGGESTIONS best titles and names, for a 'did you mean' prompt.
+    """
+    limit = settings.SEARCH_RESULTS_LIMIT
+    material_matches = fuzzy_matches(SearchTerm.Kind.MATERIAL, query)[:limit]
+    author_matches = fuzzy_matches(SearchTerm.Kind.AUTHOR, query)[:limit]
+
+    suggestions = []
+    for _similarity, label, _pk in sorted(material_matches + author_matches, key=lambda match: -match[0]):
+        if label not in suggestions and words(label) != words(query):
+            suggestions.append(label)
+    return {
+        'materials': cards_by_id([pk for _, _, pk in material_matches]),
+        'authors': author_results([(pk, label) for _, label, pk in author_matches]),
+        'suggestions': suggestions[:settings.SEARCH_FUZZY_SUGGESTIONS],
+    }
+
+
+def query_key(query):
+    """
+    Normalizes a query to the form its results depend on: its distinct normalized words, space-separated.
+    'Andy  WEIR', 'andy weir' and 'Andy, Weir!' share one key.
+    Args:
+        query (str): The search query.
+    Returns:
+        str: The normalized query, empty if the query has no words.
+    """
+    return ' '.join(words(query))[:200]
+
+
+def cached_search(query):
+    """
+    Searches reading materials and authors, falling back to close matches when nothing matches exactly.
+    Results are cached per normalized query for SEARCH_CACHE_TIMEOUT seconds, under the catalog version,
+    so the few hundred queries making up most of the traffic are answered without touching the database,
+    and any catalog change retires every cached result at once. Cached results hold card projections and plain values
+    only, never model instances.
+    Args:
+        query (str): The search query.
+    Returns:
+        dict: 'materials', the MaterialCards of the matching materials; 'authors', the author entries built by
+              author_results(); 'suggestions', the 'did you mean' queries; 'fuzzy', whether the results are close matches.
+    """
+    key = query_key(query)
+    if not key:
+        return {'materials': [], 'authors': [], 'suggestions': [], 'fuzzy': False}
+    cache_key = f'search:{get_catalog_version()}:{hashlib.sha256(key.encode()).hexdigest()}'
+    result = cache.get(cache_key)
+    if result is None:
+        authors = [
+            (pk, f'{name or ""} {surname or ""}'.strip())
+            for pk, name, surname in search_authors(key).values_list('pk', 'name', 'surname')
+        ]
+        result = {'materials': material_cards(search_materials(key)), 'authors': author_results(authors), 'suggestions': [], 'fuzzy': False}
+        if not result['materials'] and not result['authors']:
+            result = {**fuzzy_search(key), 'fuzzy': True}
+        cache.set(cache_key, result, settings.SEARCH_CACHE_TIMEOUT)
+    return result
@@ -0,0 +1,71 @@
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .buffers import CoalescingBuffer
+from .models import SearchQueryStats
+from .search import query_key
+
+
+
+def write_search_stats(entries):
+    """
+    Adds a batch of search counts to the stored query statistics: one SELECT of the existing rows,
+    one bulk update and one bulk insert of the queries seen for the first time.
+    Args:
+        entries (dict): {query: (searches, zero_results, total_latency, max_latency, last_searched_at)} mapping.
+    """
+    with transaction.atomic():
+        existing = SearchQueryStats.objects.select_for_update().in_bulk(list(entries), field_name='query')
+        new = []
+        for query, (searches, zero_results, total_latency, max_latency, last_searched_at) in entries.items():
+            stats = existing.get(query)
+            if stats is None:
+                new.append(SearchQueryStats(
+                    query=query, searches=searches, zero_results=zero_results,
+                    total_latency=total_latency, max_latency=max_latency, last_searched_at=last_searched_at,
+                ))
+                continue
+            stats.searches += searches
+            stats.zero_results += zero_results
+            stats.total_latency += total_latency
+            stats.max_latency = max(stats.max_latency, max_latency)
+            stats.last_searched_at = max(stats.last_searched_at, last_searched_at)
+        SearchQueryStats.objects.bulk_update(
+            existing.values(), ['searches', 'zero_results', 'total_latency', 'max_latency', 'last_searched_at'],
+        )
+        # A process inserting the same new query first fails this batch, which the buffer then retries as updates.
+        SearchQueryStats.objects.bulk_create(new)
+
+
+def _add(pending, new):
+    return (
+        pending[0] + new[0],
+        pending[1] + new[1],
+        pending[2] + new[2],
+        max(pending[3], new[3]),
+        max(pending[4], new[4]),
+    )
+
+
+search_stats_buffer = CoalescingBuffer(
+    write_search_stats,
+    max_size=settings.SEARCH_STATS_BUFFER_SIZE,
+    interval=settings.SEARCH_STATS_FLUSH_INTERVAL,
+    merge=_add,
+)
+
+
+def record_search(query, found, latency):
+    """
+    Counts a search in memory. Searches are summed per normalized query and written in batches,
+    at most SEARCH_STATS_FLUSH_INTERVAL seconds later, so searching costs no database write.
+    Args:
+        query (str): The search query.
+        found (bool): Whether the search found anything, close matches included.
+        latency (float): The search time, in seconds.
+    """
+    key = query_key(query)
+    if key:
+        milliseconds = latency * 1000
+        search_stats_buffer.add(key, (1, 0 if found else 1, milliseconds, milliseconds, timezone.now()))
+
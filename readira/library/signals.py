@@ -0,0 +1,245 @@
+from django.conf import settings
+from django.db.models import F
+from django.db.models.functions import Substr
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.contrib.auth.signals import user_logged_out
+from django.dispatch import receiver
+from .cache import bump_catalog_version
+from .categories import adjust_material_count
+from .jobs import enqueue
+from .models import Author, Category, Genre, Order, ReadingMaterials, Review, SearchTerm, SubscriptionPlan
+from .objcache import author_cache, material_cache
+from .progress import end_reading_session
+from .refdata import categories, genres, subscription_plans
+from .search import index_author, index_material, unindex
+from .stats import adjust_author_stats, adjust_customer_stats
+from .tasks import process_image, warm_catalog_cache
+
+
+
+@receiver(post_save, sender=ReadingMaterials)
+@receiver(post_delete, sender=ReadingMaterials)
+@receiver(post_save, sender=Author)
+@receiver(post_delete, sender=Author)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Genre)
+@receiver(post_delete, sender=Genre)
+def purge_catalog_pages(sender, raw=False, **kwargs):
+    """
+    Purges every cached catalog page whenever a catalog object is created, edited or deleted,
+    and queues a warm-up of the catalog cache; a burst of edits shares one pending warm-up job.
+    """
+    bump_catalog_version()
+    if not raw:
+        enqueue(warm_catalog_cache, key='warm_catalog_cache', delay=settings.CACHE_WARM_DELAY)
+
+
+@receiver(pre_save, sender=ReadingMaterials)
+@receiver(pre_save, sender=Author)
+def remember_image_upload(sender, instance, raw=False, **kwargs):
+    """
+    Notes whether the save stores a newly uploaded image; the upload is written as is, before the field saves it.
+    """
+    instance._image_uploaded = not raw and bool(instance.image) and not instance.image._committed
+
+
+@receiver(post_save, sender=ReadingMaterials)
+@receiver(post_save, sender=Author)
+def queue_image_processing(sender, instance, **kwargs):
+    """
+    Queues the resizing of a newly uploaded image, so the upload request does not wait for it.
+    """
+    if getattr(instance, '_image_uploaded', False):
+        instance._image_uploaded = False
+        enqueue(process_image, sender._meta.label_lower, instance.pk, instance.image.name)
+
+
+@receiver(post_save, sender=ReadingMaterials)
+@receiver(post_delete, sender=ReadingMaterials)
+@receiver(post_save, sender=Author)
+@receiver(post_delete, sender=Author)
+def invalidate_cached_object(sender, instance, **kwargs):
+    """
+    Keeps the object cache coherent when a reading material or an author is saved or deleted.
+    """
+    {ReadingMaterials: material_cache, Author: author_cache}[sender].invalidate(instance.pk)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Genre)
+@receiver(post_delete, sender=Genre)
+@receiver(post_save, sender=SubscriptionPlan)
+@receiver(post_delete, sender=SubscriptionPlan)
+def invalidate_reference_data(sender, **kwargs):
+    """
+    Makes every process reload a reference table after it changed.
+    """
+    {Category: categories, Genre: genres, SubscriptionPlan: subscription_plans}[sender].invalidate()
+
+
+@receiver(post_save, sender=Review)
+def increment_review_count(sender, instance, created, **kwargs):
+    """
+    Keeps ReadingMaterials.review_count current when a review is written.
+    """
+    if created and instance.book_id:
+        ReadingMaterials.objects.filter(pk=instance.book_id).update(review_count=F('review_count') + 1)
+        material_cache.invalidate(instance.book_id)
+
+
+@receiver(post_delete, sender=Review)
+def decrement_review_count(sender, instance, **kwargs):
+    """
+    Keeps ReadingMaterials.review_count current when a review is deleted.
+    """
+    if instance.book_id:
+        ReadingMaterials.objects.filter(pk=instance.book_id, review_count__gt=0).update(review_count=F('review_count') - 1)
+        material_cache.invalidate(instance.book_id)
+
+
+@receiver(pre_save, sender=ReadingMaterials)
+def remember_previous_values(sender, instance, raw=False, **kwargs):
+    """
+    Remembers the category, title, author and genre a material had before being saved, so its moves can be counted
+    and a new title indexed after the save.
+    """
+    if raw:
+        return
+    fields = ('category_id', 'title', 'author_id', 'genre_id')
+    previous = ReadingMaterials.objects.filter(pk=instance.pk).values_list(*fields).first() if instance.pk else None
+    for field, value in zip(fields, previous or (None,) * len(fields)):
+        setattr(instance, f'_previous_{field}', value)
+
+
+@receiver(post_save, sender=ReadingMaterials)
+def count_material_in_category(sender, instance, raw=False, **kwargs):
+    """
+    Keeps Category.material_count current along both branches of the hierarchy when a material is added or moved.
+    """
+    previous = getattr(instance, '_previous_category_id', None)
+    if raw or previous == instance.category_id:
+        return
+    adjust_material_count(previous, -1)
+    adjust_material_count(instance.category_id, 1)
+
+
+@receiver(post_delete, sender=ReadingMaterials)
+def uncount_material_in_category(sender, instance, **kwargs):
+    """
+    Keeps Category.material_count current when a material is deleted.
+    """
+    adjust_material_count(instance.category_id, -1)
+
+
+@receiver(post_save, sender=ReadingMaterials)
+def count_material_for_author(sender, instance, raw=False, **kwargs):
+    """
+    Keeps the book count and genre set of the authors current when a material is added, or changes author or genre.
+    """
+    if raw:
+        return
+    previous = (getattr(instance, '_previous_author_id', None), getattr(instance, '_previous_genre_id', None))
+    if previous == (instance.author_id, instance.genre_id):
+        return
+    adjust_author_stats(*previous, -1)
+    adjust_author_stats(instance.author_id, instance.genre_id, 1)
+
+
+@receiver(post_delete, sender=ReadingMaterials)
+def uncount_material_for_author(sender, instance, **kwargs):
+    """
+    Keeps the book count and genre set of the author current when a material is deleted.
+    """
+    adjust_author_stats(instance.author_id, instance.genre_id, -1)
+
+
+@receiver(post_save, sender=ReadingMaterials)
+def index_material_title(sender, instance, raw=False, **kwargs):
+    """
+    Keeps the search terms of a material current when it is created or its title changes.
+    """
+    if not raw and instance.title != getattr(instance, '_previous_title', None):
+        index_material(instance)
+
+
+@receiver(post_save, sender=Author)
+def index_author_name(sender, instance, raw=False, **kwargs):
+    """
+    Keeps the search terms of an author current.
+    """
+    if not raw:
+        index_author(instance)
+
+
+@receiver(post_delete, sender=ReadingMaterials)
+@receiver(post_delete, sender=Author)
+def unindex_search_terms(sender, instance, **kwargs):
+    """
+    Removes the search terms of a deleted material or author.
+    """
+    unindex(SearchTerm.Kind.MATERIAL if sender is ReadingMaterials else SearchTerm.Kind.AUTHOR, instance.pk)
+
+
+@receiver(pre_delete, sender=Category)
+def uncount_deleted_category(sender, instance, **kwargs):
+    """
+    Removes the materials of a deleted category's subtree from the counts of its ancestors.
+    """
+    current = Category.objects.filter(pk=instance.pk).values('path', 'material_count').first()
+    if current and current['material_count']:
+        ancestor_ids = [int(pk) for pk in current['path'].split('/') if pk][:-1]
+        Category.objects.filter(pk__in=ancestor_ids).update(material_count=F('material_count') - current['material_count'])
+
+
+@receiver(post_delete, sender=Category)
+def reroot_orphaned_subcategories(sender, instance, **kwargs):
+    """
+    The children of a deleted category become top-level categories: strips the deleted part from the paths of their subtrees.
+    """
+    if instance.path:
+        Category.subtree(instance.path).update(
+            path=Substr('path', len(instance.path) + 1),
+            depth=F('depth') - (instance.depth + 1),
+        )
+
+
+@receiver(pre_save, sender=Order)
+def remember_previous_order_total(sender, instance, raw=False, **kwargs):
+    """
+    Remembers the total cost an order had before being saved, so edits can be applied to the customer statistics.
+    """
+    if raw:
+        return
+    instance._previous_total = (
+        Order.objects.filter(pk=instance.pk).values_list('total_cost', flat=True).first() if instance.pk else None
+    )
+
+
+@receiver(post_save, sender=Order)
+def count_order(sender, instance, created, raw=False, **kwargs):
+    """
+    Keeps CustomerStats current when an order is placed or its total changes.
+    """
+    if raw:
+        return
+    previous = getattr(instance, '_previous_total', None) or 0
+    adjust_customer_stats(instance.user_id, orders=1 if created else 0, spent=(instance.total_cost or 0) - previous)
+
+
+@receiver(post_delete, sender=Order)
+def uncount_order(sender, instance, **kwargs):
+    """
+    Keeps CustomerStats current when an order is deleted.
+    """
+    adjust_customer_stats(instance.user_id, orders=-1, spent=-(instance.total_cost or 0))
+
+
+@receiver(user_logged_out)
+def flush_reading_progress(sender, user=None, **kwargs):
+    """
+    Ends the reading session on logout, so the reader's last positions are written right away.
+    """
+    if user is not None:
+        end_reading_session(user.pk)
@@ -0,0 +1,62 @@
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import Author, AuthorGenre, CustomerStats
+from .objcache import author_cache
+
+
+
+def adjust_customer_stats(user_id, orders=0, spent=0):
+    """
+    Adds to the stored order aggregates of a customer with one UPDATE, creating the row on the customer's first order.
+    Args:
+        user_id (int): The ID of the customer.
+        orders (int): The change of the number of orders.
+        spent (Decimal): The change of the total spent.
+    """
+    if not user_id or not (orders or spent):
+        return
+    if CustomerStats.objects.filter(user_id=user_id).update(order_count=F('order_count') + orders, total_spent=F('total_spent') + spent):
+        return
+    if orders < 0:
+        # Nothing to take the order off, e.g. the customer is being deleted together with their statistics.
+        return
+    try:
+        with transaction.atomic():
+            CustomerStats.objects.create(user_id=user_id, order_count=orders, total_spent=spent)
+    except IntegrityError:
+        # Created by a concurrent order in the meantime.
+        CustomerStats.objects.filter(user_id=user_id).update(order_count=F('order_count') + orders, total_spent=F('total_spent') + spent)
+
+
+def adjust_author_stats(author_id, genre_id, books):
+    """
+    Adds to the stored book count and genre set of an author, with conditional UPDATEs: the author's genre link is
+    created with their first reading material of the genre and deleted with their last one.
+    Args:
+        author_id (int): The ID of the author, or None.
+        genre_id (int): The ID of the genre of the added or removed materials, or None.
+        books (int): The change of the number of materials.
+    """
+    if not author_id or not books:
+        return
+    # Moving updated_at forward also changes the validators of the author page, which shows these statistics.
+    Author.objects.filter(pk=author_id, book_count__gte=max(-books, 0)).update(
+        book_count=F('book_count') + books, updated_at=timezone.now(),
+    )
+    author_cache.invalidate(author_id)
+    if not genre_id:
+        return
+    links = AuthorGenre.objects.filter(author_id=author_id, genre_id=genre_id)
+    if books < 0:
+        links.filter(book_count__gte=-books).update(book_count=F('book_count') + books)
+        links.filter(book_count=0).delete()
+        return
+    if links.update(book_count=F('book_count') + books):
+        return
+    try:
+        with transaction.atomic():
+            AuthorGenre.objects.create(author_id=author_id, genre_id=genre_id, book_count=books)
+    except IntegrityError:
+        # Created by a concurrent save in the meantime.
+        links.update(book_count=F('book_count') + books)
@@ -0,0 +1,80 @@
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .models import OutboxEvent, Subscription
+
+
+
+def renew_subscriptions(batch_size=None, now=None):
+    """
+    Renews ended subscriptions flagged with auto_renew, in batches.
+    Every renewed subscription is deactivated and replaced by a new active one of the same plan,
+    starting where the previous one ended, and a renewal notice is queued in the outbox.
+    If the sweep runs so late that the whole renewed period would already be over, the renewal starts now instead:
+    a subscription is renewed at most once per sweep, however far behind the sweeper is.
+    Args:
+        batch_size (int, optional): Number of subscriptions per batch, SUBSCRIPTION_SWEEP_BATCH by default.
+        now (datetime, optional): The reference time, the current time by default.
+    Returns:
+        int: The number of renewed subscriptions.
+    """
+    batch_size = batch_size or settings.SUBSCRIPTION_SWEEP_BATCH
+    now = now or timezone.now()
+    renewed = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                Subscription.objects.filter(active=True, auto_renew=True, end_date__lt=now)
+                .select_related('plan')
+                .only('user_id', 'end_date', 'plan__duration_days')
+                .order_by('end_date')[:batch_size]
+            )
+            if not batch:
+                break
+            updated = Subscription.objects.filter(pk__in=[sub.pk for sub in batch], active=True).update(active=False, auto_renew=False)
+            if updated != len(batch):
+                # Another sweeper got to some of these rows first: start over with fresh rows.
+                transaction.set_rollback(True)
+                continue
+            renewals = []
+            for sub in batch:
+                duration = timedelta(days=sub.plan.duration_days or 30)
+                start = sub.end_date if sub.end_date + duration > now else now
+                renewals.append(Subscription(
+                    user_id=sub.user_id, plan_id=sub.plan_id, start_date=start, end_date=start + duration, active=True, auto_renew=True,
+                ))
+            Subscription.objects.bulk_create(renewals)
+            OutboxEvent.objects.bulk_create([
+                OutboxEvent(kind=OutboxEvent.Kind.SUBSCRIPTION_RENEWED, user_id=sub.user_id, payload={'subscription_id': sub.pk})
+                for sub in renewals
+            ])
+        renewed += len(batch)
+    return renewed
+
+
+def expire_subscriptions(batch_size=None, now=None):
+    """
+    Deactivates subscriptions whose end date has passed, in batches.
+    Each batch is a range scan on the (active, end_date) index followed by a single UPDATE,
+    so the sweep never holds the write lock for long.
+    Args:
+        batch_size (int, optional): Number of subscriptions per batch, SUBSCRIPTION_SWEEP_BATCH by default.
+        now (datetime, optional): The reference time, the current time by default.
+    Returns:
+        int: The number of deactivated subscriptions.
+    """
+    batch_size = batch_size or settings.SUBSCRIPTION_SWEEP_BATCH
+    now = now or timezone.now()
+    expired = 0
+    while True:
+        with transaction.atomic():
+            ids = list(
+                Subscription.objects.filter(active=True, end_date__lt=now)
+                .order_by('end_date')
+                .values_list('pk', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            expired += Subscription.objects.filter(pk__in=ids, active=True).update(active=False)
+    return expired
@@ -0,0 +1,61 @@
+from django.conf import settings
+from django.core.files.base import ContentFile
+from readira.storage import resize_image
+from . import categories, search
+from .cache import bump_catalog_version
+from .jobs import task
+from .models import Author, ReadingMaterials
+from .objcache import author_cache, material_cache
+
+
+IMAGE_MODELS = {'library.readingmaterials': (ReadingMaterials, material_cache), 'library.author': (Author, author_cache)}
+
+
+
+@task
+def process_image(model_label, pk, stored_name):
+    """
+    Scales an uploaded cover or author portrait down to IMAGE_MAX_SIZE and optimizes it, then points the row to
+    the processed file. Nothing is changed if the image was replaced in the meantime.
+    Args:
+        model_label (str): 'library.readingmaterials' or 'library.author'.
+        pk (int): The ID of the row.
+        stored_name (str): The name of the uploaded image in the storage.
+    """
+    model, object_cache = IMAGE_MODELS[model_label]
+    storage = model._meta.get_field('image').storage
+    with storage.open(stored_name, 'rb') as f:
+        content = ContentFile(f.read(), name=storage.unhashed_name(stored_name))
+    processed = resize_image(content, settings.IMAGE_MAX_SIZE)
+    if processed is content:
+        return
+    name = storage.save(content.name, processed)
+    if model.objects.filter(pk=pk, image=stored_name).update(image=name):
+        object_cache.invalidate(pk)
+        bump_catalog_version()
+
+
+@task
+def warm_catalog_cache():
+    """
+    Loads the first CACHE_WARM_SIZE materials of the catalog, in list order, and their authors into the shared tier
+    of the object cache, so the first visitors after a catalog edit do not all miss it at once.
+    """
+    ids = ReadingMaterials.objects.order_by('title', 'pk').values_list('pk', flat=True)[:settings.CACHE_WARM_SIZE]
+    material_cache.get_many(ids)
+
+
+@task
+def rebuild_category_index():
+    """
+    Recomputes the category paths and material counts, see categories.rebuild_category_index().
+    """
+    categories.rebuild_category_index()
+
+
+@task
+def rebuild_search_index():
+    """
+    Rebuilds the search terms of every reading material and author, see search.rebuild_search_index().
+    """
+    search.rebuild_search_index()
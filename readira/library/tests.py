@@ -1,3 +1,1186 @@
-from django.test import TestCase
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
+from django.db import connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.core import mail
+from django.core.cache import cache
+from django.http import Http404
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings, tag
+from django.urls import reverse
+from django.utils import timezone
+from readira.assets import serve_asset
+from user_account.models import CustomUser
+from .buffers import CoalescingBuffer
+from .cache import CSRF_PLACEHOLDER, get_catalog_version
+from .cards import MaterialCard
+from .delivery import delivery_url
+from .facets import RATING_LOG_SEQ_KEY, facet_groups, facet_results, get_facet_index
+from .jobs import claim_jobs, enqueue, run_job, task
+from .inventory import OutOfStock, consume_reservations, release, release_expired_reservations, reserve
+from .loans import LoanRefused, borrow, expire_loans, return_loans
+from .models import (
+    Author, CartReservation, Category, Genre, Job, Loan, OutboxEvent, Rating, ReadingMaterials, ReadingProgress,
+    Review, SearchQueryStats, Subscription, SubscriptionPlan,
+)
+from .objcache import ObjectCache, author_cache, material_cache
+from .outbox import _claim, _deliver, drain_outbox, record_event
+from .progress import progress_buffer
+from .ratings import get_user_rating, rating_buffer, submit_rating
+from .refdata import ReferenceCache
+from .search import cached_search, fuzzy_search, normalize, rebuild_search_index, search_authors, search_materials, suggest
+from .searchstats import search_stats_buffer, write_search_stats
+from .subscriptions import expire_subscriptions, renew_subscriptions
 
-# Create your tests here.
+
+
+def run_concurrently(func, args_list):
+    """
+    Runs func(*args) in one thread per item of args_list, all released at the same time.
+    Returns the list of results, with raised exceptions returned in place of results.
+    """
+    barrier = threading.Barrier(len(args_list))
+    results = [None] * len(args_list)
+
+    def worker(index, args):
+        try:
+            barrier.wait()
+            results[index] = func(*args)
+        except Exception as exc:
+            results[index] = exc
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker, args=(index, args)) for index, args in enumerate(args_list)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+
+class InventoryConcurrencyTests(TransactionTestCase):
+    """
+    Stress tests hammering the stock of one material from hundreds of threads at once.
+    """
+    buyers = 200
+
+    def setUp(self):
+        CustomUser.objects.bulk_create([CustomUser(email=f'buyer{i}@example.com') for i in range(self.buyers)])
+        self.users = list(CustomUser.objects.order_by('pk'))
+
+    def create_material(self, stock):
+        return ReadingMaterials.objects.create(title='Popular title', price=10, stock=stock)
+
+    def buy(self, user, material_id, quantity=1):
+        with transaction.atomic():
+            consume_reservations(user, {material_id: quantity})
+        return True
+
+    def test_concurrent_purchases_never_oversell(self):
+        material = self.create_material(stock=50)
+
+        results = run_concurrently(self.buy, [(user, material.pk) for user in self.users])
+
+        sold = results.count(True)
+        self.assertEqual(sold, 50)
+        self.assertTrue(all(result is True or isinstance(result, OutOfStock) for result in results))
+        material.refresh_from_db()
+        self.assertEqual(material.stock, 0)
+
+    def test_concurrent_reservations_lose_no_updates(self):
+        material = self.create_material(stock=1000)
+
+        results = run_concurrently(reserve, [(user, material.pk, 3) for user in self.users])
+        self.assertEqual(results, [None] * self.buyers)
+        material.refresh_from_db()
+        self.assertEqual(material.stock, 1000 - 3 * self.buyers)
+
+        run_concurrently(release, [(user, material.pk) for user in self.users[::2]])
+        material.refresh_from_db()
+        self.assertEqual(material.stock, 1000 - 3 * (self.buyers // 2))
+        self.assertEqual(CartReservation.objects.count(), self.buyers // 2)
+
+    def test_reservations_hold_stock_for_their_owner(self):
+        material = self.create_material(stock=1)
+        reserve(self.users[0], material.pk, 1)
+
+        with self.assertRaises(OutOfStock):
+            reserve(self.users[1], material.pk, 1)
+        self.assertTrue(self.buy(self.users[0], material.pk))
+        material.refresh_from_db()
+        self.assertEqual(material.stock, 0)
+        self.assertFalse(CartReservation.objects.exists())
+
+    def test_sweeper_racing_checkouts_keeps_stock_consistent(self):
+        material = self.create_material(stock=self.buyers)
+        for user in self.users:
+            reserve(user, material.pk, 1)
+        CartReservation.objects.update(expires_at=timezone.now() - timedelta(minutes=1))
+
+        args = [(user, material.pk) for user in self.users]
+        sweeper = threading.Thread(target=lambda: (release_expired_reservations(batch_size=25), connection.close()))
+        sweeper.start()
+        results = run_concurrently(self.buy, args)
+        sweeper.join()
+        release_expired_reservations()
+
+        sold = results.count(True)
+        material.refresh_from_db()
+        self.assertEqual(material.stock + sold, self.buyers)
+        self.assertEqual(sold, self.buyers)
+        self.assertFalse(CartReservation.objects.exists())
+
+
+
+class MaterialSaveTests(TestCase):
+    """
+    Saving a material read before its counters or stock changed keeps those changes.
+    """
+    def setUp(self):
+        self.material = ReadingMaterials.objects.create(title='Popular title', price=10, stock=10)
+        self.user = CustomUser.objects.create(email='buyer@example.com')
+
+    def test_stale_instance_keeps_counters_and_sales(self):
+        stale = ReadingMaterials.objects.get(pk=self.material.pk)
+        reserve(self.user, self.material.pk, 3)
+        ReadingMaterials.objects.filter(pk=self.material.pk).update(review_count=2, rating_count=1, rating_average=4)
+
+        stale.title = 'Renamed'
+        stale.stock += 5
+        stale.save()
+
+        self.material.refresh_from_db()
+        self.assertEqual(self.material.title, 'Renamed')
+        self.assertEqual(self.material.stock, 12)
+        self.assertEqual(stale.stock, 12)
+        self.assertEqual((self.material.review_count, self.material.rating_count, self.material.rating_average), (2, 1, 4))
+
+    def test_stock_never_drops_below_zero(self):
+        stale = ReadingMaterials.objects.get(pk=self.material.pk)
+        reserve(self.user, self.material.pk, 8)
+
+        stale.stock = 0
+        stale.save()
+
+        self.material.refresh_from_db()
+        self.assertEqual(self.material.stock, 0)
+
+
+
+class LoanConcurrencyTests(TransactionTestCase):
+    """
+    Stress tests opening loans from many threads at once.
+    """
+    borrowers = 50
+
+    def setUp(self):
+        CustomUser.objects.bulk_create([CustomUser(email=f'reader{i}@example.com') for i in range(self.borrowers)])
+        self.users = list(CustomUser.objects.order_by('pk'))
+        plan = SubscriptionPlan.objects.create(name='Reader', price=5, duration_days=30, max_loans=2)
+        end_date = timezone.now() + timedelta(days=30)
+        Subscription.objects.bulk_create([Subscription(user=user, plan=plan, end_date=end_date, active=True) for user in self.users])
+
+    def test_concurrent_borrows_respect_copy_limit(self):
+        material = ReadingMaterials.objects.create(title='Popular title', price=10, loan_copies=10)
+
+        results = run_concurrently(borrow, [(user, material.pk) for user in self.users])
+
+        self.assertEqual(sum(isinstance(result, Loan) for result in results), 10)
+        self.assertTrue(all(isinstance(result, (Loan, LoanRefused)) for result in results))
+        material.refresh_from_db()
+        self.assertEqual(material.active_loans, 10)
+        self.assertEqual(Loan.objects.filter(returned_at__isnull=True).count(), 10)
+
+    def test_repeated_clicks_open_one_loan_within_quota(self):
+        user = self.users[0]
+        materials = [ReadingMaterials.objects.create(title=f'Title {i}', price=10) for i in range(3)]
+
+        results = run_concurrently(borrow, [(user, material.pk) for material in materials for _ in range(5)])
+
+        self.assertTrue(all(isinstance(result, (Loan, LoanRefused)) for result in results))
+        self.assertEqual(Loan.objects.filter(user=user, returned_at__isnull=True).count(), 2)
+        self.assertEqual(sum(material.active_loans for material in ReadingMaterials.objects.all()), 2)
+
+    def test_returns_racing_expiry_give_each_copy_back_once(self):
+        material = ReadingMaterials.objects.create(title='Popular title', price=10, loan_copies=self.borrowers)
+        for user in self.users:
+            borrow(user, material.pk)
+        Loan.objects.update(due_date=timezone.now() - timedelta(minutes=1))
+
+        sweeper = threading.Thread(target=lambda: (expire_loans(batch_size=5), connection.close()))
+        sweeper.start()
+        run_concurrently(return_loans, [(user, [material.pk]) for user in self.users])
+        sweeper.join()
+
+        material.refresh_from_db()
+        self.assertEqual(material.active_loans, 0)
+        self.assertFalse(Loan.objects.filter(returned_at__isnull=True).exists())
+
+
+
+class SubscriptionSweepTests(TestCase):
+    """
+    Renewal and expiry sweeps over subscriptions that ended.
+    """
+    def setUp(self):
+        self.now = timezone.now()
+        self.plan = SubscriptionPlan.objects.create(name='Reader', price=5, duration_days=30)
+        self.user = CustomUser.objects.create(email='subscriber@example.com')
+
+    def subscribe(self, end_date, auto_renew=True):
+        return Subscription.objects.create(user=self.user, plan=self.plan, end_date=end_date, active=True, auto_renew=auto_renew)
+
+    def test_renewal_starts_where_previous_ended(self):
+        ended = self.subscribe(self.now - timedelta(days=1))
+
+        self.assertEqual(renew_subscriptions(now=self.now), 1)
+
+        ended.refresh_from_db()
+        self.assertFalse(ended.active)
+        self.assertFalse(ended.auto_renew)
+        renewal = Subscription.objects.get(active=True)
+        self.assertEqual(renewal.start_date, ended.end_date)
+        self.assertEqual(renewal.end_date, ended.end_date + timedelta(days=30))
+        self.assertTrue(renewal.auto_renew)
+        self.assertEqual(OutboxEvent.objects.get().payload, {'subscription_id': renewal.pk})
+
+    def test_lagging_sweep_renews_once(self):
+        self.subscribe(self.now - timedelta(days=90))
+
+        self.assertEqual(renew_subscriptions(batch_size=1, now=self.now), 1)
+        self.assertEqual(renew_subscriptions(now=self.now), 0)
+
+        renewal = Subscription.objects.get(active=True)
+        self.assertEqual(renewal.start_date, self.now)
+        self.assertEqual(renewal.end_date, self.now + timedelta(days=30))
+        self.assertEqual(Subscription.objects.count(), 2)
+
+    def test_expiry_deactivates_only_ended_subscriptions(self):
+        ended = self.subscribe(self.now - timedelta(minutes=1), auto_renew=False)
+        current = self.subscribe(self.now + timedelta(days=1), auto_renew=False)
+
+        self.assertEqual(expire_subscriptions(batch_size=1, now=self.now), 1)
+
+        ended.refresh_from_db()
+        current.refresh_from_db()
+        self.assertFalse(ended.active)
+        self.assertTrue(current.active)
+
+    def test_sweep_renews_before_expiring(self):
+        self.subscribe(self.now - timedelta(days=1))
+        self.subscribe(self.now - timedelta(days=1), auto_renew=False)
+
+        self.assertEqual(renew_subscriptions(now=self.now), 1)
+        self.assertEqual(expire_subscriptions(now=self.now), 1)
+
+        self.assertEqual(Subscription.objects.filter(active=True).count(), 1)
+        self.assertTrue(Subscription.objects.get(active=True).auto_renew)
+
+
+
+@override_settings(DELIVERY_ACCEL_REDIRECT='/protected/')
+class DeliveryTests(TestCase):
+    """
+    Signed delivery links are only honored for their borrower while the loan is open.
+    """
+    def setUp(self):
+        self.material = ReadingMaterials.objects.create(title='E-book', price=10, digital_file='reading_materials/book.epub')
+        self.user = CustomUser.objects.create(email='borrower@example.com')
+        self.loan = Loan.objects.create(user=self.user, material=self.material, due_date=timezone.now() + timedelta(days=14))
+        self.url = delivery_url(self.loan, self.material)
+        self.client = Client()
+
+    def test_borrower_gets_the_file(self):
+        self.client.force_login(self.user)
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected/reading_materials/book.epub')
+
+    def test_link_is_refused_to_other_users(self):
+        self.client.force_login(CustomUser.objects.create(email='friend@example.com'))
+
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_link_expires_with_the_loan(self):
+        return_loans(self.user, [self.material.pk])
+        self.client.force_login(self.user)
+
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_link_is_refused_to_anonymous_users(self):
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_forged_token_is_refused(self):
+        self.client.force_login(self.user)
+
+        self.assertEqual(self.client.get(reverse('library:deliver_file', args=['forged'])).status_code, 404)
+
+
+
+class AssetRangeTests(SimpleTestCase):
+    """
+    Assets are served whole, precompressed, or as a single byte range, and unsatisfiable ranges are refused.
+    """
+    content = bytes(range(256)) * 4
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = directory.name
+        with open(os.path.join(self.root, 'cover.abcdef012345.png'), 'wb') as f:
+            f.write(self.content)
+        with open(os.path.join(self.root, 'cover.abcdef012345.png.gz'), 'wb') as f:
+            f.write(b'compressed')
+
+    def get(self, **headers):
+        return serve_asset(RequestFactory().get('/media/cover.abcdef012345.png', **headers), 'cover.abcdef012345.png', self.root)
+
+    def test_whole_file_is_compressed_and_immutable(self):
+        response = self.get(HTTP_ACCEPT_ENCODING='gzip, deflate')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'compressed')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+
+    def test_range_is_served_uncompressed(self):
+        response = self.get(HTTP_RANGE='bytes=100-199', HTTP_ACCEPT_ENCODING='gzip')
+
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), self.content[100:200])
+        self.assertEqual(response['Content-Range'], f'bytes 100-199/{len(self.content)}')
+        self.assertEqual(response['Content-Length'], '100')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_suffix_and_open_ended_ranges(self):
+        response = self.get(HTTP_RANGE='bytes=-24')
+        self.assertEqual(b''.join(response.streaming_content), self.content[-24:])
+        self.assertEqual(response['Content-Range'], f'bytes 1000-1023/{len(self.content)}')
+
+        response = self.get(HTTP_RANGE='bytes=1020-5000')
+        self.assertEqual(b''.join(response.streaming_content), self.content[1020:])
+
+    def test_unsatisfiable_range_is_refused(self):
+        for header in ('bytes=1024-', 'bytes=-0', 'bytes=20-10'):
+            response = self.get(HTTP_RANGE=header)
+
+            self.assertEqual(response.status_code, 416)
+            self.assertEqual(response['Content-Range'], f'bytes */{len(self.content)}')
+
+    def test_malformed_range_serves_the_whole_file(self):
+        response = self.get(HTTP_RANGE='bytes=0-1,5-6')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+
+
+
+class PageCacheTests(TestCase):
+    """
+    Cached anonymous pages are served with each visitor's own CSRF token and purged when the catalog changes.
+    """
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('library:author_list')
+
+    def token_of(self, response):
+        return re.search(r'name="csrfmiddlewaretoken" value="([^"]*)"', response.content.decode()).group(1)
+
+    def test_cached_page_carries_the_visitors_token(self):
+        Client().get(self.url)
+        visitor = Client(enforce_csrf_checks=True)
+
+        with self.assertNumQueries(0):
+            response = visitor.get(self.url)
+
+        self.assertNotIn(CSRF_PLACEHOLDER, response.content.decode())
+        self.assertIn('private', response['Cache-Control'])
+        self.assertNotIn('public', response['Cache-Control'])
+        posted = visitor.post(reverse('set_language'), {'language': 'en', 'csrfmiddlewaretoken': self.token_of(response)})
+        self.assertEqual(posted.status_code, 302)
+
+    def test_catalog_change_purges_cached_pages(self):
+        Client().get(self.url)
+        version = get_catalog_version()
+
+        Author.objects.create(name='Ada', surname='Palmer')
+
+        self.assertNotEqual(get_catalog_version(), version)
+        self.assertContains(Client().get(self.url), 'Palmer')
+
+
+
+class ConditionalGetTests(TestCase):
+    """
+    Detail pages answer a matching validator with 304, until something they show changes.
+    """
+    def setUp(self):
+        self.genre = Genre.objects.create(name='Crime')
+        self.author = Author.objects.create(name='Ada', surname='Palmer')
+        self.material = ReadingMaterials.objects.create(title='Night streets', price=10, author=self.author, genre=self.genre)
+        self.client = Client()
+
+    def revalidate(self, url):
+        # The first visit hands out the CSRF cookie the validators depend on.
+        self.client.get(url)
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        return etag
+
+    def test_material_page_changes_after_an_edit(self):
+        url = reverse('library:reading_material_detail', args=[self.material.pk])
+        etag = self.revalidate(url)
+
+        self.material.title = 'Dark streets'
+        self.material.save()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Dark streets')
+
+    def test_author_page_follows_materials_and_genres(self):
+        self.client.force_login(CustomUser.objects.create(email='reader@example.com'))
+        url = reverse('library:author_details', args=[self.author.pk])
+        etag = self.revalidate(url)
+
+        self.genre.name = 'Noir'
+        self.genre.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        etag = self.revalidate(url)
+        ReadingMaterials.objects.create(title='Second', price=10, author=self.author, genre=self.genre)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+
+class ReviewPagingTests(TestCase):
+    """
+    The details page shows the newest reviews, and the 'Load older reviews' links walk through the rest once each.
+    """
+    def setUp(self):
+        self.material = ReadingMaterials.objects.create(title='Popular title', price=10)
+        other = ReadingMaterials.objects.create(title='Other title', price=10)
+        users = CustomUser.objects.bulk_create([CustomUser(email=f'reviewer{i}@example.com') for i in range(23)])
+        Review.objects.bulk_create([Review(book=self.material, user=user, title=f'Review {i}') for i, user in enumerate(users)])
+        Review.objects.create(book=other, user=users[0], title='Elsewhere')
+
+    def test_load_more_walks_every_review_once(self):
+        page = Client().get(reverse('library:reading_material_detail', args=[self.material.pk])).context['reviews']
+        seen = [review.title for review in page]
+        fragment = Client().get(reverse('library:material_reviews', args=[self.material.pk]), {'before': page.next_cursor})
+        while True:
+            seen.extend(review.title for review in fragment.context['reviews'])
+            link = re.search(r'href="([^"]*)" data-load-more', fragment.content.decode())
+            if link is None:
+                break
+            fragment = Client().get(link.group(1).replace('&amp;', '&'))
+
+        self.assertEqual(len(page), 10)
+        self.assertEqual(seen, [f'Review {i}' for i in reversed(range(23))])
+
+    def test_invalid_cursor_returns_the_first_page(self):
+        response = Client().get(reverse('library:material_reviews', args=[self.material.pk]), {'before': 'nonsense'})
+
+        self.assertEqual([review.title for review in response.context['reviews']], [f'Review {i}' for i in range(22, 12, -1)])
+        self.assertContains(response, 'data-load-more')
+
+
+
+class ReferenceCacheTests(TestCase):
+    """
+    Reference tables are read from process memory, and reloaded once another process changed them.
+    """
+    def setUp(self):
+        cache.clear()
+        self.genre = Genre.objects.create(name='Crime')
+        self.cached = ReferenceCache(Genre, ordering=('name',))
+
+    def test_lookups_cost_no_query(self):
+        self.cached.all()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.cached.get(str(self.genre.pk)).name, 'Crime')
+            self.assertEqual([genre.name for genre in self.cached.all()], ['Crime'])
+            self.assertIsNone(self.cached.get('crime'))
+            self.assertIsNone(self.cached.get(None))
+
+    def test_changes_show_up_after_the_check_interval(self):
+        self.cached.all()
+
+        self.genre.name = 'Noir'
+        self.genre.save()
+
+        with self.settings(REFERENCE_CACHE_CHECK_INTERVAL=60):
+            self.assertEqual(self.cached.get(self.genre.pk).name, 'Crime')
+        with self.settings(REFERENCE_CACHE_CHECK_INTERVAL=0):
+            self.assertEqual(self.cached.get(self.genre.pk).name, 'Noir')
+            self.genre.delete()
+            self.assertIsNone(self.cached.get(self.genre.pk))
+
+
+
+class ObjectCacheTests(TestCase):
+    """
+    Materials and authors are read through two cache tiers, each caller getting its own copy.
+    """
+    def setUp(self):
+        cache.clear()
+        self.author = Author.objects.create(name='Ada', surname='Palmer')
+        self.material = ReadingMaterials.objects.create(title='Night streets', price=10, author=self.author)
+
+    def test_hits_cost_no_query_and_return_copies(self):
+        material_cache.get(self.material.pk)
+
+        with self.assertNumQueries(0):
+            material = material_cache.get(self.material.pk)
+            self.assertEqual(material.author.display_name, 'Ada Palmer')
+            material.title = 'Changed by a caller'
+            self.assertEqual(material_cache.get(self.material.pk).title, 'Night streets')
+
+    def test_save_invalidates_both_tiers(self):
+        material_cache.get(self.material.pk)
+
+        self.material.title = 'Dark streets'
+        self.material.save()
+
+        self.assertEqual(material_cache.get(self.material.pk).title, 'Dark streets')
+
+    def test_local_tier_of_other_processes_expires(self):
+        other = ObjectCache(ReadingMaterials)
+        other.get(self.material.pk)
+
+        self.material.title = 'Dark streets'
+        self.material.save()
+
+        with self.settings(OBJECT_CACHE_LOCAL_TTL=60):
+            self.assertEqual(other.get(self.material.pk).title, 'Night streets')
+        with self.settings(OBJECT_CACHE_LOCAL_TTL=0):
+            self.assertEqual(other.get(self.material.pk).title, 'Dark streets')
+
+    @override_settings(OBJECT_CACHE_LOCAL_SIZE=2)
+    def test_local_tier_is_bounded(self):
+        other = ObjectCache(ReadingMaterials)
+        more = [ReadingMaterials.objects.create(title=f'Title {i}', price=10) for i in range(2)]
+
+        self.assertEqual(len(other.get_many([self.material.pk] + [material.pk for material in more])), 3)
+        self.assertEqual(len(other._local), 2)
+
+    def test_missing_objects(self):
+        self.assertIsNone(material_cache.get('nonsense'))
+        with self.assertRaises(Http404):
+            author_cache.get_or_404(self.author.pk + 1)
+
+
+
+class ReadingProgressTests(TestCase):
+    """
+    The reading progress API is reserved to borrowers, and ending a session only writes that reader's positions.
+    """
+    def setUp(self):
+        # Keep the buffer's timer from flushing on its own connection while a test runs.
+        self.addCleanup(setattr, progress_buffer, 'interval', progress_buffer.interval)
+        progress_buffer.interval = 60
+        self.addCleanup(progress_buffer.flush)
+        self.material = ReadingMaterials.objects.create(title='E-book', price=10)
+        self.readers = [CustomUser.objects.create(email=f'reader{i}@example.com') for i in range(2)]
+        for reader in self.readers:
+            Loan.objects.create(user=reader, material=self.material, due_date=timezone.now() + timedelta(days=14))
+        self.url = reverse('library:reading_progress', args=[self.material.pk])
+        self.client = Client()
+
+    def report(self, reader, position, **extra):
+        self.client.force_login(reader)
+        return self.client.post(self.url, {'position': position, 'fraction': 0.5, **extra})
+
+    def test_progress_requires_an_open_loan(self):
+        Loan.objects.filter(user=self.readers[0]).update(returned_at=timezone.now())
+
+        self.assertEqual(self.report(self.readers[0], 'chapter-2').status_code, 403)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.assertIsNone(progress_buffer.get((self.readers[0].pk, self.material.pk)))
+
+    def test_buffered_position_is_read_back(self):
+        self.assertEqual(self.report(self.readers[0], 'chapter-2').status_code, 204)
+
+        self.assertEqual(self.client.get(self.url).json(), {'position': 'chapter-2', 'fraction': 0.5})
+        self.assertFalse(ReadingProgress.objects.exists())
+
+    def test_ending_a_session_writes_only_that_readers_position(self):
+        self.report(self.readers[1], 'chapter-9')
+        self.report(self.readers[0], 'chapter-2', end=1)
+
+        self.assertEqual(list(ReadingProgress.objects.values_list('user_id', 'position')), [(self.readers[0].pk, 'chapter-2')])
+        self.assertIsNotNone(progress_buffer.get((self.readers[1].pk, self.material.pk)))
+
+    def test_logout_writes_only_that_readers_positions(self):
+        self.report(self.readers[1], 'chapter-9')
+        self.report(self.readers[0], 'chapter-2')
+
+        self.client.get(reverse('user_account:logout'))
+
+        self.assertEqual(list(ReadingProgress.objects.values_list('user_id', 'position')), [(self.readers[0].pk, 'chapter-2')])
+        self.assertIsNotNone(progress_buffer.get((self.readers[1].pk, self.material.pk)))
+
+
+
+class CategoryTreeTests(TestCase):
+    """
+    Subtree queries over the materialized category paths, after moves and deletions.
+    """
+    def setUp(self):
+        self.fiction = Category.objects.create(name='Fiction')
+        self.crime = Category.objects.create(name='Crime', parent=self.fiction)
+        self.noir = Category.objects.create(name='Noir', parent=self.crime)
+        self.poetry = Category.objects.create(name='Poetry')
+        # A sibling whose ID shares the crime category's digits must not fall in its subtree.
+        self.other = Category.objects.create(id=int(f'{self.crime.pk}0'), name='Other', parent=self.fiction)
+
+    def names(self, queryset):
+        return sorted(queryset.values_list('name', flat=True))
+
+    def test_descendants_cover_the_subtree_only(self):
+        self.assertEqual(self.names(self.fiction.descendants()), ['Crime', 'Fiction', 'Noir', 'Other'])
+        self.assertEqual(self.names(self.crime.descendants()), ['Crime', 'Noir'])
+
+    def test_moved_subtree_follows_its_root(self):
+        self.crime.parent = self.poetry
+        self.crime.save()
+
+        self.assertEqual(self.names(self.poetry.descendants()), ['Crime', 'Noir', 'Poetry'])
+        self.noir.refresh_from_db()
+        self.assertEqual(self.noir.path, f'{self.poetry.pk}/{self.crime.pk}/{self.noir.pk}/')
+        self.assertEqual(self.noir.depth, 2)
+
+    def test_children_of_a_deleted_category_become_roots(self):
+        self.crime.delete()
+
+        self.noir.refresh_from_db()
+        self.assertEqual(self.noir.path, f'{self.noir.pk}/')
+        self.assertEqual(self.names(self.fiction.descendants()), ['Fiction', 'Other'])
+
+    def test_category_page_lists_the_subtree(self):
+        ReadingMaterials.objects.create(title='Night streets', price=10, category=self.noir)
+        ReadingMaterials.objects.create(title='Elsewhere', price=10, category=self.other)
+
+        response = Client().get(reverse('library:category_detail', args=[self.crime.pk]))
+
+        self.assertEqual([card.title for card in response.context['materials']], ['Night streets'])
+
+
+
+class AuthorStatsTests(TestCase):
+    """
+    The stored book count and genre set of authors follow their materials being created, moved and deleted.
+    """
+    def setUp(self):
+        self.crime, self.poetry = Genre.objects.create(name='Crime'), Genre.objects.create(name='Poetry')
+        self.ada, self.ben = Author.objects.create(name='Ada'), Author.objects.create(name='Ben')
+        self.materials = [
+            ReadingMaterials.objects.create(title=f'Title {i}', price=10, author=self.ada, genre=genre)
+            for i, genre in enumerate([self.crime, self.crime, self.poetry])
+        ]
+
+    def stats(self, author):
+        author.refresh_from_db()
+        return author.book_count, dict(author.genre_counts.values_list('genre__name', 'book_count'))
+
+    def test_created_materials_are_counted(self):
+        self.assertEqual(self.stats(self.ada), (3, {'Crime': 2, 'Poetry': 1}))
+        self.assertEqual(self.stats(self.ben), (0, {}))
+
+    def test_moved_materials_change_authors_and_genres(self):
+        self.materials[0].author = self.ben
+        self.materials[0].save()
+        self.materials[2].genre = self.crime
+        self.materials[2].save()
+
+        self.assertEqual(self.stats(self.ada), (2, {'Crime': 2}))
+        self.assertEqual(self.stats(self.ben), (1, {'Crime': 1}))
+
+    def test_deleted_materials_are_uncounted(self):
+        self.materials[2].delete()
+        self.materials[0].delete()
+
+        self.assertEqual(self.stats(self.ada), (1, {'Crime': 1}))
+
+    def test_saving_a_stale_author_keeps_the_count(self):
+        stale = Author.objects.get(pk=self.ada.pk)
+        ReadingMaterials.objects.create(title='Title 3', price=10, author=self.ada, genre=self.poetry)
+
+        stale.surname = 'Palmer'
+        stale.save()
+
+        self.assertEqual(self.stats(self.ada), (4, {'Crime': 2, 'Poetry': 2}))
+
+
+
+class FacetRatingTests(TestCase):
+    """
+    Ratings move materials between rating bands of the facet index without invalidating the catalog.
+    """
+    def setUp(self):
+        cache.clear()
+        self.materials = [ReadingMaterials.objects.create(title=f'Title {i}', price=10) for i in range(3)]
+        self.users = [CustomUser.objects.create(email=f'rater{i}@example.com') for i in range(2)]
+
+    def rate(self, material, user, value):
+        with self.captureOnCommitCallbacks(execute=True):
+            submit_rating(material.pk, user.pk, value)
+
+    def rated(self, band):
+        index = get_facet_index()
+        return index.ids_between(index.mask({'rating': {band}}), 0, len(index.ids))
+
+    def test_rating_patches_the_index_in_place(self):
+        index = get_facet_index()
+        version = get_catalog_version()
+
+        self.rate(self.materials[1], self.users[0], 4)
+        self.assertEqual(self.rated('4'), [self.materials[1].pk])
+        self.rate(self.materials[1], self.users[1], 1)
+        self.assertEqual(self.rated('4'), [])
+        self.assertEqual(self.rated('2'), [self.materials[1].pk])
+
+        self.assertIs(get_facet_index(), index)
+        self.assertEqual(get_catalog_version(), version)
+        self.assertEqual(get_facet_index().counts({})['rating'], {'1': 0, '2': 1, '3': 0, '4': 0})
+
+    def test_band_label_matches_its_filter(self):
+        self.rate(self.materials[0], self.users[0], 3)
+        self.rate(self.materials[1], self.users[0], 5)
+
+        rating = next(group for group in facet_groups({'rating': {'3'}}) if group['name'] == 'rating')
+        self.assertIn({'value': '3', 'label': '3–4 ★', 'count': 1, 'selected': True}, rating['values'])
+        cards = facet_results({'rating': {'3'}}, ReadingMaterials.objects.all())
+        self.assertEqual([card.pk for card in cards], [self.materials[0].pk])
+
+    def test_lost_log_entry_rebuilds_the_index(self):
+        index = get_facet_index()
+        self.rate(self.materials[0], self.users[0], 3)
+        cache.delete(f'facets:rating-log:{cache.get(RATING_LOG_SEQ_KEY)}')
+
+        self.assertEqual(self.rated('3'), [self.materials[0].pk])
+        self.assertIsNot(get_facet_index(), index)
+
+
+
+class RatingBufferTests(TestCase):
+    """
+    Buffered ratings are written in one flush, and entries that cannot be written do not block the others.
+    """
+    def setUp(self):
+        self.addCleanup(setattr, rating_buffer, 'interval', rating_buffer.interval)
+        rating_buffer.interval = 60
+        self.addCleanup(rating_buffer.flush)
+        self.materials = [ReadingMaterials.objects.create(title=f'Title {i}', price=10) for i in range(2)]
+        self.user = CustomUser.objects.create(email='rater@example.com')
+
+    @override_settings(RATING_BUFFER_ENABLED=True)
+    def test_flush_skips_ratings_of_deleted_books(self):
+        submit_rating(self.materials[0].pk, self.user.pk, 2)
+        submit_rating(self.materials[0].pk, self.user.pk, 4)
+        submit_rating(self.materials[1].pk, self.user.pk, 5)
+        self.assertEqual(get_user_rating(self.materials[0].pk, self.user.pk), 4)
+        self.materials[1].delete()
+
+        rating_buffer.flush()
+
+        self.assertEqual(len(rating_buffer), 0)
+        self.assertEqual(list(Rating.objects.values_list('book_id', 'value')), [(self.materials[0].pk, 4)])
+        self.materials[0].refresh_from_db()
+        self.assertEqual((self.materials[0].rating_count, self.materials[0].rating_average), (1, 4))
+
+    def test_entries_that_keep_failing_are_dropped(self):
+        flush_func = mock.Mock(side_effect=RuntimeError)
+        buffer = CoalescingBuffer(flush_func, interval=60, max_retries=3)
+        buffer.add('key', 1)
+
+        with self.assertLogs('library.buffers', 'ERROR'):
+            for _ in range(3):
+                buffer.flush()
+
+        self.assertEqual(flush_func.call_count, 3)
+        self.assertEqual(len(buffer), 0)
+
+
+
+class OrderFoldMigrationTests(TransactionTestCase):
+    """
+    Migration 0017 folds the legacy one-row-per-item orders of a checkout into one order with lines.
+    """
+    migrate_from = [('library', '0016_customerstats')]
+    migrate_to = [('library', '0017_order_lines')]
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.migrate_from)
+        self.apps = executor.loader.project_state(self.migrate_from).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_rows_of_one_checkout_become_one_order(self):
+        User = self.apps.get_model('user_account', 'CustomUser')
+        Material = self.apps.get_model('library', 'ReadingMaterials')
+        Order = self.apps.get_model('library', 'Order')
+        jane = User.objects.create(email='jane@example.com')
+        john = User.objects.create(email='john@example.com')
+        books = [Material.objects.create(title=f'Title {i}', price=10) for i in range(3)]
+        now = timezone.now()
+
+        def row(user, book, submitted_at, card='4' * 16, quantity=1):
+            # Every legacy row got its own random buy session hash.
+            return Order.objects.create(
+                user=user, reading_material=book, quantity=quantity, price_per_item=10, total_cost=10 * quantity,
+                submitted_at=submitted_at, card_number=card, card_expiry='12/39', cardholder_name=user.email,
+                buy_session_hash=f'{user.pk}-{book.pk}-{submitted_at.timestamp()}', client_full_name=user.email,
+            )
+
+        first = row(jane, books[0], now, quantity=2)
+        row(john, books[0], now)
+        row(jane, books[1], now + timedelta(milliseconds=3))
+        later = row(jane, books[2], now + timedelta(days=1))
+        other_card = row(jane, books[2], now + timedelta(days=1, milliseconds=2), card='5' * 16)
+
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.migrate_to)
+        apps = executor.loader.project_state(self.migrate_to).apps
+        Order = apps.get_model('library', 'Order')
+
+        jane_orders = {order.pk: order for order in Order.objects.filter(user_id=jane.pk)}
+        self.assertEqual(set(jane_orders), {first.pk, later.pk, other_card.pk})
+        self.assertEqual(
+            sorted(jane_orders[first.pk].lines.values_list('reading_material_id', 'quantity')),
+            [(books[0].pk, 2), (books[1].pk, 1)],
+        )
+        self.assertEqual(jane_orders[first.pk].total_cost, 30)
+        self.assertEqual(jane_orders[later.pk].lines.count(), 1)
+        self.assertEqual(Order.objects.filter(user_id=john.pk).count(), 1)
+
+
+
+@override_settings(
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    OUTBOX_RETRY_DELAY=30, OUTBOX_MAX_RETRY_DELAY=100, OUTBOX_MAX_ATTEMPTS=3, OUTBOX_LEASE_SECONDS=300,
+)
+class OutboxTests(TestCase):
+    """
+    Delivery of outbox events: batching, retries with backoff, giving up, and taking over the lease of a dead worker.
+    """
+    def setUp(self):
+        self.now = timezone.now()
+        plan = SubscriptionPlan.objects.create(name='Reader', price=5, duration_days=30)
+        self.users = [CustomUser.objects.create(email=f'member{i}@example.com') for i in range(5)]
+        self.events = []
+        for user in self.users:
+            subscription = Subscription.objects.create(user=user, plan=plan, end_date=self.now + timedelta(days=30))
+            event = record_event(OutboxEvent.Kind.SUBSCRIPTION_RENEWED, user.pk, subscription_id=subscription.pk)
+            self.events.append(event)
+        OutboxEvent.objects.update(available_at=self.now)
+
+    def statuses(self):
+        return list(OutboxEvent.objects.order_by('pk').values_list('status', flat=True))
+
+    def test_events_are_sent_in_batches(self):
+        CustomUser.objects.filter(pk=self.users[0].pk).update(preferred_channel=CustomUser.Channel.MAIL)
+
+        with mock.patch('library.outbox.get_connection', wraps=mail.get_connection) as get_connection:
+            self.assertEqual(drain_outbox(batch_size=2, now=self.now), 5)
+
+        self.assertEqual(get_connection.call_count, 3)
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), [user.email for user in self.users[1:]])
+        self.assertEqual(self.statuses(), [OutboxEvent.Status.SKIPPED] + [OutboxEvent.Status.SENT] * 4)
+        self.assertEqual(drain_outbox(now=self.now), 0)
+
+    def test_failures_back_off_then_give_up(self):
+        OutboxEvent.objects.exclude(pk=self.events[0].pk).delete()
+        now = self.now
+        with mock.patch('library.outbox.EmailMessage.send', side_effect=ConnectionError('mail server down')):
+            for delay in (30, 60):
+                self.assertEqual(drain_outbox(now=now), 0)
+                event = OutboxEvent.objects.get()
+                self.assertEqual(event.status, OutboxEvent.Status.PENDING)
+                self.assertEqual(event.available_at, now + timedelta(seconds=delay))
+                self.assertEqual(drain_outbox(now=event.available_at - timedelta(seconds=1)), 0)
+                now = event.available_at
+            drain_outbox(now=now)
+
+        event = OutboxEvent.objects.get()
+        self.assertEqual(event.status, OutboxEvent.Status.FAILED)
+        self.assertEqual(event.attempts, 3)
+        self.assertEqual(event.last_error, 'ConnectionError: mail server down')
+        self.assertEqual(mail.outbox, [])
+
+    def test_backoff_is_capped(self):
+        OutboxEvent.objects.exclude(pk=self.events[0].pk).delete()
+        OutboxEvent.objects.update(attempts=1)
+
+        with mock.patch('library.outbox.EmailMessage.send', side_effect=ConnectionError('mail server down')):
+            drain_outbox(now=self.now)
+
+        self.assertEqual(OutboxEvent.objects.get().available_at, self.now + timedelta(seconds=60))
+        OutboxEvent.objects.update(available_at=self.now, attempts=0)
+        with self.settings(OUTBOX_MAX_RETRY_DELAY=20), mock.patch('library.outbox.EmailMessage.send', side_effect=ConnectionError):
+            drain_outbox(now=self.now)
+        self.assertEqual(OutboxEvent.objects.get().available_at, self.now + timedelta(seconds=20))
+
+    def test_lease_of_a_dead_worker_is_taken_over(self):
+        claimed = _claim(batch_size=2, now=self.now)
+
+        self.assertEqual(len(claimed), 2)
+        self.assertEqual(drain_outbox(now=self.now + timedelta(seconds=299)), 3)
+        self.assertEqual(drain_outbox(now=self.now + timedelta(seconds=300)), 2)
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(self.statuses(), [OutboxEvent.Status.SENT] * 5)
+
+    def test_expired_lease_does_not_overwrite_the_new_owner(self):
+        stale = _claim(batch_size=2, now=self.now)
+        drain_outbox(now=self.now + timedelta(seconds=300))
+        processed_at = list(OutboxEvent.objects.order_by('pk').values_list('processed_at', flat=True))
+
+        with mock.patch('library.outbox.EmailMessage.send', side_effect=ConnectionError('mail server down')):
+            self.assertEqual(_deliver(stale[:1], self.now), 0)
+        self.assertEqual(_deliver(stale[1:], self.now), 0)
+
+        self.assertEqual(self.statuses(), [OutboxEvent.Status.SENT] * 5)
+        self.assertFalse(OutboxEvent.objects.filter(attempts__gt=0).exists())
+        self.assertEqual(list(OutboxEvent.objects.order_by('pk').values_list('processed_at', flat=True)), processed_at)
+
+
+
+@task
+def failing_task():
+    raise ValueError('broken task')
+
+
+@override_settings(JOB_LEASE_SECONDS=600, JOB_RETRY_DELAY=10, JOB_MAX_RETRY_DELAY=3600)
+class JobQueueTests(TransactionTestCase):
+    """
+    Retries, give-ups and lease expiry of the job queue.
+    """
+    def test_failing_job_backs_off_then_fails(self):
+        job = enqueue(failing_task, max_attempts=3)
+
+        for attempts in (1, 2):
+            [job_id] = claim_jobs(10, now=timezone.now() + timedelta(days=attempts))
+            self.assertFalse(run_job(job_id))
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts), (Job.Status.PENDING, attempts))
+            self.assertAlmostEqual((job.available_at - timezone.now()).total_seconds(), 10 * 2 ** (attempts - 1), delta=5)
+        [job_id] = claim_jobs(10, now=timezone.now() + timedelta(days=3))
+        run_job(job_id)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.last_error), (Job.Status.FAILED, 3, 'ValueError: broken task'))
+
+    def test_failed_run_yields_to_a_job_queued_with_its_key(self):
+        job = enqueue(failing_task, key='refresh')
+        [job_id] = claim_jobs(10)
+        duplicate = enqueue(failing_task, key='refresh')
+
+        self.assertFalse(run_job(job_id))
+
+        self.assertEqual(list(Job.objects.values_list('pk', 'status')), [(duplicate.pk, Job.Status.PENDING)])
+        self.assertFalse(Job.objects.filter(pk=job.pk).exists())
+
+    def test_expired_lease_counts_as_an_attempt(self):
+        job = enqueue(failing_task, max_attempts=2)
+        now = timezone.now()
+
+        self.assertEqual(claim_jobs(10, now=now), [job.pk])
+        self.assertEqual(claim_jobs(10, now=now + timedelta(seconds=599)), [])
+        self.assertEqual(claim_jobs(10, now=now + timedelta(seconds=600)), [job.pk])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.Status.RUNNING, 1))
+
+        self.assertEqual(claim_jobs(10, now=now + timedelta(seconds=1200)), [])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.Status.FAILED, 2))
+
+
+
+class SearchIndexTests(TestCase):
+    """
+    Word-prefix search on the normalized term index, and its maintenance as titles and names change.
+    """
+    def setUp(self):
+        self.author = Author.objects.create(name='Mihail', surname='Sadoveanu')
+        self.material = ReadingMaterials.objects.create(title='Baltagul', price=10, author=self.author)
+        ReadingMaterials.objects.create(title='Țara de dincolo de negură', price=10)
+        ReadingMaterials.objects.create(title='Ştefan cel Mare şi Sfânt', price=10)
+        ReadingMaterials.objects.create(title='Amintiri din copilărie', price=10)
+
+    def titles(self, query):
+        return [material.title for material in search_materials(query)]
+
+    def test_normalize_folds_romanian_diacritics_and_case(self):
+        self.assertEqual(normalize('Ștefan'), 'stefan')
+        self.assertEqual(normalize('Ştefan'), 'stefan')
+        self.assertEqual(normalize('ȚARĂ ŢARĂ'), 'tara tara')
+        self.assertEqual(normalize('Mâine În Brașov'), 'maine in brasov')
+        self.assertEqual(normalize('STRASSE Straße'), 'strasse strasse')
+
+    def test_comma_and_cedilla_spellings_match_each_other(self):
+        self.assertEqual(self.titles('ștefan'), ['Ştefan cel Mare şi Sfânt'])
+        self.assertEqual(self.titles('STEFAN SI'), ['Ştefan cel Mare şi Sfânt'])
+        self.assertEqual(self.titles('Ţara'), ['Țara de dincolo de negură'])
+        self.assertEqual(self.titles('copilarie'), ['Amintiri din copilărie'])
+        self.assertEqual(self.titles('sfant'), ['Ştefan cel Mare şi Sfânt'])
+
+    def test_short_words_match_whole_words_only(self):
+        self.assertEqual(self.titles('de'), ['Țara de dincolo de negură'])
+        self.assertEqual(self.titles('ba'), [])
+        self.assertEqual(self.titles('bal'), ['Baltagul'])
+
+    def test_every_word_must_prefix_a_word(self):
+        self.assertEqual(self.titles('din'), ['Amintiri din copilărie', 'Țara de dincolo de negură'])
+        self.assertEqual(self.titles('din cop'), ['Amintiri din copilărie'])
+        self.assertEqual(self.titles('amin negura'), [])
+        # Words match by prefix, not as substrings.
+        self.assertEqual(self.titles('altagul'), [])
+        self.assertEqual(self.titles('  ,  '), [])
+
+    def test_index_follows_title_and_name_changes(self):
+        self.material.title = 'Hanu Ancuței'
+        self.material.save()
+        self.author.surname = 'Eminescu'
+        self.author.save()
+
+        self.assertEqual(self.titles('baltagul'), [])
+        self.assertEqual(self.titles('hanu ancutei'), ['Hanu Ancuței'])
+        self.assertEqual(list(search_authors('sadoveanu')), [])
+        self.assertEqual(list(search_authors('mihail emin')), [self.author])
+
+    def test_deleted_rows_leave_the_index(self):
+        self.material.delete()
+        self.author.delete()
+
+        self.assertEqual(self.titles('baltagul'), [])
+        self.assertEqual(list(search_authors('mihail')), [])
+        self.assertEqual(suggest('balt'), [])
+
+
+
+class SearchResultTests(TestCase):
+    """
+    Cached search results and the search statistics.
+    """
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(setattr, search_stats_buffer, 'interval', search_stats_buffer.interval)
+        search_stats_buffer.interval = 60
+        self.addCleanup(search_stats_buffer.flush)
+        self.author = Author.objects.create(name='Mihail', surname='Sadoveanu')
+        ReadingMaterials.objects.create(title='Neamul Șoimăreștilor', price=10, author=self.author)
+        ReadingMaterials.objects.create(title='Baltagul', price=10, author=self.author)
+
+    def test_results_are_cached_as_plain_values(self):
+        result = cached_search('Sadoveanu')
+
+        self.assertEqual(result['authors'], [{'pk': self.author.pk, 'label': 'Mihail Sadoveanu', 'books': result['authors'][0]['books']}])
+        self.assertEqual([book.title for book in result['authors'][0]['books']], ['Baltagul', 'Neamul Șoimăreștilor'])
+        self.assertTrue(all(isinstance(book, MaterialCard) for book in result['authors'][0]['books']))
+        with self.assertNumQueries(0):
+            self.assertEqual(cached_search('  SADOVEANU!  ')['authors'][0]['label'], 'Mihail Sadoveanu')
+
+    def test_catalog_changes_retire_cached_results(self):
+        self.assertEqual([card.title for card in cached_search('baltagul')['materials']], ['Baltagul'])
+        material = ReadingMaterials.objects.get(title='Baltagul')
+        material.title = 'Baltag'
+        material.save()
+
+        self.assertEqual([card.title for card in cached_search('baltag')['materials']], ['Baltag'])
+        self.assertTrue(cached_search('baltagul')['fuzzy'])
+
+    def test_close_matches_are_cached_too(self):
+        result = cached_search('Sadovenu')
+
+        self.assertTrue(result['fuzzy'])
+        self.assertEqual(result['suggestions'], ['Mihail Sadoveanu'])
+        self.assertEqual(result['authors'][0]['pk'], self.author.pk)
+
+    def test_every_search_is_counted(self):
+        client = Client()
+        for query in ['Baltagul', 'baltagul', 'nothing at all']:
+            self.assertEqual(client.get(reverse('search'), {'q': query}).status_code, 200)
+        search_stats_buffer.flush()
+
+        stats = {row[0]: row[1:] for row in SearchQueryStats.objects.values_list('query', 'searches', 'zero_results')}
+        self.assertEqual(stats, {'baltagul': (2, 0), 'nothing at all': (1, 1)})
+
+    def test_stats_batches_add_up(self):
+        now = timezone.now()
+        write_search_stats({'baltagul': (2, 0, 10.0, 6.0, now)})
+        write_search_stats({'baltagul': (1, 1, 3.0, 3.0, now + timedelta(minutes=1)), 'neamul': (1, 0, 2.0, 2.0, now)})
+
+        baltagul = SearchQueryStats.objects.get(query='baltagul')
+        self.assertEqual((baltagul.searches, baltagul.zero_results, baltagul.total_latency, baltagul.max_latency), (3, 1, 13.0, 6.0))
+        self.assertEqual(baltagul.last_searched_at, now + timedelta(minutes=1))
+        self.assertEqual(SearchQueryStats.objects.get(query='neamul').searches, 1)
+
+
+
+@tag('slow')
+class SearchLatencyTests(TestCase):
+    """
+    Search latency budgets over a catalog of 100,000 generated titles, run with manage.py test --tag slow.
+    Each budget is checked on the median of several runs, so a single scheduler hiccup cannot fail the test.
+    """
+    titles = 100_000
+    exact_budget = 0.05
+    fuzzy_budget = 0.25
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(47)
+        syllables = ['ka', 'lo', 'mi', 'ra', 'tu', 'se', 'vin', 'dor', 'an', 'el', 'ix', 'or', 'ma', 'ne', 'pu', 'zi', 'ță', 'șe']
+        vocabulary = list({''.join(rng.choice(syllables) for _ in range(rng.randint(2, 4))) for _ in range(20_000)})
+        authors = Author.objects.bulk_create(
+            [Author(name=rng.choice(vocabulary).title(), surname=rng.choice(vocabulary).title()) for _ in range(5_000)]
+            + [Author(name='Andy', surname='Weir')]
+        )
+        ReadingMaterials.objects.bulk_create(
+            [
+                ReadingMaterials(
+                    title=' '.join(rng.choice(vocabulary) for _ in range(rng.randint(1, 5))).capitalize(),
+                    price=10,
+                    author=rng.choice(authors),
+                )
+                for _ in range(cls.titles - 1)
+            ]
+            + [ReadingMaterials(title='Project Hail Mary', price=10, author=authors[-1])],
+            batch_size=5_000,
+        )
+        rebuild_search_index(batch_size=5_000)
+
+    def median_duration(self, func, *args, runs=5):
+        durations = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            func(*args)
+            durations.append(time.perf_counter() - start)
+        return sorted(durations)[runs // 2]
+
+    def test_exact_search_within_budget(self):
+        self.assertEqual([material.title for material in search_materials('PROJECT hail')], ['Project Hail Mary'])
+        for query in ['project hail', 'ka', 'dorma ne', 'Șeka']:
+            self.assertLess(self.median_duration(lambda q: list(search_materials(q)), query), self.exact_budget, query)
+
+    def test_fuzzy_fallback_within_budget(self):
+        result = fuzzy_search('Andi Wier')
+        self.assertEqual(result['suggestions'][0], 'Andy Weir')
+        self.assertEqual(result['authors'][0]['label'], 'Andy Weir')
+        self.assertIn('Project Hail Mary', [material.title for material in fuzzy_search('projet hial mary')['materials']])
+        for query in ['Andi Wier', 'projet hial mary', 'kalo dormi', 'xyzzy']:
+            self.assertLess(self.median_duration(fuzzy_search, query), self.fuzzy_budget, query)
@@ -4,9 +4,13 @@ from .views import (
     AuthorListView,
     AuthorDetailView,
     ReadingMaterialsListView,
+    CategoryBrowseView,
     ReadingMaterialsDetailView,
     ReviewCreateView,
     borrow_material,
+    deliver_file,
+    reading_progress,
+    material_reviews,
     )
 
 app_name='library'
@@ -15,8 +19,13 @@ urlpatterns = [
     path('', MainPage.as_view(), name='main_page'),
     path('materials/', ReadingMaterialsListView.as_view(), name='reading_materials'),
     path('materials/<int:pk>/', ReadingMaterialsDetailView.as_view(), name='reading_material_detail'),
+    path('categories/', CategoryBrowseView.as_view(), name='category_browse'),
+    path('categories/<int:pk>/', CategoryBrowseView.as_view(), name='category_detail'),
     path('authors/', AuthorListView.as_view(), name='author_list'),
     path('author/<int:pk>/', AuthorDetailView.as_view(), name='author_details'),
     path('materials/<int:pk>/review/', ReviewCreateView.as_view(), name='create_review'),
-    path('materials/<int:material_id>/borrow/', borrow_material, name='borrow_material')
+    path('materials/<int:pk>/reviews/', material_reviews, name='material_reviews'),
+    path('materials/<int:material_id>/borrow/', borrow_material, name='borrow_material'),
+    path('files/<str:token>/', deliver_file, name='deliver_file'),
+    path('materials/<int:material_id>/progress/', reading_progress, name='reading_progress'),
 ]
\ No newline at end of file
@@ -1,16 +1,43 @@
+import mimetypes
+import os
+import time
+from django.conf import settings
+from django.http import Http404, HttpResponse, JsonResponse
 from django.shortcuts import render, get_object_or_404, redirect
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
+from django.utils.cache import patch_cache_control
 from django.utils.decorators import method_decorator
 from django.utils.translation import get_language
 from django.db.models import Q
+from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.views.decorators.http import condition, require_http_methods, require_POST
 from django.views.generic import TemplateView, ListView, DetailView, CreateView, UpdateView, DeleteView
+from readira.assets import ranged_file_response
+from readira.storage import digital_storage
 from user_account.forms import ReviewForm
-from .models import Author, ReadingMaterials, Review, Rating
+from .cache import anonymous_page_cache
+from .cards import CardList
+from .conditional import author_etag, author_last_modified, material_etag, material_last_modified
+from .delivery import delivery_url, read_token
+from .facets import facet_groups, facet_results, selection_from_query
+from .loans import LoanRefused, borrow, has_open_loan
+from .models import Author, AuthorGenre, Category, Loan, ReadingMaterials, Review
+from .objcache import author_cache, material_cache
+from .pagination import paginate_by_cursor
+from .progress import end_reading_session, get_progress, record_progress
+from .ratings import get_user_rating, submit_rating
+from .refdata import categories, genres
+from .search import cached_search, suggest
+from .searchstats import record_search
 
 
+REVIEWS_PER_PAGE = 10
 
+
+
+@method_decorator(anonymous_page_cache, name='dispatch')
 class MainPage(TemplateView):
     """
     Represents the main landing page of the library.
@@ -20,6 +47,7 @@ class MainPage(TemplateView):
     template_name = 'library/main_page.html'
 
 
+@method_decorator(anonymous_page_cache, name='dispatch')
 class ReadingMaterialsListView(ListView):
     """
     Displays a paginated list of reading materials such as books, articles, etc.
@@ -30,7 +58,9 @@ class ReadingMaterialsListView(ListView):
         paginate_by (int): Number of items to display per page.
         ordering (list): The ordering of the results (based on title).
     Methods:
-        get_context_data(): Adds additional context to the reading materials list view, such as the user's subscription status.
+        get_queryset(): Returns the cards of the materials matching the facet values selected in the query string (e.g. ?genre=1&price=5-10).
+        get_context_data(): Adds additional context to the reading materials list view, such as the user's subscription status
+                            and the facets with their counts.
                             Args:
                                 **kwargs: Arbitrary keyword arguments passed to the method.
                             Returns:
@@ -42,28 +72,84 @@ class ReadingMaterialsListView(ListView):
     paginate_by = 20
     ordering = ['title']
 
+    def get_queryset(self):
+        self.selection = selection_from_query(self.request.GET)
+        return facet_results(self.selection, ReadingMaterials.objects.all())
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         user = self.request.user
         context['has_subscription'] = user.is_authenticated and user.has_active_subscription
+        context['facets'] = facet_groups(self.selection)
+        query = self.request.GET.copy()
+        query.pop('page', None)
+        context['page_query'] = f'{query.urlencode()}&' if query else ''
         return context 
 
 
+@method_decorator(anonymous_page_cache, name='dispatch')
+class CategoryBrowseView(ListView):
+    """
+    Displays every reading material of a category and of all its subcategories, next to the subcategories
+    and their material counts. Without a category, the top-level categories and the whole catalog are shown.
+    The subtree is selected with one prefix query on the indexed materialized path, whatever its depth.
+    Attributes:
+        template_name (str): The template for rendering the category.
+        context_object_name (str): The context name used to access the list in the template.
+        paginate_by (int): Number of items to display per page.
+    Methods:
+        get_queryset(): Returns the cards of the materials of the category subtree, ordered by title.
+        get_context_data(): Adds the category, its ancestors for the breadcrumbs, its children with their material counts
+                            and the user's subscription status.
+    """
+    template_name = 'reading_materials/category.html'
+    context_object_name = 'materials'
+    paginate_by = 20
+
+    def get_queryset(self):
+        self.category = None
+        queryset = ReadingMaterials.objects.order_by('title', 'pk')
+        if 'pk' in self.kwargs:
+            self.category = get_object_or_404(Category, pk=self.kwargs['pk'])
+            queryset = queryset.filter(category_id__in=self.category.descendants().values('pk'))
+        return CardList(queryset)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        category = self.category
+        if category is None:
+            context['ancestors'] = []
+            context['children'] = Category.objects.filter(parent__isnull=True).order_by('name')
+        else:
+            context['ancestors'] = Category.objects.filter(pk__in=category.ancestor_ids()[:-1]).order_by('depth')
+            context['children'] = category.children.order_by('name')
+        context['category'] = category
+        context['empty_message'] = 'No reading materials in this category yet.'
+        user = self.request.user
+        context['has_subscription'] = user.is_authenticated and user.has_active_subscription
+        return context
+
+
+@method_decorator(condition(etag_func=material_etag, last_modified_func=material_last_modified), name='get')
 class ReadingMaterialsDetailView(DetailView):
     """
     Displays detailed information about a specific reading material. 
     Allows users to submit ratings for the material.
+    GET requests carrying a matching If-None-Match/If-Modified-Since are answered with 304
+    before the material is loaded or the template is rendered.
     Attributes:
         model (class): The model to be used for fetching the object (ReadingMaterials).
         template_name (str): The template for rendering the material details.
         context_object_name (str): The context name used to access the material in the template.
     Methods:
-        get_context_data(): Adds additional context to the material detail view, such as user ratings and subscription status.
+        get_context_data(): Adds additional context to the material detail view, such as user ratings, subscription status
+                            and the first page of reviews (newest first, review authors loaded in the same query).
                             Args:
                                 **kwargs: Arbitrary keyword arguments passed to the method.
                             Returns:
                                 dict: Context data for rendering the template.
-        post(): Handles rating submissions directly from the details page.
+        post(): Handles rating submissions directly from the details page, as a single-statement upsert
+                or through the rating write-behind buffer (see library.ratings).
                 Args:
                     request: The HTTP request object containing the rating data.
                 Returns:
@@ -73,6 +159,9 @@ class ReadingMaterialsDetailView(DetailView):
     template_name = 'reading_materials/details.html'
     context_object_name = 'material'
 
+    def get_object(self, queryset=None):
+        return material_cache.get_or_404(self.kwargs['pk'])
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         user = self.request.user
@@ -80,11 +169,13 @@ class ReadingMaterialsDetailView(DetailView):
         context['has_subscription'] = user.is_authenticated and user.has_active_subscription
 
         if user.is_authenticated:
-            rating = Rating.objects.filter(user=user, book=material).first()
-            context['user_rating'] = rating.value if rating else 0
+            context['user_rating'] = get_user_rating(material.pk, user.pk)
         else:
             context['user_rating'] = 0
 
+        context['reviews'] = paginate_by_cursor(review_queryset(material), None, REVIEWS_PER_PAGE)
+        context['genre'] = genres.get(material.genre_id)
+        context['category'] = categories.get(material.category_id)
         return context
 
     def post(self, request, *args, **kwargs):
@@ -98,16 +189,13 @@ class ReadingMaterialsDetailView(DetailView):
             score = int(score)
             if 1 <= score <= 5:
                 # Create or update user rating
-                Rating.objects.update_or_create(
-                    user=request.user,
-                    book=self.object,
-                    defaults={'value': score}
-                )
+                submit_rating(self.object.pk, request.user.pk, score)
 
         return redirect('library:reading_material_detail', pk=self.object.pk)
 
 
 
+@method_decorator(anonymous_page_cache, name='dispatch')
 class AuthorListView(ListView):
     """
     Displays a paginated list of authors in the library database.
@@ -116,18 +204,44 @@ class AuthorListView(ListView):
         template_name (str): The template for rendering the author list.
         context_object_name (str): The context name used to access the list of authors in the template.
         paginate_by (int): Number of items to display per page.
-        ordering (list): The ordering of the results (based on author's name).
+    Methods:
+        get_queryset(): Returns the authors, sorted by name or, with ?sort=books, by number of books,
+                        and with ?genre=<id> only those who wrote in the genre. Both are served by indexes
+                        on the stored author statistics.
+        get_context_data(): Adds the genres, the selected genre and sort, and the query string of the pagination links.
     """
     model = Author
     template_name = 'authors/list.html'
     context_object_name = 'authors'
     paginate_by = 20
-    ordering = ['name']
 
+    def get_queryset(self):
+        self.sort = 'books' if self.request.GET.get('sort') == 'books' else 'name'
+        self.genre = self.request.GET.get('genre', '')
+        queryset = Author.objects.all()
+        if self.genre.isdigit():
+            queryset = queryset.filter(genres=self.genre)
+        if self.sort == 'books':
+            return queryset.order_by('-book_count', 'display_name', 'pk')
+        return queryset.order_by('display_name', 'pk')
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['genres'] = genres.all()
+        context['selected_genre'] = self.genre
+        context['sort'] = self.sort
+        query = self.request.GET.copy()
+        query.pop('page', None)
+        context['page_query'] = f'{query.urlencode()}&' if query else ''
+        return context
+
+
+@method_decorator(condition(etag_func=author_etag, last_modified_func=author_last_modified), name='get')
 class AuthorDetailView(LoginRequiredMixin, DetailView):
     """
-    Displays detailed information about a specific author, including their works
+    Displays detailed information about a specific author, including their works and their stored book count and genres.
+    GET requests carrying a matching If-None-Match/If-Modified-Since are answered with 304
+    before the author is loaded or the template is rendered.
     Attributes:
         model (class): The model to be used for fetching the object (Author).
         template_name (str): The template for rendering the author detail.
@@ -140,10 +254,20 @@ class AuthorDetailView(LoginRequiredMixin, DetailView):
                         **kwargs: Arbitrary keyword arguments.
                     Returns:
                         HttpResponseRedirect: A redirect to the login page if not authenticated.
+        get_context_data(): Adds the genres of the author, from their stored genre set, most written first.
     """
     model = Author
     template_name = 'authors/details.html'
     context_object_name = 'author'
+
+    def get_object(self, queryset=None):
+        return author_cache.get_or_404(self.kwargs['pk'])
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        genre_ids = AuthorGenre.objects.filter(author=self.object).order_by('-book_count').values_list('genre_id', flat=True)
+        context['author_genres'] = [genre for genre in map(genres.get, genre_ids) if genre is not None]
+        return context
     
     def dispatch(self, request, *args, **kwargs):
         if not request.user.is_authenticated:
@@ -175,54 +299,174 @@ class ReviewCreateView(LoginRequiredMixin, CreateView):
 
     def form_valid(self, form):
         form.instance.user = self.request.user
-        form.instance.book = get_object_or_404(ReadingMaterials, pk=self.kwargs['pk'])
+        form.instance.book = material_cache.get_or_404(self.kwargs['pk'])
         return super().form_valid(form)
 
     def get_success_url(self):
         return reverse_lazy('library:reading_material_detail', kwargs = {'pk': self.kwargs['pk']})  
 
 
+def review_queryset(material):
+    """
+    Returns the reviews of a reading material together with their authors, limited to the columns the review cards display.
+    """
+    return Review.objects.filter(book=material).select_related('user').only('title', 'content', 'user__full_name')
+
+
+def material_reviews(request, pk):
+    """
+    Returns an older page of reviews of a reading material as an HTML fragment,
+    loaded by the 'Load older reviews' button of the details page.
+    Args:
+        request: The HTTP request object; the 'before' query parameter is the cursor returned by the previous page.
+        pk (int): The ID of the reading material.
+    Returns:
+        Rendered reviews fragment.
+    """
+    reviews = paginate_by_cursor(review_queryset(pk), request.GET.get('before'), REVIEWS_PER_PAGE)
+    return render(request, 'reading_materials/_reviews.html', {'reviews': reviews, 'material_id': pk})
+
+
 def search_view(request):
     """
     Handles the search functionality for books and authors. 
+    Matching is word by word, accent- and case-insensitive ('stefan' finds 'Ștefan'), on the search term index.
+    When nothing matches, close matches found on the trigram index are shown with 'did you mean' suggestions.
+    Results are cached per normalized query, and each search is counted in the buffered search statistics.
+    The page itself is not cached, so that every search, anonymous ones included, is counted.
     Args:
         request: The HTTP request object containing the search query.
     Returns:
         Rendered search results page with books and authors based on the query.
     """
     query = request.GET.get('q', '')
-    results_books = []
-    results_authors = []
+    result = {'materials': [], 'authors': [], 'suggestions': [], 'fuzzy': False}
 
     if query:
-        results_books = ReadingMaterials.objects.filter(title__icontains=query)
-        results_authors = Author.objects.filter(name__icontains=query) | Author.objects.filter(surname__icontains=query)
+        start = time.perf_counter()
+        result = cached_search(query)
+        record_search(query, bool(result['materials'] or result['authors']), time.perf_counter() - start)
 
     return render(request, 'library/search.html', {
         'query': query,
-        'results_books': results_books,
-        'results_authors': results_authors,
+        'results_books': result['materials'],
+        'results_authors': result['authors'],
+        'did_you_mean': result['suggestions'],
+        'fuzzy': result['fuzzy'],
         'LANGUAGE_CODE': get_language()
     })
 
 
+def search_suggestions(request):
+    """
+    Autocomplete for the search box: titles and author names matching the typed words, as JSON.
+    Args:
+        request: The HTTP request; 'q' is the typed text.
+    Returns:
+        JsonResponse: {'suggestions': [{'label', 'url'}]}.
+    """
+    suggestions = [
+        {
+            'label': item['label'],
+            'url': reverse('library:reading_material_detail' if item['kind'] == 'material' else 'library:author_details', args=[item['pk']]),
+        }
+        for item in suggest(request.GET.get('q', ''))
+    ]
+    response = JsonResponse({'suggestions': suggestions})
+    patch_cache_control(response, public=True, max_age=settings.PAGE_CACHE_MAX_AGE)
+    return response
+
+
+@require_POST
 @login_required
 def borrow_material(request, material_id):
     """
-    Allows a user to borrow a specific reading material, provided they have an active subscription.
+    Borrows a specific reading material for the user, provided their subscription allows another loan
+    and a copy is available.
     Args:
         request: The HTTP request object.
         material_id (int): The ID of the reading material to be borrowed.
     Returns:
-        Rendered borrow success page if the user has an active subscription, else redirects to the subscriptions page.
+        Rendered borrow success page with a signed download link if the loan was opened, else redirects to the subscriptions page
+        or to the loans page with the reason of the refusal.
     """
-    user = request.user
-    from django.utils.timezone import now
-    if not user.has_active_subscription:
-        return redirect('user_account:subscriptions')
-    material = get_object_or_404(ReadingMaterials, pk=material_id)
-    return render(request, 'user_account/borrow_success.html', {'material': material})
+    material = material_cache.get_or_404(material_id)
+    try:
+        loan = borrow(request.user, material.pk)
+    except LoanRefused as exc:
+        if exc.reason == LoanRefused.NO_SUBSCRIPTION:
+            return redirect('user_account:subscriptions')
+        messages.error(request, str(exc))
+        return redirect('user_account:loans')
+    return render(request, 'user_account/borrow_success.html', {
+        'material': material,
+        'loan': loan,
+        'download_url': delivery_url(loan, material),
+    })
 
 
+def deliver_file(request, token):
+    """
+    Streams a digital file addressed by a signed delivery token, honoring HTTP byte ranges so readers can resume and seek.
+    The token is only honored for the signed-in borrower it was issued to and while its loan is open, checked with one
+    primary key lookup per request. With DELIVERY_ACCEL_REDIRECT set, the transfer is handed to the reverse proxy
+    instead of being streamed by the app worker.
+    Args:
+        request (HttpRequest): The current request.
+        token (str): The signed token issued by delivery_url().
+    Returns:
+        HttpResponse: The file (or range) response, or an X-Accel-Redirect response.
+    Raises:
+        Http404: If the token is invalid, was issued to another user, or its loan was returned.
+    """
+    name, user_id, loan_id = read_token(token)
+    if user_id != request.user.pk or not Loan.objects.filter(pk=loan_id, user_id=user_id, returned_at__isnull=True).exists():
+        raise Http404('Invalid or expired link.')
+    storage = digital_storage()
+    filename = os.path.basename(name)
+    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+    if settings.DELIVERY_ACCEL_REDIRECT:
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = settings.DELIVERY_ACCEL_REDIRECT.rstrip('/') + '/' + name
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    else:
+        if not storage.exists(name):
+            raise Http404('File not found.')
+        response = ranged_file_response(request, storage.path(name), content_type, filename=filename)
+    response['Cache-Control'] = f'private, max-age={settings.DELIVERY_URL_MAX_AGE}'
+    return response
 
 
+@login_required
+@require_http_methods(['GET', 'POST'])
+def reading_progress(request, material_id):
+    """
+    Reading progress API of the online reader, open to users holding the material on loan.
+    GET returns the reader's latest position. POST reports a position heartbeat with the 'position' and 'fraction'
+    fields; heartbeats are buffered and written in batches, and adding 'end=1' ends the reading session,
+    writing the buffered positions right away.
+    Args:
+        request (HttpRequest): The HTTP request.
+        material_id (int): The ID of the reading material.
+    Returns:
+        JsonResponse: The latest position on GET, an empty 204 response on POST, 400 for invalid input,
+        or 403 without an open loan.
+    """
+    if not has_open_loan(request.user.pk, material_id):
+        return JsonResponse({'error': 'Borrow this reading material to read it.'}, status=403)
+    if request.method == 'GET':
+        position, fraction = get_progress(request.user.pk, material_id)
+        return JsonResponse({'position': position, 'fraction': fraction})
+
+    position = request.POST.get('position', '')
+    try:
+        fraction = float(request.POST.get('fraction', 0))
+    except ValueError:
+        fraction = -1
+    if len(position) > 255 or not 0 <= fraction <= 1:
+        return JsonResponse({'error': 'Invalid position.'}, status=400)
+    record_progress(request.user.pk, material_id, position, fraction)
+    if request.POST.get('end'):
+        end_reading_session(request.user.pk, material_id)
+    return HttpResponse(status=204)
@@ -0,0 +1,144 @@
+import mimetypes
+import os
+import re
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.urls import re_path
+from django.utils._os import safe_join
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+
+HASHED_NAME_RE = re.compile(r'\.[0-9a-f]{12}\.[^./]+$')
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+CHUNK_SIZE = 64 * 1024
+
+
+
+def parse_range(header, size):
+    """
+    Parses a single-range 'Range: bytes=...' header.
+    Args:
+        header (str or None): The value of the Range header.
+        size (int): The size of the file in bytes.
+    Returns:
+        tuple or None: The inclusive (start, end) byte positions, None when the header is absent or
+                       not a single byte range (the whole file is served), or () when the range cannot be satisfied.
+    """
+    match = RANGE_RE.match(header or '')
+    if not match:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        length = int(end)
+        if length == 0:
+            return ()
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        return ()
+    return start, end
+
+
+def _read_range(f, start, length):
+    with f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def ranged_file_response(request, path, content_type=None, filename=None):
+    """
+    Streams a file from disk, honoring a single HTTP byte range so clients can resume and seek.
+    Args:
+        request (HttpRequest): The current request.
+        path (str): Absolute path of the file.
+        content_type (str, optional): The response content type, guessed from the file name if omitted.
+        filename (str, optional): When given, the file is sent as an attachment with this name.
+    Returns:
+        HttpResponse: 200 with the whole file, 206 with the requested range, or 416 if the range cannot be satisfied.
+    """
+    size = os.path.getsize(path)
+    content_type = content_type or mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    byte_range = parse_range(request.META.get('HTTP_RANGE'), size)
+
+    if byte_range == ():
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+    elif byte_range is None:
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(_read_range(open(path, 'rb'), start, end - start + 1), status=206, content_type=content_type)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = end - start + 1
+
+    if filename:
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def serve_asset(request, path, document_root):
+    """
+    Serves a static or media file.
+    Content-hashed names are sent with one-year immutable caching, other files are revalidated with Last-Modified.
+    When the client accepts it and no byte range is requested, the precompressed brotli or gzip sibling is sent instead.
+    Args:
+        request (HttpRequest): The current request.
+        path (str): The file path relative to the document root.
+        document_root (str): The folder the files are served from.
+    Returns:
+        HttpResponse: The file response.
+    """
+    try:
+        fullpath = safe_join(document_root, path)
+    except Exception:
+        raise Http404('Invalid path.')
+    if not os.path.isfile(fullpath):
+        raise Http404('File not found.')
+
+    mtime = os.stat(fullpath).st_mtime
+    immutable = bool(HASHED_NAME_RE.search(path))
+    if not immutable and not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'), mtime):
+        return HttpResponseNotModified()
+
+    content_type = mimetypes.guess_type(fullpath)[0] or 'application/octet-stream'
+    served, encoding = fullpath, None
+    if 'HTTP_RANGE' not in request.META:
+        accepted = {part.split(';')[0].strip() for part in request.META.get('HTTP_ACCEPT_ENCODING', '').split(',')}
+        for name, suffix in ENCODINGS:
+            if name in accepted and os.path.isfile(fullpath + suffix):
+                served, encoding = fullpath + suffix, name
+                break
+
+    response = ranged_file_response(request, served, content_type)
+    if encoding:
+        response['Content-Encoding'] = encoding
+    patch_vary_headers(response, ('Accept-Encoding',))
+    response['Last-Modified'] = http_date(mtime)
+    response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL if immutable else 'no-cache'
+    return response
+
+
+def asset_urlpatterns(prefix, document_root):
+    """
+    Returns the URL pattern serving the files of `document_root` under `prefix` through serve_asset().
+    Args:
+        prefix (str): The URL prefix, e.g. settings.MEDIA_URL.
+        document_root (str): The folder the files are served from.
+    Returns:
+        list: A single-item URL pattern list.
+    """
+    return [
+        re_path(r'^%s(?P<path>.*)$' % re.escape(prefix.lstrip('/')), serve_asset, {'document_root': document_root}),
+    ]
@@ -54,6 +54,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'admin_backend.middleware.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -86,9 +87,52 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Take SQLite's write lock when a transaction starts instead of upgrading a read lock later,
+        # so concurrent writers queue up (for up to 'timeout' seconds) instead of failing with 'database is locked'.
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
+        # A file-based test database, so concurrency tests can use several connections.
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
+    }
+}
+
+# Tests tagged 'slow' (the search latency benchmarks) only run when asked for: manage.py test --tag slow
+TEST_RUNNER = 'readira.test_runner.TestRunner'
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Point this to a shared backend (Redis, Memcached) when running several worker processes,
+# so that cache purges reach every process.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'readira',
     }
 }
 
+# Anonymous full-page cache: server-side lifetime and the max-age advertised to reverse proxies.
+PAGE_CACHE_TIMEOUT = 60 * 10
+PAGE_CACHE_MAX_AGE = 60
+# Categories, genres and subscription plans are cached in every process; each process checks at most
+# every REFERENCE_CACHE_CHECK_INTERVAL seconds whether another one changed them.
+REFERENCE_CACHE_CHECK_INTERVAL = 5
+# Reading materials and authors looked up by primary key are cached for OBJECT_CACHE_TIMEOUT seconds in the shared
+# cache, and in an LRU of OBJECT_CACHE_LOCAL_SIZE objects per process, where other processes' changes show up
+# within OBJECT_CACHE_LOCAL_TTL seconds.
+OBJECT_CACHE_TIMEOUT = 60 * 5
+OBJECT_CACHE_LOCAL_SIZE = 1000
+OBJECT_CACHE_LOCAL_TTL = 5
+# Rating changes patch the facet index of every process in place through a change log kept in the shared cache
+# for FACET_RATING_LOG_TIMEOUT seconds; a process more than FACET_RATING_LOG_SIZE changes behind rebuilds its index.
+FACET_RATING_LOG_SIZE = 1000
+FACET_RATING_LOG_TIMEOUT = 60 * 60
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -138,6 +182,33 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Static files get content-hashed names and gzip/brotli siblings at collectstatic time,
+# uploads are stored under content-hashed names. Both are served by readira.assets.serve_asset
+# with immutable caching and byte range support; set SERVE_ASSETS to False when a reverse proxy serves them.
+STORAGES = {
+    # Uploaded images are resized and optimized by the process_image job instead of during the upload request.
+    'default': {
+        'BACKEND': 'readira.storage.HashedMediaStorage',
+        'OPTIONS': {'optimize_images': False},
+    },
+    'staticfiles': {
+        'BACKEND': 'readira.storage.CompressedManifestStaticFilesStorage',
+    },
+    # E-book and audiobook files live outside MEDIA_ROOT, so they are only reachable through signed delivery URLs.
+    'digital': {
+        'BACKEND': 'readira.storage.HashedMediaStorage',
+        'OPTIONS': {'location': BASE_DIR / 'digital', 'base_url': None, 'optimize_images': False},
+    },
+}
+SERVE_ASSETS = True
+
+# Digital delivery
+# Signed delivery URLs are valid for DELIVERY_URL_MAX_AGE seconds. When DELIVERY_ACCEL_REDIRECT is set
+# (e.g. '/protected-digital/', an internal nginx location aliasing the digital storage folder),
+# the file transfer is handed to the reverse proxy with an X-Accel-Redirect header.
+DELIVERY_URL_MAX_AGE = 15 * 60
+DELIVERY_ACCEL_REDIRECT = None
+
 LOCALE_PATHS = [BASE_DIR/'locale']
 
 # Default primary key field type
@@ -173,4 +244,107 @@ LOGGING = {
 AUTH_USER_MODEL = 'user_account.CustomUser'
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'index'
-LOGOUT_REDIRECT_URL = 'login'
\ No newline at end of file
+LOGOUT_REDIRECT_URL = 'login'
+
+# Request profiling
+# Staff can profile a request with the X-Profile header or the ?_profile query flag.
+# PROFILING_SAMPLE_RATE = N additionally profiles one random request out of N (0 disables it).
+PROFILING_DIR = BASE_DIR / 'profiles'
+PROFILING_MAX_PROFILES = 50
+PROFILING_INTERVAL = 0.005
+PROFILING_SAMPLE_RATE = 0
+PROFILING_HEADER = 'HTTP_X_PROFILE'
+PROFILING_QUERY_PARAM = '_profile'
+
+
+# Ratings
+# With RATING_BUFFER_ENABLED, ratings are coalesced per (book, user) in memory and written in batches
+# of up to RATING_BUFFER_SIZE, at most RATING_FLUSH_INTERVAL seconds after they were submitted.
+RATING_BUFFER_ENABLED = False
+RATING_BUFFER_SIZE = 500
+RATING_FLUSH_INTERVAL = 2.0
+
+
+# Reading progress
+# Position heartbeats are coalesced per (user, material) in memory and upserted in batches of up to
+# PROGRESS_BUFFER_SIZE, at most PROGRESS_FLUSH_INTERVAL seconds after they were reported.
+PROGRESS_BUFFER_SIZE = 1000
+PROGRESS_FLUSH_INTERVAL = 5.0
+
+
+# Inventory
+# Copies added to a cart are held for CART_RESERVATION_MINUTES; the release_reservations command
+# gives expired reservations back to stock, RESERVATION_SWEEP_BATCH rows at a time.
+CART_RESERVATION_MINUTES = 15
+RESERVATION_SWEEP_BATCH = 500
+# Checkout claims keep a repeated submit of a paid cart from paying twice; the expire_checkout_claims command
+# deletes those older than CHECKOUT_CLAIM_DAYS, CHECKOUT_CLAIM_SWEEP_BATCH rows at a time.
+CHECKOUT_CLAIM_DAYS = 7
+CHECKOUT_CLAIM_SWEEP_BATCH = 1000
+
+
+# Subscriptions
+# Number of subscriptions renewed or expired per transaction by the expire_subscriptions command.
+SUBSCRIPTION_SWEEP_BATCH = 500
+
+
+# Loans
+# Loans last LOAN_DAYS; the expire_loans command closes overdue loans, LOAN_SWEEP_BATCH rows at a time.
+LOAN_DAYS = 14
+LOAN_SWEEP_BATCH = 500
+
+
+# Notifications
+# Events are recorded in the outbox inside the transaction of the change they announce; the run_outbox_worker
+# command sends them, OUTBOX_BATCH_SIZE at a time. A failed event is retried after OUTBOX_RETRY_DELAY seconds,
+# doubling up to OUTBOX_MAX_RETRY_DELAY, and given up after OUTBOX_MAX_ATTEMPTS attempts. A worker holds a batch
+# for OUTBOX_LEASE_SECONDS; if it dies, another one picks the batch up after that.
+EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
+EMAIL_FILE_PATH = BASE_DIR / 'sent_emails'
+DEFAULT_FROM_EMAIL = 'Readira <no-reply@readira.local>'
+OUTBOX_BATCH_SIZE = 100
+OUTBOX_POLL_INTERVAL = 2.0
+OUTBOX_RETRY_DELAY = 30
+OUTBOX_MAX_RETRY_DELAY = 3600
+OUTBOX_MAX_ATTEMPTS = 8
+OUTBOX_LEASE_SECONDS = 300
+
+
+# Background jobs
+# The run_jobs worker claims up to JOB_BATCH_SIZE due jobs at a time, holds them for JOB_LEASE_SECONDS and runs them
+# in a pool of JOB_WORKERS threads (or processes). A failed job is retried after JOB_RETRY_DELAY seconds, doubling
+# up to JOB_MAX_RETRY_DELAY, and marked failed after JOB_MAX_ATTEMPTS runs.
+JOB_BATCH_SIZE = 20
+JOB_WORKERS = 4
+JOB_POLL_INTERVAL = 1.0
+JOB_LEASE_SECONDS = 600
+JOB_RETRY_DELAY = 10
+JOB_MAX_RETRY_DELAY = 3600
+JOB_MAX_ATTEMPTS = 5
+# Uploaded covers and author portraits are scaled down to fit IMAGE_MAX_SIZE.
+IMAGE_MAX_SIZE = (800, 1200)
+# Catalog edits queue a cache warm-up CACHE_WARM_DELAY seconds later, loading the CACHE_WARM_SIZE first materials
+# of the catalog into the object cache.
+CACHE_WARM_DELAY = 10
+CACHE_WARM_SIZE = 100
+
+
+# Search
+# Titles and author names are matched word by word on a normalized (accent- and case-insensitive) term index.
+# Query words of at least SEARCH_MIN_PREFIX characters match the words they start; shorter ones, which would start
+# a large share of the catalog's words, only match whole words.
+SEARCH_MIN_PREFIX = 3
+SEARCH_RESULTS_LIMIT = 60
+SEARCH_SUGGESTIONS_LIMIT = 8
+# Queries without matches fall back to trigram similarity: the SEARCH_FUZZY_CANDIDATES titles or names sharing the
+# most trigrams with the query are ranked, those at least SEARCH_FUZZY_THRESHOLD similar are shown, and the
+# SEARCH_FUZZY_SUGGESTIONS best are offered as 'did you mean' queries.
+SEARCH_FUZZY_THRESHOLD = 0.2
+SEARCH_FUZZY_CANDIDATES = 50
+SEARCH_FUZZY_SUGGESTIONS = 3
+# Search results are cached per normalized query for SEARCH_CACHE_TIMEOUT seconds, or until the catalog changes.
+SEARCH_CACHE_TIMEOUT = 300
+# Searches are counted per normalized query in memory and added to the search statistics in batches
+# of up to SEARCH_STATS_BUFFER_SIZE queries, at most SEARCH_STATS_FLUSH_INTERVAL seconds after they ran.
+SEARCH_STATS_BUFFER_SIZE = 500
+SEARCH_STATS_FLUSH_INTERVAL = 10.0
@@ -0,0 +1,188 @@
+import gzip
+import hashlib
+import io
+import os
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, storages
+from PIL import Image, UnidentifiedImageError
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.mjs', '.map', '.svg', '.html', '.txt', '.json', '.xml', '.csv', '.ico'}
+OPTIMIZABLE_IMAGE_FORMATS = {'JPEG': {'optimize': True, 'quality': 'keep'}, 'PNG': {'optimize': True}}
+
+
+
+def digital_storage():
+    """
+    Returns the private storage of e-book and audiobook files. Used as a callable so migrations do not embed its location.
+    """
+    return storages['digital']
+
+
+def is_compressible(name):
+    return os.path.splitext(name)[1].lower() in COMPRESSIBLE_EXTENSIONS
+
+
+def write_compressed_siblings(path):
+    """
+    Writes '<path>.gz' and, when the optional brotli package is installed, '<path>.br' next to a file.
+    A sibling is only kept if it is meaningfully smaller than the original.
+    Args:
+        path (str): Absolute path of the file to compress.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    variants = [('.gz', lambda d: gzip.compress(d, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append(('.br', lambda d: brotli.compress(d, quality=11)))
+    for suffix, compress in variants:
+        compressed = compress(data)
+        if len(compressed) < len(data) * 0.95:
+            with open(path + suffix, 'wb') as f:
+                f.write(compressed)
+
+
+def optimize_image(content):
+    """
+    Re-encodes a JPEG or PNG losslessly with the encoder's optimizer turned on.
+    Args:
+        content (File): The uploaded image.
+    Returns:
+        File: The optimized image, or the original content if it is not an image or did not get smaller.
+    """
+    try:
+        content.seek(0)
+        image = Image.open(content)
+        options = OPTIMIZABLE_IMAGE_FORMATS.get(image.format)
+        if options is None:
+            return content
+        buffer = io.BytesIO()
+        image.save(buffer, format=image.format, icc_profile=image.info.get('icc_profile'), **options)
+    except (UnidentifiedImageError, OSError, ValueError):
+        return content
+    finally:
+        content.seek(0)
+    if buffer.tell() >= content.size:
+        return content
+    return ContentFile(buffer.getvalue(), name=content.name)
+
+
+def resize_image(content, max_size):
+    """
+    Scales a JPEG or PNG down to fit in max_size, keeping its aspect ratio, and re-encodes it with the optimizer on.
+    Images already small enough are only optimized losslessly.
+    Args:
+        content (File): The image.
+        max_size (tuple): The (width, height) box the image must fit in.
+    Returns:
+        File: The processed image, or the original content if it is not an image or could not be made smaller.
+    """
+    try:
+        content.seek(0)
+        image = Image.open(content)
+        if image.format not in OPTIMIZABLE_IMAGE_FORMATS:
+            return content
+        if image.width <= max_size[0] and image.height <= max_size[1]:
+            return optimize_image(content)
+        image_format, icc_profile = image.format, image.info.get('icc_profile')
+        image.thumbnail(max_size, Image.Resampling.LANCZOS)
+        options = {'optimize': True, 'quality': 85} if image_format == 'JPEG' else {'optimize': True}
+        buffer = io.BytesIO()
+        image.save(buffer, format=image_format, icc_profile=icc_profile, **options)
+    except (UnidentifiedImageError, OSError, ValueError):
+        return content
+    finally:
+        content.seek(0)
+    return ContentFile(buffer.getvalue(), name=content.name)
+
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Static files storage writing content-hashed file names (through ManifestStaticFilesStorage)
+    plus precompressed gzip/brotli siblings at collectstatic time.
+    Methods:
+        - post_process(): Hashes the collected files, then writes the compressed siblings of the hashed copies.
+        - stored_name(): Falls back to the unhashed name when the manifest has no entry for a file,
+                        so a missing collectstatic run does not break page rendering.
+    """
+    def post_process(self, paths, dry_run=False, **options):
+        hashed_names = set()
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if hashed_name:
+                hashed_names.add(hashed_name)
+            yield name, hashed_name, processed
+
+        if not dry_run:
+            for hashed_name in hashed_names:
+                if is_compressible(hashed_name):
+                    write_compressed_siblings(self.path(hashed_name))
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            return name
+
+
+
+class HashedMediaStorage(FileSystemStorage):
+    """
+    Media storage saving uploads under content-hashed names ('cover.<hash>.jpg').
+    Hashed names never change content, so they can be cached forever, and identical uploads are stored once.
+    JPEG and PNG uploads are optimized losslessly before hashing, unless optimize_images is False (images are then
+    processed by a background job), and text-like uploads get precompressed siblings, so nothing has to be
+    compressed per request.
+    Attributes:
+        optimize_images (bool): Whether to optimize images while saving them.
+    Methods:
+        - save(): Optimizes, hashes and stores an upload, reusing an existing file with the same content.
+                Args:
+                    name (str): The requested file name.
+                    content (File): The uploaded content.
+                    max_length (int, optional): Maximum length of the resulting name.
+                Returns:
+                    str: The stored, hashed name.
+    """
+    def __init__(self, *args, optimize_images=True, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.optimize_images = optimize_images
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+
+        if self.optimize_images:
+            content = optimize_image(content)
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            return name
+
+        name = super().save(name, content, max_length=max_length)
+        if is_compressible(name):
+            write_compressed_siblings(self.path(name))
+        return name
+
+    def unhashed_name(self, name):
+        root, ext = os.path.splitext(name)
+        base, dot, digest = root.rpartition('.')
+        if dot and len(digest) == 12 and all(c in '0123456789abcdef' for c in digest):
+            return base + ext
+        return name
+
+    def hashed_name(self, name, content):
+        hasher = hashlib.sha256()
+        for chunk in content.chunks():
+            hasher.update(chunk)
+        content.seek(0)
+        root, ext = os.path.splitext(name)
+        return f'{root}.{hasher.hexdigest()[:12]}{ext}'
@@ -0,0 +1,12 @@
+from django.test.runner import DiscoverRunner
+
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Test runner leaving out the tests tagged 'slow' unless tags are selected with --tag.
+    """
+    def __init__(self, *args, tags=None, exclude_tags=None, **kwargs):
+        if not tags:
+            exclude_tags = {*(exclude_tags or ()), 'slow'}
+        super().__init__(*args, tags=tags, exclude_tags=exclude_tags, **kwargs)
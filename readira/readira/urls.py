@@ -19,10 +19,10 @@ from django.contrib.auth.views import LogoutView
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.i18n import i18n_patterns
-from django.conf.urls.static import static
 from django.views.i18n import set_language
 from django.http import HttpResponseRedirect
-from library.views import MainPage, search_view
+from library.views import MainPage, search_suggestions, search_view
+from .assets import asset_urlpatterns
 
 
 def redirect_to_user_language(request):
@@ -33,16 +33,17 @@ def redirect_to_user_language(request):
 urlpatterns = [
     path('', MainPage.as_view(), name='main_page'),
     path('set_language/', set_language, name = 'set_language'),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+]
+
+if settings.SERVE_ASSETS:
+    urlpatterns += asset_urlpatterns(settings.MEDIA_URL, settings.MEDIA_ROOT)
+    urlpatterns += asset_urlpatterns(settings.STATIC_URL, settings.STATIC_ROOT)
 
 urlpatterns +=i18n_patterns(
     path('admin/', admin.site.urls),
     path('library/', include('library.urls', namespace='library')),
     path('user/', include('user_account.urls', namespace='user_account')),
     path('search/', search_view, name='search'),
+    path('search/suggest/', search_suggestions, name='search_suggestions'),
     path('admin_backend/', include('admin_backend.urls', namespace='admin_backend')),
 )
-
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root= settings.MEDIA_ROOT)
-    urlpatterns += static(settings.STATIC_URL, document_root= settings.STATIC_ROOT)
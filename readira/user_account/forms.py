@@ -34,6 +34,18 @@ class RatingForm(forms.ModelForm):
         fields = ['value']
 
 
+class AddToCartForm(forms.Form):
+    """
+    Form for the number of copies added to the cart; one copy when the field is left out.
+    Fields:
+        - quantity: Positive number of copies.
+    """
+    quantity = forms.IntegerField(label=_('Quantity'), min_value=1, required=False)
+
+    def clean_quantity(self):
+        return self.cleaned_data['quantity'] or 1
+
+
 class CustomUserForm(forms.ModelForm):
     """
     Form for editing custom user profile information.
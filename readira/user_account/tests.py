@@ -1,3 +1,131 @@
-from django.test import TestCase
+from datetime import timedelta
+from django.test import Client, TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+from library.checkout import expire_checkout_claims
+from library.models import CartReservation, CheckoutClaim, Order, OrderLine, ReadingMaterials, Subscription, SubscriptionPlan
+from library.tests import run_concurrently
+from .models import CustomUser
 
-# Create your tests here.
+
+
+class CheckoutIdempotencyTests(TransactionTestCase):
+    """
+    Submits one cart many times at once, as an impatient user hammering the pay button would.
+    """
+    submits = 20
+    token = 'a' * 64
+    payment = {'cardholder_name': 'Jane Doe', 'card_number': '4' * 16, 'card_expiry': '12/39', 'card_cvv': '123'}
+
+    def setUp(self):
+        self.user = CustomUser.objects.create(email='buyer@example.com')
+        self.material = ReadingMaterials.objects.create(title='Popular title', price=10, stock=100)
+        client = Client()
+        client.force_login(self.user)
+        session = client.session
+        session['cart'] = {
+            str(self.material.pk): {'material_id': self.material.pk, 'title': 'Popular title', 'price': 10.0, 'quantity': 2, 'total': 20.0},
+        }
+        session['order_token'] = self.token
+        session.save()
+        self.cookies = client.cookies
+
+    def submit(self):
+        client = Client()
+        client.cookies = self.cookies
+        return client.post(reverse('user_account:checkout', args=[self.token]), self.payment)
+
+    def test_concurrent_submits_create_one_order(self):
+        responses = run_concurrently(self.submit, [()] * self.submits)
+
+        success = reverse('user_account:checkout_success')
+        self.assertTrue(all(response.status_code == 302 and response['Location'] == success for response in responses))
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(OrderLine.objects.get().quantity, 2)
+        self.assertEqual(CheckoutClaim.objects.get().order, Order.objects.get())
+        self.material.refresh_from_db()
+        self.assertEqual(self.material.stock, 98)
+
+    def test_retry_after_checkout_returns_original_result(self):
+        self.submit()
+
+        response = self.submit()
+
+        self.assertRedirects(response, reverse('user_account:checkout_success'), fetch_redirect_response=False)
+        self.assertEqual(Order.objects.count(), 1)
+
+
+
+class CheckoutClaimSweepTests(TestCase):
+    """
+    Checkout claims are kept CHECKOUT_CLAIM_DAYS, long enough to absorb repeated submits.
+    """
+    def test_sweep_deletes_only_old_claims(self):
+        user = CustomUser.objects.create(email='buyer@example.com')
+        now = timezone.now()
+        for i, age in enumerate([10, 8, 6, 0]):
+            CheckoutClaim.objects.create(user=user, token=f'{i}' * 64, created_at=now - timedelta(days=age))
+
+        with self.settings(CHECKOUT_CLAIM_DAYS=7):
+            self.assertEqual(expire_checkout_claims(batch_size=1, now=now), 2)
+
+        self.assertEqual(sorted(CheckoutClaim.objects.values_list('token', flat=True)), ['2' * 64, '3' * 64])
+
+
+
+class ProfileHistoryTests(TestCase):
+    """
+    The subscription history keeps its order across the pages loaded by the profile page.
+    """
+    def setUp(self):
+        self.user = CustomUser.objects.create(email='subscriber@example.com')
+        plan = SubscriptionPlan.objects.create(name='Reader', price=5, duration_days=30)
+        now = timezone.now()
+        # Shuffled start dates, shared by pairs of subscriptions, so the order is not the primary key order.
+        Subscription.objects.bulk_create([
+            Subscription(user=self.user, plan=plan, active=i % 4 == 0, start_date=now - timedelta(days=(i * 7) % 13), end_date=now)
+            for i in range(25)
+        ])
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_pages_follow_the_history_order(self):
+        response = self.client.get(reverse('user_account:profile'))
+        page = response.context['subscriptions']
+        seen = list(page)
+        while page.has_next:
+            page = self.client.get(reverse('user_account:profile_subscriptions'), {'before': page.next_cursor}).context['subscriptions']
+            seen.extend(page)
+
+        expected = list(Subscription.objects.filter(user=self.user).order_by('active', '-start_date', '-pk'))
+        self.assertEqual([sub.pk for sub in seen], [sub.pk for sub in expected])
+
+
+
+class AddToCartTests(TestCase):
+    """
+    Adding to the cart reserves copies, and only a positive number of them.
+    """
+    def setUp(self):
+        self.user = CustomUser.objects.create(email='buyer@example.com')
+        self.material = ReadingMaterials.objects.create(title='Popular title', price=10, stock=5)
+        self.client = Client()
+        self.client.force_login(self.user)
+        self.url = reverse('user_account:add_to_cart', args=[self.material.pk])
+
+    def test_quantity_below_one_is_rejected(self):
+        for quantity in ('0', '-2', 'many'):
+            response = self.client.post(self.url, {'quantity': quantity})
+
+            self.assertRedirects(response, reverse('user_account:cart'), fetch_redirect_response=False)
+        self.assertFalse(CartReservation.objects.exists())
+        self.assertNotIn('cart', self.client.session)
+        self.material.refresh_from_db()
+        self.assertEqual(self.material.stock, 5)
+
+    def test_missing_quantity_adds_one_copy(self):
+        self.client.post(self.url)
+
+        self.assertEqual(self.client.session['cart'][str(self.material.pk)]['quantity'], 1)
+        self.material.refresh_from_db()
+        self.assertEqual(self.material.stock, 4)
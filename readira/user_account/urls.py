@@ -4,7 +4,11 @@ from .views import (
     RegisterView,
     SubscriptionPageView,
     profile_view,
+    profile_orders,
+    profile_subscriptions,
     logout_view,
+    loans_view,
+    return_loan,
     add_to_cart,
     cart_view,
     remove_from_cart,
@@ -20,7 +24,11 @@ urlpatterns = [
     path('login/', StoreLoginView.as_view(), name='login'),
     path('register/', RegisterView.as_view(), name='register'),
     path('profile/', profile_view, name='profile'),
+    path('profile/orders/', profile_orders, name='profile_orders'),
+    path('profile/subscriptions/', profile_subscriptions, name='profile_subscriptions'),
     path('logout/', logout_view, name='logout'),
+    path('loans/', loans_view, name='loans'),
+    path('loans/<int:material_id>/return/', return_loan, name='return_loan'),
     path('add-to-cart/<int:material_id>/add_to_cart/', add_to_cart, name='add_to_cart'),
     path('remove-from-cart/<int:material_id>/', remove_from_cart, name='remove_from_cart'),
     path('cart/', cart_view, name = 'cart'),
@@ -6,19 +6,32 @@ from django.contrib.auth import authenticate, get_user_model, login, logout, upd
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import PasswordChangeForm
 from django.contrib.auth.views import LoginView
-from django.shortcuts import get_object_or_404, redirect, render
+from django.db import transaction
+from django.db.models import Prefetch
+from django.shortcuts import redirect, render
 from django.urls import reverse_lazy
 from django.utils import timezone
 from django.utils.crypto import get_random_string
 from django.views import View
 from django.views.decorators.http import require_POST, require_http_methods
 from django.views.generic import TemplateView
-from .forms import CustomPasswordChangeForm, CustomUserForm, EmailLoginForm
-from library.models import ReadingMaterials, SubscriptionPlan, Subscription, Order
+from .forms import AddToCartForm, CustomPasswordChangeForm, CustomUserForm, EmailLoginForm
+from library.inventory import OutOfStock, consume_reservations, release, reserve
+from library.checkout import checkout_completed, claim_order_token
+from library.delivery import delivery_url
+from library.loans import return_loans
+from library.models import CustomerStats, Loan, Subscription, Order, OrderLine, OutboxEvent
+from library.objcache import material_cache
+from library.outbox import record_event
+from library.pagination import paginate_by_cursor
+from library.refdata import subscription_plans
 
 
 User = get_user_model()
 
+HISTORY_PER_PAGE = 10
+SUBSCRIPTION_HISTORY_ORDER = ('active', '-start_date', '-pk')
+
 
 class StoreLoginView(LoginView):
     """
@@ -90,7 +103,7 @@ def profile_view(request):
     """
     Displays and handles updates to the user's profile and password.
     Supports POST requests to update profile details or change password.
-    Shows user subscriptions, orders, and other profile info.
+    Shows the first page of the user's subscriptions and orders, the stored order statistics, and other profile info.
     Args:
         request (HttpRequest): The HTTP request.
     Returns:
@@ -119,8 +132,9 @@ def profile_view(request):
         profile_form = CustomUserForm(instance=user)
         password_form = CustomPasswordChangeForm(user)
 
-    subs = user.subscriptions.all().order_by('active', '-start_date') if hasattr(user, 'subscriptions') else []
-    orders = user.orders.all().order_by('-submitted_at') if hasattr(user, 'orders') else []
+    subs = paginate_by_cursor(subscription_history(user), None, HISTORY_PER_PAGE, SUBSCRIPTION_HISTORY_ORDER)
+    orders = paginate_by_cursor(order_history(user), None, HISTORY_PER_PAGE)
+    stats = CustomerStats.objects.filter(user=user).first()
     has_sub = user.has_active_subscription
     fields = ['full_name', 'phone', 'city', 'country', 'street', 'zip_code', 'avatar_url', 'preferred_channel']
 
@@ -129,12 +143,69 @@ def profile_view(request):
         'password_form': password_form,
         'orders': orders,
         'subscriptions': subs,
+        'stats': stats,
         'has_subscription': has_sub,
         'fields': fields
     })
 
 
 
+def order_history(user):
+    """
+    Returns the orders of a user together with their lines and materials, limited to the columns the order history displays.
+    """
+    return (
+        Order.objects.filter(user=user)
+        .only('submitted_at', 'total_cost', 'status')
+        .prefetch_related(Prefetch(
+            'lines',
+            queryset=OrderLine.objects.select_related('reading_material').only(
+                'order_id', 'quantity', 'price_per_item', 'reading_material__title',
+            ),
+        ))
+    )
+
+
+def subscription_history(user):
+    """
+    Returns the subscriptions of a user together with their plans, limited to the columns the subscription history displays.
+    The history lists past subscriptions before active ones, each newest first (SUBSCRIPTION_HISTORY_ORDER).
+    """
+    return (
+        Subscription.objects.filter(user=user)
+        .select_related('plan')
+        .only('start_date', 'end_date', 'active', 'plan__name', 'plan__price')
+    )
+
+
+@login_required
+def profile_orders(request):
+    """
+    Returns an older page of the user's orders as an HTML fragment, loaded by the profile page.
+    Args:
+        request (HttpRequest): The HTTP request; the 'before' query parameter is the cursor returned by the previous page.
+    Returns:
+        HttpResponse: Rendered orders fragment.
+    """
+    orders = paginate_by_cursor(order_history(request.user), request.GET.get('before'), HISTORY_PER_PAGE)
+    return render(request, 'user_account/_orders.html', {'orders': orders})
+
+
+@login_required
+def profile_subscriptions(request):
+    """
+    Returns an older page of the user's subscriptions as an HTML fragment, loaded by the profile page.
+    Args:
+        request (HttpRequest): The HTTP request; the 'before' query parameter is the cursor returned by the previous page.
+    Returns:
+        HttpResponse: Rendered subscriptions fragment.
+    """
+    subscriptions = paginate_by_cursor(
+        subscription_history(request.user), request.GET.get('before'), HISTORY_PER_PAGE, SUBSCRIPTION_HISTORY_ORDER,
+    )
+    return render(request, 'user_account/_subscriptions.html', {'subscriptions': subscriptions})
+
+
 class SubscriptionPageView(TemplateView):
     """
     Displays the subscriptions page with a list of all available subscription plans.
@@ -149,8 +220,7 @@ class SubscriptionPageView(TemplateView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        plans = SubscriptionPlan.objects.all()
-        context['plans'] = plans
+        context['plans'] = subscription_plans.all()
         return context
 
 
@@ -168,11 +238,62 @@ def logout_view(request):
 
 
 
+@login_required
+def loans_view(request):
+    """
+    Displays the reading materials the user currently has on loan.
+    The page needs a constant number of queries: the open loans come with their materials and authors
+    in one query on the open-loan index, and the plan quota in another.
+    Digital files get fresh signed download links.
+    Args:
+        request (HttpRequest): The HTTP request.
+    Returns:
+        HttpResponse: Rendered loans page.
+    """
+    user = request.user
+    loans = list(
+        Loan.objects.filter(user=user, returned_at__isnull=True)
+        .select_related('material__author')
+        .only('user', 'borrowed_at', 'due_date', 'material__title', 'material__image', 'material__digital_file', 'material__author__name', 'material__author__surname')
+        .order_by('due_date')
+    )
+    for loan in loans:
+        loan.download_url = delivery_url(loan, loan.material)
+    plan = subscription_plans.get(
+        user.subscriptions.filter(active=True, end_date__gte=timezone.now())
+        .order_by('-end_date')
+        .values_list('plan_id', flat=True)
+        .first()
+    )
+    return render(request, 'user_account/loans.html', {
+        'loans': loans,
+        'max_loans': plan.max_loans if plan else 0,
+    })
+
+
+@require_POST
+@login_required
+def return_loan(request, material_id):
+    """
+    Returns a borrowed reading material and frees its copy.
+    Args:
+        request (HttpRequest): The HTTP request.
+        material_id (int): ID of the returned reading material.
+    Returns:
+        HttpResponseRedirect: Redirect to the loans page.
+    """
+    if return_loans(request.user, [material_id]):
+        messages.success(request, 'Reading material returned.')
+    return redirect('user_account:loans')
+
+
+
 @login_required
 def add_to_cart(request, material_id):
     """
     Adds a reading material to the user's cart stored in session.
     If the item is already in the cart, increments its quantity.
+    The copies are reserved for the cart, so they cannot be sold to someone else until the reservation expires.
     Creates an order token for checkout if it doesn't exist.
     Args:
         request (HttpRequest): The HTTP request containing POST data.
@@ -180,8 +301,18 @@ def add_to_cart(request, material_id):
     Returns:
         HttpResponseRedirect: Redirect to the cart page.
     """
-    material = get_object_or_404(ReadingMaterials, id=material_id)
-    quantity = int(request.POST.get('quantity', 1))
+    material = material_cache.get_or_404(material_id)
+    form = AddToCartForm(request.POST)
+    if not form.is_valid():
+        messages.error(request, form.errors['quantity'][0])
+        return redirect('user_account:cart')
+    quantity = form.cleaned_data['quantity']
+
+    try:
+        reserve(request.user, material.id, quantity)
+    except OutOfStock:
+        messages.error(request, f'Sorry, there are not enough copies of "{material.title}" left.')
+        return redirect('user_account:cart')
 
     cart = request.session.get('cart', {})
     key = str(material.id)
@@ -226,20 +357,15 @@ def cart_view(request):
     materials = []
     total = Decimal('0.0')
 
-    plan_id = request.GET.get('plan_id')
-    if plan_id:
-        try:
-            plan = SubscriptionPlan.objects.get(pk=plan_id)
-            request.session['selected_plan_id'] = plan.id
-            request.session.modified = True
-        except SubscriptionPlan.DoesNotExist:
-            pass
+    plan = subscription_plans.get(request.GET.get('plan_id'))
+    if plan:
+        request.session['selected_plan_id'] = plan.id
+        request.session.modified = True
     selected_plan = None
     stored_plan_id = request.session.get('selected_plan_id')
     if stored_plan_id:
-        try:
-            selected_plan = SubscriptionPlan.objects.get(pk=stored_plan_id)
-        except SubscriptionPlan.DoesNotExist:
+        selected_plan = subscription_plans.get(stored_plan_id)
+        if selected_plan is None:
             request.session.pop('selected_plan_id', None)
     has_active_subscription = False
     if selected_plan:
@@ -250,15 +376,15 @@ def cart_view(request):
             active=True
         ).exists()
 
+    cached = material_cache.get_many(item['material_id'] for item in cart.values())
     for item in cart.values():
-        try:
-            material = ReadingMaterials.objects.get(pk=item['material_id'])
-            material.quantity = item['quantity']
-            material.total = item['total']
-            materials.append(material)
-            total += Decimal(str(material.total))
-        except ReadingMaterials.DoesNotExist:
+        material = cached.get(int(item['material_id']))
+        if material is None:
             continue
+        material.quantity = item['quantity']
+        material.total = item['total']
+        materials.append(material)
+        total += Decimal(str(material.total))
     if selected_plan:
         total += selected_plan.price  
 
@@ -281,7 +407,7 @@ def cart_view(request):
 @require_POST
 def remove_from_cart(request, material_id):
     """
-    Removes a reading material from the cart stored in session.
+    Removes a reading material from the cart stored in session and releases its reserved copies.
     Args:
         request (HttpRequest): The HTTP request.
         material_id (int): ID of the reading material to remove.
@@ -293,6 +419,8 @@ def remove_from_cart(request, material_id):
     if material_key in cart:
         del cart[material_key]
         request.session.modified = True
+        if request.user.is_authenticated:
+            release(request.user, material_id)
     return redirect('user_account:cart')
 
 
@@ -342,6 +470,17 @@ def remove_subscription(request):
 
 
 
+def finish_checkout(request):
+    """
+    Clears the cart, token and selected plan from the session and redirects to the checkout success page.
+    """
+    request.session.pop('cart', None)
+    request.session.pop('order_token', None)
+    request.session.pop('selected_plan_id', None)
+    request.session.modified = True
+    return redirect('user_account:checkout_success')
+
+
 @require_http_methods(['GET', 'POST'])
 @login_required
 def checkout_view(request, token):
@@ -352,9 +491,13 @@ def checkout_view(request, token):
         - Validates the existence of cart items or selected subscription plan.
         - Validates the session token against the token parameter.
     POST:
+        - Answers a repeated submit of a completed checkout with its success page, without validating or writing anything.
         - Validates credit card details submitted by the user.
-        - Creates Order entries for each item in the cart.
+        - Takes the purchased copies out of stock (using the cart reservations first) and creates one Order with a line
+          for each item in the cart, all in one transaction; nothing is created if a material ran out of stock.
         - Creates a Subscription if a plan is selected and no active subscription exists.
+        - Claims the order token first in that transaction, so concurrent submits of one cart create the orders once.
+        - Records a confirmation event in the outbox, in the same transaction; the email is sent by the outbox worker.
         - Clears the cart, token, and selected plan from the session upon successful checkout.
     Args:
         request (HttpRequest): The HTTP request object.
@@ -362,6 +505,9 @@ def checkout_view(request, token):
     Returns:
         HttpResponse: Redirects to cart on errors or checkout success page after completion.
     """
+    if request.method == 'POST' and checkout_completed(request.user, token):
+        return finish_checkout(request)
+
     cart = request.session.get('cart', {})
     session_token = request.session.get('order_token')
 
@@ -374,10 +520,10 @@ def checkout_view(request, token):
     selected_plan = None
     plan_id = request.session.get('selected_plan_id')
     if plan_id:
-        try:
-            selected_plan = SubscriptionPlan.objects.get(pk=plan_id)
+        selected_plan = subscription_plans.get(plan_id)
+        if selected_plan:
             total_price += selected_plan.price
-        except SubscriptionPlan.DoesNotExist:
+        else:
             request.session.pop('selected_plan_id', None)
 
     if selected_plan:
@@ -425,57 +571,81 @@ def checkout_view(request, token):
                 'selected_plan': selected_plan,
             })
 
-        # Create orders
-        for item in cart.values():
-            Order.objects.create(
-                user=request.user,
-                client_full_name=cardholder_name,
-                delivery_address=request.user.street,
-                user_address=request.user.city,
-                reading_material=ReadingMaterials.objects.get(id=item['material_id']),
-                quantity=item['quantity'],
-                price_per_item=item['price'],
-                card_number=card_number,
-                card_expiry=card_expiry,
-                card_cvv=card_cvv,
-                cardholder_name=cardholder_name,
-                buy_session_hash=hashlib.sha256(
-                    f'{card_number}{card_expiry}{cardholder_name}{get_random_string(8)}'.encode()
-                ).hexdigest(),
-                status=Order.Status.PAID,
-            )
-
-        # Create subscription only if one isn't active for the same plan
-        if selected_plan:
-            from django.utils.timezone import now
-            from datetime import timedelta
-
-            existing_active = Subscription.objects.filter(
-                user=request.user,
-                plan=selected_plan,
-                end_date__gte=now(),
-                active=True
-            ).exists()
-
-            if not existing_active:
-                start_date = timezone.now()
-                end_date = start_date + timedelta(days=selected_plan.duration_days or 30)
-
-                Subscription.objects.create(
-                    user=request.user,
-                    plan=selected_plan,
-                    start_date=start_date,
-                    end_date=end_date,
-                    active=True
+        try:
+            with transaction.atomic():
+                # Claim the order token: a concurrent submit of the same cart waits here for this one, then stops
+                claim = claim_order_token(request.user, token)
+                if claim is None:
+                    return finish_checkout(request)
+
+                order = subscription = None
+
+                # Take the copies out of stock
+                consume_reservations(request.user, {int(item['material_id']): item['quantity'] for item in cart.values()})
+
+                # Create the order and its lines
+                if cart:
+                    order = Order.objects.create(
+                        user=request.user,
+                        client_full_name=cardholder_name,
+                        delivery_address=request.user.street,
+                        user_address=request.user.city,
+                        total_cost=sum(item['quantity'] * Decimal(str(item['price'])) for item in cart.values()),
+                        card_number=card_number,
+                        card_expiry=card_expiry,
+                        card_cvv=card_cvv,
+                        cardholder_name=cardholder_name,
+                        buy_session_hash=hashlib.sha256(
+                            f'{card_number}{card_expiry}{cardholder_name}{get_random_string(8)}'.encode()
+                        ).hexdigest(),
+                        status=Order.Status.PAID,
+                    )
+                    OrderLine.objects.bulk_create([
+                        OrderLine(
+                            order=order,
+                            reading_material_id=int(item['material_id']),
+                            quantity=item['quantity'],
+                            price_per_item=Decimal(str(item['price'])),
+                        )
+                        for item in cart.values()
+                    ])
+                    claim.order = order
+                    claim.save(update_fields=['order'])
+
+                # Create subscription only if one isn't active for the same plan
+                if selected_plan:
+                    existing_active = Subscription.objects.filter(
+                        user=request.user,
+                        plan=selected_plan,
+                        end_date__gte=timezone.now(),
+                        active=True
+                    ).exists()
+
+                    if not existing_active:
+                        start_date = timezone.now()
+                        end_date = start_date + timedelta(days=selected_plan.duration_days or 30)
+
+                        subscription = Subscription.objects.create(
+                            user=request.user,
+                            plan=selected_plan,
+                            start_date=start_date,
+                            end_date=end_date,
+                            active=True
+                        )
+
+                # Queue the confirmation; the outbox worker sends it after the commit
+                record_event(
+                    OutboxEvent.Kind.CHECKOUT_COMPLETED,
+                    request.user.pk,
+                    order_id=order.pk if order else None,
+                    subscription_id=subscription.pk if subscription else None,
                 )
+        except OutOfStock as exc:
+            title = cart.get(str(exc.material_id), {}).get('title', '')
+            messages.error(request, f'Sorry, "{title}" sold out before your order went through.')
+            return redirect('user_account:cart')
 
-        # Finalize: clear cart + token
-        request.session.pop('cart', None)
-        request.session.pop('order_token', None)
-        request.session.pop('selected_plan_id', None)
-        request.session.modified = True
-
-        return redirect('user_account:checkout_success')
+        return finish_checkout(request)
 
     return render(request, 'user_account/checkout.html', {
         'total_price': total_price,